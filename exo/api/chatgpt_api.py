@@ -228,6 +228,7 @@ class ChatGPTAPI:
     cors.add(self.app.router.add_post("/download", self.handle_post_download), {"*": cors_options})
     cors.add(self.app.router.add_get("/v1/topology", self.handle_get_topology), {"*": cors_options})
     cors.add(self.app.router.add_get("/topology", self.handle_get_topology), {"*": cors_options})
+    cors.add(self.app.router.add_get("/v1/kv-cache", self.handle_get_kv_cache), {"*": cors_options})
 
     # Add static routes
     if "__compiled__" not in globals():
@@ -356,6 +357,8 @@ class ChatGPTAPI:
 
     if DEBUG >= 2: print(f"[ChatGPTAPI] Processing prompt: {request_id=} {shard=} {prompt=}")
 
+    # Set once the full response has been generated. Anything else (client disconnect, timeout, write error) cancels the request on all nodes.
+    completed = False
     try:
       await asyncio.wait_for(asyncio.shield(asyncio.create_task(self.node.process_prompt(shard, prompt, request_id=request_id))), timeout=self.response_timeout)
 
@@ -404,6 +407,7 @@ class ChatGPTAPI:
             await response.write(f"data: {json.dumps(completion)}\n\n".encode())
 
             if is_finished:
+              completed = True
               break
 
           await response.write_eof()
@@ -433,6 +437,7 @@ class ChatGPTAPI:
           _tokens, is_finished = await asyncio.wait_for(self.token_queues[request_id].get(), timeout=self.response_timeout)
           tokens.extend(_tokens)
           if is_finished:
+            completed = True
             break
         finish_reason = "length"
         eos_token_id = None
@@ -448,6 +453,11 @@ class ChatGPTAPI:
     except Exception as e:
       if DEBUG >= 2: traceback.print_exc()
       return web.json_response({"detail": f"Error processing prompt (see logs with DEBUG>=2): {str(e)}"}, status=500)
+    finally:
+      if not completed:
+        if DEBUG >= 2: print(f"[ChatGPTAPI] Cancelling unfinished request: {request_id=}")
+        self.token_queues.pop(request_id, None)
+        asyncio.create_task(self.node.cancel_request(request_id))
 
   async def handle_post_image_generations(self, request):
     data = await request.json()
@@ -539,6 +549,7 @@ class ChatGPTAPI:
 
     except Exception as e:
       if DEBUG >= 2: traceback.print_exc()
+      asyncio.create_task(self.node.cancel_request(request_id))
       return web.json_response({"detail": f"Error processing prompt (see logs with DEBUG>=2): {str(e)}"}, status=500)
 
   async def handle_delete_model(self, request):
@@ -620,7 +631,13 @@ class ChatGPTAPI:
       if DEBUG >= 2: traceback.print_exc()
       return web.json_response({"detail": f"Error getting topology: {str(e)}"}, status=500)
 
+  async def handle_get_kv_cache(self, request):
+    kv_caches = self.node.inference_engine.kv_caches
+    if kv_caches is None: return web.json_response({})
+    return web.json_response(kv_caches.stats())
+
   async def handle_tokens(self, request_id: str, tokens: List[int], is_finished: bool):
+    if request_id in self.node.cancelled_requests: return
     await self.token_queues[request_id].put((tokens, is_finished))
 
   async def run(self, host: str = "0.0.0.0", port: int = 52415):
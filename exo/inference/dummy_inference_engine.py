@@ -2,6 +2,7 @@ from typing import Optional, Tuple, TYPE_CHECKING
 import numpy as np
 from exo.inference.inference_engine import InferenceEngine
 from exo.inference.shard import Shard
+from exo.inference.layer_profile import LayerProfile
 from exo.inference.tokenizers import DummyTokenizer
 
 class DummyInferenceEngine(InferenceEngine):
@@ -14,6 +15,7 @@ class DummyInferenceEngine(InferenceEngine):
     self.latency_stddev = 0.02
     self.num_generate_dummy_tokens = 10
     self.tokenizer = DummyTokenizer()
+    self.layer_profile = LayerProfile()
 
   async def encode(self, shard: Shard, prompt: str) -> np.ndarray:
     return np.array(self.tokenizer.encode(prompt))
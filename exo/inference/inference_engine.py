@@ -2,14 +2,22 @@ import numpy as np
 import os
 from exo.helpers import DEBUG  # Make sure to import DEBUG
 
-from typing import Tuple, Optional
+from typing import Tuple, Optional, List
 from abc import ABC, abstractmethod
 from .shard import Shard
+from .kv_cache_manager import KVCacheManager
+from .prefix_cache import PrefixCache
+from .layer_profile import LayerProfile
 from exo.download.shard_download import ShardDownloader
 
 
 class InferenceEngine(ABC):
   session = {}
+  kv_caches: Optional[KVCacheManager] = None
+  prefix_cache: Optional[PrefixCache] = None
+  layer_profile: Optional[LayerProfile] = None
+  # long prompts are run in slices of this many tokens so decode steps of other requests can run in between
+  prefill_chunk_size: Optional[int] = None
 
   @abstractmethod
   async def encode(self, shard: Shard, prompt: str) -> np.ndarray:
@@ -27,6 +35,46 @@ class InferenceEngine(ABC):
   async def infer_tensor(self, request_id: str, shard: Shard, input_data: np.ndarray, inference_state: Optional[dict] = None) -> tuple[np.ndarray, Optional[dict]]:
     pass
 
+  async def infer_tensor_batch(self, request_ids: List[str], shard: Shard, input_datas: List[np.ndarray], inference_states: List[Optional[dict]]) -> List[tuple[np.ndarray, Optional[dict]]]:
+    # Engines that can stack the requests' decode steps into one forward override this. Each request keeps its own KV cache.
+    return [await self.infer_tensor(request_id, shard, input_data, inference_state) for request_id, input_data, inference_state in zip(request_ids, input_datas, inference_states)]
+
+  def prefill_chunks(self, input_data: np.ndarray) -> List[np.ndarray]:
+    chunk_size = self.prefill_chunk_size
+    if not chunk_size or input_data.ndim < 2 or input_data.shape[1] <= chunk_size: return [input_data]
+    return [input_data[:, i:i + chunk_size] for i in range(0, input_data.shape[1], chunk_size)]
+
+  async def can_trim_cache(self) -> bool:
+    # Whether trim_cache works for the loaded model's KV caches, speculative decoding depends on it
+    return True
+
+  async def trim_cache(self, request_id: str, n: int) -> None:
+    # Drops the last n positions from a request's KV cache, e.g. speculative tokens that were rejected
+    if self.prefix_cache is not None: self.prefix_cache.trim(request_id, n)
+
+  def finish_request(self, request_id: str) -> None:
+    # Keeps a finished request's KV cache for prefix reuse, but lets it be evicted first when memory is needed
+    if self.kv_caches is not None: self.kv_caches.release(request_id)
+
+  async def clear_request(self, request_id: str) -> None:
+    # Drops any per-request state (e.g. KV caches) held for a finished or cancelled request
+    if self.kv_caches is not None: self.kv_caches.pop(request_id)
+    if self.prefix_cache is not None: self.prefix_cache.remove(request_id)
+
+  def match_prefix(self, request_id: str, shard: Shard, input_data: np.ndarray) -> Tuple[int, Optional[str]]:
+    # Prefixes are only reused when this node runs the whole model, later shards never see the token ids to match on.
+    # The last token is always left out so the step still has an input to produce logits for.
+    if self.prefix_cache is None or self.kv_caches is None or request_id in self.kv_caches: return 0, None
+    if not (shard.is_first_layer() and shard.is_last_layer()) or input_data.ndim != 2 or input_data.shape[0] != 1 or input_data.shape[1] < 2: return 0, None
+    if not np.issubdtype(input_data.dtype, np.integer): return 0, None
+    prefix_len, source = self.prefix_cache.match(input_data[0, :-1])
+    if source is None or source not in self.kv_caches: return 0, None
+    return prefix_len, source
+
+  def record_prefix_tokens(self, request_id: str, shard: Shard, input_data: np.ndarray) -> None:
+    if self.prefix_cache is None or not (shard.is_first_layer() and shard.is_last_layer()): return
+    if input_data.ndim == 2 and input_data.shape[0] == 1 and np.issubdtype(input_data.dtype, np.integer): self.prefix_cache.extend(request_id, input_data[0])
+
   @abstractmethod
   async def load_checkpoint(self, shard: Shard, path: str):
     pass
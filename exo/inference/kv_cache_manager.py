@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+from exo import DEBUG
+
+# Share of device memory given to KV caches when no explicit budget is configured. The rest is left for weights and activations.
+DEFAULT_KV_CACHE_MEMORY_FRACTION = 0.25
+# Budget when the device's memory is unknown
+DEFAULT_KV_CACHE_BUDGET_BYTES = 1024*1024*1024
+
+
+class KVCacheBudgetExceeded(MemoryError):
+  pass
+
+
+class KVCacheEvicted(LookupError):
+  pass
+
+
+@dataclass
+class KVCacheEntry:
+  cache: Any
+  nbytes: int = 0
+  finished: bool = False
+  last_used: float = 0.0
+
+
+class KVCacheManager:
+  """Per-request KV caches of an inference engine, bounded by a memory budget.
+
+  When a cache is added or grows past the budget, caches of finished requests (see release) and of requests idle for idle_after seconds
+  are evicted, least recently used first. Caches of requests that are still generating are never evicted: a new cache that doesn't fit
+  raises KVCacheBudgetExceeded instead, and a running request that grows past the budget is let through. An evicted request that comes
+  back raises KVCacheEvicted from check_not_evicted rather than decoding without its context.
+  """
+  def __init__(self, budget_bytes: Optional[int] = None, max_entries: Optional[int] = None, on_evict: Optional[Callable[[str], None]] = None, idle_after: float = 60.0, max_evicted: int = 4096):
+    self.budget_bytes = budget_bytes
+    self.max_entries = max_entries
+    self.on_evict = on_evict
+    self.idle_after = idle_after
+    self.max_evicted = max_evicted
+    self.entries: OrderedDict[str, KVCacheEntry] = OrderedDict()
+    self.evicted: OrderedDict[str, None] = OrderedDict()
+    self.evictions = 0
+    # engines touch caches from their executor thread while cancellations come from the event loop
+    self._lock = threading.RLock()
+
+  def configure(self, budget_bytes: Optional[int] = None, max_entries: Optional[int] = None) -> List[str]:
+    with self._lock:
+      self.budget_bytes = budget_bytes
+      self.max_entries = max_entries
+      return self._evict_for(None, 0)
+
+  @property
+  def used_bytes(self) -> int:
+    return sum(entry.nbytes for entry in self.entries.values())
+
+  def __contains__(self, request_id: str) -> bool:
+    return request_id in self.entries
+
+  def __len__(self) -> int:
+    return len(self.entries)
+
+  def get(self, request_id: str) -> Optional[Any]:
+    with self._lock:
+      entry = self.entries.get(request_id)
+      if entry is None: return None
+      self.entries.move_to_end(request_id)
+      entry.last_used = time.monotonic()
+      return entry.cache
+
+  def check_not_evicted(self, request_id: str) -> None:
+    if request_id in self.evicted: raise KVCacheEvicted(f"KV cache of {request_id} was evicted, its context is lost")
+
+  def put(self, request_id: str, cache: Any, nbytes: int = 0) -> List[str]:
+    with self._lock:
+      previous = self.entries.pop(request_id, None)
+      try:
+        evicted = self._evict_for(request_id, nbytes, new_entry=True)
+      except KVCacheBudgetExceeded:
+        if previous is not None: self.entries[request_id] = previous
+        raise
+      self.entries[request_id] = KVCacheEntry(cache, nbytes, last_used=time.monotonic())
+      self.evicted.pop(request_id, None)
+      return evicted
+
+  def resize(self, request_id: str, nbytes: int) -> List[str]:
+    with self._lock:
+      entry = self.entries.get(request_id)
+      if entry is None: return []
+      entry.nbytes = 0
+      evicted = self._evict_for(request_id, nbytes)
+      entry.nbytes = nbytes
+      entry.last_used = time.monotonic()
+      return evicted
+
+  def release(self, request_id: str) -> None:
+    # the request finished, its cache is kept for prefix reuse until the memory is needed
+    with self._lock:
+      if request_id in self.entries: self.entries[request_id].finished = True
+
+  def pop(self, request_id: str) -> Optional[Any]:
+    with self._lock:
+      entry = self.entries.pop(request_id, None)
+      return entry.cache if entry is not None else None
+
+  def clear(self) -> None:
+    with self._lock:
+      self.entries.clear()
+      self.evicted.clear()
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      used_bytes = self.used_bytes
+      return {
+        "budget_bytes": self.budget_bytes,
+        "used_bytes": used_bytes,
+        "occupancy": used_bytes/self.budget_bytes if self.budget_bytes else None,
+        "num_requests": len(self.entries),
+        "max_entries": self.max_entries,
+        "evictions": self.evictions,
+        "requests": {request_id: {"nbytes": entry.nbytes, "finished": entry.finished} for request_id, entry in self.entries.items()},
+      }
+
+  def _evict_for(self, request_id: Optional[str], nbytes: int, new_entry: bool = False) -> List[str]:
+    evicted = []
+    while self._over_budget(nbytes, new_entry):
+      # iteration order is least recently used first
+      now = time.monotonic()
+      victim_id = next((rid for rid, entry in self.entries.items() if rid != request_id and (entry.finished or now - entry.last_used > self.idle_after)), None)
+      if victim_id is None:
+        if new_entry: raise KVCacheBudgetExceeded(f"KV cache of {request_id} ({nbytes} bytes) doesn't fit the budget of {self.budget_bytes} bytes next to {len(self.entries)} running requests")
+        if DEBUG >= 1: print(f"[KVCacheManager] {request_id} grows to {nbytes} bytes past the budget of {self.budget_bytes} bytes, nothing left to evict")
+        break
+      self.entries.pop(victim_id)
+      self.evictions += 1
+      evicted.append(victim_id)
+      self.evicted[victim_id] = None
+      if len(self.evicted) > self.max_evicted: self.evicted.popitem(last=False)
+      if self.on_evict is not None: self.on_evict(victim_id)
+      if DEBUG >= 2: print(f"[KVCacheManager] evicted KV cache of {victim_id} to fit {request_id} ({nbytes} bytes)")
+    return evicted
+
+  def _over_budget(self, nbytes: int, new_entry: bool) -> bool:
+    if self.budget_bytes is not None and self.used_bytes + nbytes > self.budget_bytes: return True
+    return self.max_entries is not None and len(self.entries) + (1 if new_entry else 0) > self.max_entries
+
+
+def kv_cache_budget_bytes(memory_mb: int, fraction: float = DEFAULT_KV_CACHE_MEMORY_FRACTION) -> int:
+  # memory is reported in MB by DeviceCapabilities, 0 when unknown
+  if memory_mb <= 0: return DEFAULT_KV_CACHE_BUDGET_BYTES
+  return int(memory_mb*1024*1024*fraction)
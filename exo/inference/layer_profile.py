@@ -0,0 +1,33 @@
+import time
+from collections import deque
+from typing import Deque, Optional
+import numpy as np
+from .shard import Shard
+
+
+class LayerProfile:
+  """Measured forward time per layer of the decode steps an inference engine ran, over the last window steps.
+
+  Unlike the flops tables this reflects what the device actually delivers (throttling, background load, chips missing from the
+  tables). Steps run as a batch count once, decode steps are dominated by reading the weights so batch size barely matters. Engines
+  time the forward on the thread that runs it, time spent queued behind other requests' prefill chunks isn't counted.
+  """
+  def __init__(self, window: int = 64):
+    self.window = window
+    self.samples: Deque[float] = deque(maxlen=window)
+    self.steps = 0
+    self.updated_at = 0.0
+
+  def record(self, shard: Shard, elapsed: float) -> None:
+    self.samples.append(elapsed/shard.get_layer_count())
+    self.steps += 1
+    self.updated_at = time.time()
+
+  def seconds_per_layer(self) -> Optional[float]:
+    return float(np.median(self.samples)) if self.samples else None
+
+  def reset(self) -> None:
+    self.samples.clear()
+
+  def to_dict(self) -> dict:
+    return {"seconds_per_layer": self.seconds_per_layer(), "samples": len(self.samples), "steps": self.steps, "updated_at": self.updated_at}
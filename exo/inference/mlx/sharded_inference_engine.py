@@ -1,3 +1,4 @@
+import time
 import numpy as np
 import mlx.core as mx
 import mlx.nn as nn
@@ -7,18 +8,36 @@ from ..inference_engine import InferenceEngine
 from .sharded_utils import load_model_shard, resolve_tokenizer
 from .losses import loss_fns
 from ..shard import Shard
+from ..kv_cache_manager import KVCacheManager
+from ..prefix_cache import PrefixCache
+from ..layer_profile import LayerProfile
 from typing import Dict, Optional, Tuple
 from exo.download.shard_download import ShardDownloader
 import asyncio
-from collections import OrderedDict
-from mlx_lm.models.cache import make_prompt_cache
+from mlx_lm.models.cache import make_prompt_cache, KVCache, can_trim_prompt_cache, trim_prompt_cache
 from concurrent.futures import ThreadPoolExecutor
 
+def prompt_cache_nbytes(cache) -> int:
+  nbytes = 0
+  for layer_cache in cache:
+    for a in (getattr(layer_cache, "keys", None), getattr(layer_cache, "values", None)):
+      if a is not None: nbytes += a.nbytes
+  return nbytes
+
+def copy_prompt_cache_prefix(source, target, n: int) -> bool:
+  # only plain KVCache layers keep every position, rotating and quantized caches can't be cut at an arbitrary prefix
+  if not all(type(c) is KVCache for c in [*source, *target]): return False
+  for src, dst in zip(source, target):
+    dst.state = (src.keys[..., :n, :], src.values[..., :n, :])
+  return True
+
 class MLXDynamicShardInferenceEngine(InferenceEngine):
   def __init__(self, shard_downloader: ShardDownloader):
     self.shard = None
     self.shard_downloader = shard_downloader
-    self.caches = OrderedDict()
+    self.prefix_cache = PrefixCache()
+    self.kv_caches = KVCacheManager(on_evict=self.prefix_cache.remove)
+    self.layer_profile = LayerProfile()
     self.sampler_params: tuple[float, float] = (0.0, 0.0, 0.0, 1)
     self.sampler = make_sampler(*self.sampler_params)
     self._mlx_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mlx")
@@ -29,15 +48,38 @@ class MLXDynamicShardInferenceEngine(InferenceEngine):
   async def _eval_mlx(self, *args):
     await asyncio.get_running_loop().run_in_executor(self._mlx_thread, mx.eval, *args)
 
-  async def poll_state(self, request_id: str, max_caches=2):
-    if request_id in self.caches:
-      self.caches.move_to_end(request_id)
-    else:
-      newcache = make_prompt_cache(self.model)
-      if len(self.caches) > max_caches:
-        self.caches.popitem(last=False)
-      self.caches[request_id] = newcache
-    return {"cache": self.caches[request_id]}
+  async def poll_state(self, request_id: str):
+    cache = self.kv_caches.get(request_id)
+    if cache is None:
+      self.kv_caches.check_not_evicted(request_id)
+      cache = make_prompt_cache(self.model)
+      self.kv_caches.put(request_id, cache)
+    return {"cache": cache}
+
+  def restore_prefix(self, request_id: str, shard: Shard, input_data: np.ndarray) -> int:
+    prefix_len, source = self.match_prefix(request_id, shard, input_data)
+    if source is None: return 0
+    cache = make_prompt_cache(self.model)
+    if not copy_prompt_cache_prefix(self.kv_caches.get(source), cache, prefix_len): return 0
+    self.kv_caches.put(request_id, cache, prompt_cache_nbytes(cache))
+    self.prefix_cache.extend(request_id, input_data[0, :prefix_len])
+    return prefix_len
+
+  def update_cache_size(self, request_id: str, state: dict):
+    # mlx caches grow as tokens are added, so sizes are only known after a step has been evaluated
+    self.kv_caches.resize(request_id, prompt_cache_nbytes(state["cache"]))
+
+  async def can_trim_cache(self) -> bool:
+    # rotating (sliding window) caches can't drop their last positions
+    return await asyncio.get_running_loop().run_in_executor(self._mlx_thread, lambda: can_trim_prompt_cache(make_prompt_cache(self.model)))
+
+  async def trim_cache(self, request_id: str, n: int) -> None:
+    cache = self.kv_caches.get(request_id)
+    if cache is not None and n > 0:
+      if not can_trim_prompt_cache(cache): raise ValueError(f"KV cache of {self.shard.model_id} can't be trimmed")
+      await asyncio.get_running_loop().run_in_executor(self._mlx_thread, trim_prompt_cache, cache, n)
+      self.update_cache_size(request_id, {"cache": cache})
+    await super().trim_cache(request_id, n)
 
   async def sample(self, x: np.ndarray, temp: float = 0.0, top_p: float = 1.0) -> np.ndarray:
     if (temp, top_p, 0.0, 1) != self.sampler_params:
@@ -78,28 +120,40 @@ class MLXDynamicShardInferenceEngine(InferenceEngine):
 
   async def infer_tensor(self, request_id: str, shard: Shard, input_data: np.ndarray, inference_state: Optional[dict] = None) -> tuple[np.ndarray, Optional[dict]]:
     await self.ensure_shard(shard)
-    state = await self.poll_state(request_id) if self.model.model_type != 'StableDiffusionPipeline' else {}
-    x = mx.array(input_data)
-
-    if self.model.model_type != 'StableDiffusionPipeline':
-      output_data = await asyncio.get_running_loop().run_in_executor(
+    if self.model.model_type == 'StableDiffusionPipeline':
+      x = mx.array(input_data)
+      output_data, inference_state = await asyncio.get_running_loop().run_in_executor(
         self._mlx_thread,
-        lambda: self.model(x, **state, **(inference_state or {}))
+        lambda: self.model(x, **(inference_state or {}))
       )
-      inference_state = None
-    else:
-      result = await asyncio.get_running_loop().run_in_executor(
+      await self._eval_mlx(output_data)
+      output_data = await asyncio.get_running_loop().run_in_executor(
         self._mlx_thread,
-        lambda: self.model(x, **state, **(inference_state or {}))
+        lambda: np.array(output_data, copy=False)
       )
-      output_data, inference_state = result
-
-    await self._eval_mlx(output_data)
-    output_data = await asyncio.get_running_loop().run_in_executor(
-      self._mlx_thread,
-      lambda: np.array(output_data, copy=False)
-    )
-    return output_data, inference_state
+      return output_data, inference_state
+
+    prefix_len = await asyncio.get_running_loop().run_in_executor(self._mlx_thread, self.restore_prefix, request_id, shard, input_data)
+    state = await self.poll_state(request_id)
+    outputs = []
+    # each chunk is its own submission to the mlx thread, so decode batches queued meanwhile run between chunks
+    for chunk in self.prefill_chunks(input_data[:, prefix_len:] if prefix_len else input_data):
+      x = mx.array(chunk)
+      def forward():
+        # timed on the mlx thread, so the layer profile holds decode forwards alone and not the wait behind other requests' chunks
+        start = time.perf_counter()
+        output_data = self.model(x, **state, **(inference_state or {}))
+        mx.eval(output_data)
+        if chunk.shape[1] == 1: self.layer_profile.record(shard, time.perf_counter() - start)
+        return output_data
+      output_data = await asyncio.get_running_loop().run_in_executor(self._mlx_thread, forward)
+      self.update_cache_size(request_id, state)
+      self.record_prefix_tokens(request_id, shard, chunk)
+      outputs.append(await asyncio.get_running_loop().run_in_executor(
+        self._mlx_thread,
+        lambda: np.array(output_data, copy=False)
+      ))
+    return (outputs[0] if len(outputs) == 1 else np.concatenate(outputs, axis=1)), None
 
   async def evaluate(self, request_id: str, shard: Shard, inputs, targets, lengths, loss: str = "length_masked_ce"):
     await self.ensure_shard(shard)
@@ -172,7 +226,8 @@ class MLXDynamicShardInferenceEngine(InferenceEngine):
           self.tokenizer = await resolve_tokenizer(model_path)
         self.shard = shard
         self.model = model_shard
-        self.caches = OrderedDict()
+        self.kv_caches.clear()
+        self.prefix_cache.clear()
         self.session = {}
 
   async def cleanup(self):
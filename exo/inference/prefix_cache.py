@@ -0,0 +1,119 @@
+import threading
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+
+class _RadixNode:
+  __slots__ = ("tokens", "parent", "children", "request_ids")
+
+  def __init__(self, tokens: List[int], parent: Optional["_RadixNode"] = None):
+    self.tokens = tokens
+    self.parent = parent
+    self.children: Dict[int, "_RadixNode"] = {}
+    # requests whose token sequence covers this node's whole edge
+    self.request_ids: Set[str] = set()
+
+
+def _common_prefix_len(a: Sequence[int], b: Sequence[int]) -> int:
+  n = min(len(a), len(b))
+  for i in range(n):
+    if a[i] != b[i]: return i
+  return n
+
+
+class PrefixCache:
+  """Radix tree over the token ids whose KV entries each request's cache holds.
+
+  It does not own any KV memory: a matched request's cache is copied up to the shared prefix, and entries are removed when the
+  KVCacheManager evicts or drops the cache they point to, so prefixes live under the same memory budget as the caches.
+  """
+  def __init__(self):
+    self.root = _RadixNode([])
+    self.ends: Dict[str, _RadixNode] = {}
+    self.lengths: Dict[str, int] = {}
+    self._lock = threading.RLock()
+
+  def __contains__(self, request_id: str) -> bool:
+    return request_id in self.ends
+
+  def __len__(self) -> int:
+    return len(self.ends)
+
+  def extend(self, request_id: str, tokens: Sequence[int]) -> None:
+    tokens = [int(t) for t in tokens]
+    if not tokens: return
+    with self._lock:
+      end = self.ends.get(request_id, self.root)
+      if end is not self.root and not end.children and end.request_ids == {request_id}:
+        # common case for decode steps: the request owns its leaf, grow the edge instead of adding a node per token
+        end.tokens.extend(tokens)
+      else:
+        end = self._insert(end, tokens, request_id)
+      self.ends[request_id] = end
+      self.lengths[request_id] = self.lengths.get(request_id, 0) + len(tokens)
+
+  def match(self, tokens: Sequence[int]) -> Tuple[int, Optional[str]]:
+    """Returns the length of the longest cached prefix of tokens and a request whose cache holds it."""
+    tokens = [int(t) for t in tokens]
+    with self._lock:
+      node, matched, source = self.root, 0, None
+      while matched < len(tokens):
+        child = node.children.get(tokens[matched])
+        if child is None: break
+        n = _common_prefix_len(child.tokens, tokens[matched:])
+        matched += n
+        source = next(iter(child.request_ids))
+        if n < len(child.tokens): break
+        node = child
+      return matched, source
+
+  def remove(self, request_id: str) -> None:
+    with self._lock:
+      node = self.ends.pop(request_id, None)
+      self.lengths.pop(request_id, None)
+      while node is not None and node is not self.root:
+        node.request_ids.discard(request_id)
+        parent = node.parent
+        # a child's requests are a subset of its parent's, so an empty node has no live children left
+        if not node.request_ids: parent.children.pop(node.tokens[0], None)
+        node = parent
+
+  def trim(self, request_id: str, n: int) -> None:
+    with self._lock:
+      if n <= 0 or request_id not in self.ends: return
+      tokens, node = [], self.ends[request_id]
+      while node is not self.root:
+        tokens[:0] = node.tokens
+        node = node.parent
+      self.remove(request_id)
+      self.extend(request_id, tokens[:max(len(tokens) - n, 0)])
+
+  def clear(self) -> None:
+    with self._lock:
+      self.root = _RadixNode([])
+      self.ends.clear()
+      self.lengths.clear()
+
+  def _insert(self, node: _RadixNode, tokens: List[int], request_id: str) -> _RadixNode:
+    i = 0
+    while i < len(tokens):
+      child = node.children.get(tokens[i])
+      if child is None:
+        child = _RadixNode(tokens[i:], node)
+        node.children[tokens[i]] = child
+        child.request_ids.add(request_id)
+        return child
+      n = _common_prefix_len(child.tokens, tokens[i:])
+      if n < len(child.tokens): child = self._split(child, n)
+      child.request_ids.add(request_id)
+      node = child
+      i += n
+    return node
+
+  def _split(self, node: _RadixNode, n: int) -> _RadixNode:
+    head = _RadixNode(node.tokens[:n], node.parent)
+    head.request_ids = set(node.request_ids)
+    node.parent.children[head.tokens[0]] = head
+    node.tokens = node.tokens[n:]
+    node.parent = head
+    head.children[node.tokens[0]] = node
+    return head
@@ -41,6 +41,18 @@ async def test_dummy_inference_engine():
   print("All tests passed!")
 
 
+def test_prefill_chunks():
+  engine = DummyInferenceEngine()
+  tokens = np.arange(10).reshape(1, -1)
+  assert len(engine.prefill_chunks(tokens)) == 1
+
+  engine.prefill_chunk_size = 4
+  chunks = engine.prefill_chunks(tokens)
+  assert [chunk.shape[1] for chunk in chunks] == [4, 4, 2]
+  np.testing.assert_array_equal(np.concatenate(chunks, axis=1), tokens)
+  assert len(engine.prefill_chunks(np.array([[1]]))) == 1
+
+
 if __name__ == "__main__":
   import asyncio
   asyncio.run(test_dummy_inference_engine())
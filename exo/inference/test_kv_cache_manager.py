@@ -0,0 +1,76 @@
+import unittest
+from unittest import mock
+from exo.inference import kv_cache_manager
+from exo.inference.kv_cache_manager import DEFAULT_KV_CACHE_BUDGET_BYTES, KVCacheBudgetExceeded, KVCacheEvicted, KVCacheManager, kv_cache_budget_bytes
+
+
+class TestKVCacheManager(unittest.TestCase):
+  def test_lru_eviction_under_budget(self):
+    manager = KVCacheManager(budget_bytes=300)
+    for request_id in ["a", "b", "c"]:
+      self.assertEqual(manager.put(request_id, request_id, nbytes=100), [])
+      manager.release(request_id)
+    manager.get("a")
+
+    self.assertEqual(manager.put("d", "d", nbytes=100), ["b"])
+    self.assertEqual(list(manager.entries), ["c", "a", "d"])
+    self.assertEqual(manager.used_bytes, 300)
+    self.assertEqual(manager.evictions, 1)
+
+  def test_running_requests_are_not_evicted(self):
+    manager = KVCacheManager(budget_bytes=200, idle_after=30.0)
+    with mock.patch.object(kv_cache_manager.time, "monotonic", return_value=100.0):
+      manager.put("running", 1, nbytes=100)
+      manager.put("stalled", 2, nbytes=100)
+    with mock.patch.object(kv_cache_manager.time, "monotonic", return_value=120.0):
+      manager.get("running")
+      with self.assertRaises(KVCacheBudgetExceeded):
+        manager.put("new", 3, nbytes=100)
+    # the stalled request is idle by now and makes room
+    with mock.patch.object(kv_cache_manager.time, "monotonic", return_value=140.0):
+      self.assertEqual(manager.put("new", 3, nbytes=100), ["stalled"])
+    self.assertIn("running", manager)
+    with self.assertRaises(KVCacheEvicted):
+      manager.check_not_evicted("stalled")
+    manager.check_not_evicted("running")
+
+  def test_resize_never_evicts_itself(self):
+    manager = KVCacheManager(budget_bytes=250)
+    manager.put("a", 1, nbytes=100)
+    manager.put("b", 2, nbytes=100)
+    manager.release("a")
+
+    self.assertEqual(manager.resize("b", 200), ["a"])
+    self.assertEqual(manager.resize("b", 400), [])
+    self.assertEqual(manager.get("b"), 2)
+    self.assertEqual(manager.used_bytes, 400)
+
+  def test_max_entries_and_reconfigure(self):
+    manager = KVCacheManager(max_entries=2)
+    manager.put("a", 1)
+    manager.put("b", 2)
+    manager.release("a")
+    manager.release("b")
+    self.assertEqual(manager.put("c", 3), ["a"])
+    self.assertEqual(manager.configure(max_entries=1), ["b"])
+    self.assertEqual(len(manager), 1)
+
+  def test_pop_and_stats(self):
+    manager = KVCacheManager(budget_bytes=1000)
+    manager.put("a", "cache", nbytes=250)
+    stats = manager.stats()
+    self.assertEqual(stats["used_bytes"], 250)
+    self.assertEqual(stats["occupancy"], 0.25)
+    self.assertEqual(stats["requests"], {"a": {"nbytes": 250, "finished": False}})
+
+    self.assertEqual(manager.pop("a"), "cache")
+    self.assertIsNone(manager.pop("a"))
+    self.assertIsNone(manager.get("a"))
+
+  def test_budget_from_memory(self):
+    self.assertEqual(kv_cache_budget_bytes(1024, fraction=0.5), 512*1024*1024)
+    self.assertEqual(kv_cache_budget_bytes(0), DEFAULT_KV_CACHE_BUDGET_BYTES)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import numpy as np
+from exo.inference.prefix_cache import PrefixCache
+from exo.inference.kv_cache_manager import KVCacheManager
+
+
+class TestPrefixCache(unittest.TestCase):
+  def test_longest_shared_prefix(self):
+    cache = PrefixCache()
+    cache.extend("system", [1, 2, 3, 4])
+    cache.extend("chat", [1, 2, 3, 4, 5, 6])
+
+    self.assertEqual(cache.match([1, 2, 3, 4, 5, 9])[0], 5)
+    self.assertEqual(cache.match([1, 2, 3, 4, 5, 9])[1], "chat")
+    self.assertEqual(cache.match([1, 2, 7])[0], 2)
+    self.assertEqual(cache.match([8, 1]), (0, None))
+
+  def test_decode_steps_extend_the_request(self):
+    cache = PrefixCache()
+    cache.extend("turn1", np.array([1, 2, 3]))
+    for token in [10, 11, 12]:
+      cache.extend("turn1", np.array([token]))
+
+    # the next turn re-sends the history plus a new message, only the new tokens are left to prefill
+    self.assertEqual(cache.match([1, 2, 3, 10, 11, 12, 20, 21]), (6, "turn1"))
+    self.assertEqual(cache.lengths["turn1"], 6)
+    self.assertEqual(len(cache.root.children), 1)
+
+  def test_remove_keeps_shared_prefix(self):
+    cache = PrefixCache()
+    cache.extend("a", [1, 2, 3])
+    cache.extend("b", [1, 2, 4])
+    cache.remove("a")
+
+    self.assertEqual(cache.match([1, 2, 3]), (2, "b"))
+    cache.remove("b")
+    self.assertEqual(cache.match([1, 2, 3]), (0, None))
+    self.assertEqual(cache.root.children, {})
+
+  def test_trim_rejected_tokens(self):
+    cache = PrefixCache()
+    cache.extend("a", [1, 2, 3])
+    cache.extend("a", [4, 5, 6])
+    cache.trim("a", 2)
+
+    self.assertEqual(cache.lengths["a"], 4)
+    self.assertEqual(cache.match([1, 2, 3, 4, 5]), (4, "a"))
+
+  def test_evicted_caches_are_forgotten(self):
+    cache = PrefixCache()
+    manager = KVCacheManager(max_entries=1, on_evict=cache.remove)
+    manager.put("a", "kv a")
+    cache.extend("a", [1, 2, 3])
+    manager.release("a")
+    manager.put("b", "kv b")
+
+    self.assertNotIn("a", cache)
+    self.assertEqual(cache.match([1, 2, 3]), (0, None))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,21 +1,24 @@
 from pathlib import Path
 import json
 import os
+import time
 from exo.inference.tinygrad.models.llama import Transformer, TransformerShard, convert_from_huggingface, fix_bf16, sample_logits
 from exo.inference.shard import Shard
 from exo.inference.tokenizers import resolve_tokenizer
 from tinygrad.nn.state import safe_save, safe_load, get_state_dict, load_state_dict
 from tinygrad import Tensor, nn, Context, TinyJit
 from exo.inference.inference_engine import InferenceEngine
+from exo.inference.kv_cache_manager import KVCacheManager
+from exo.inference.prefix_cache import PrefixCache
+from exo.inference.layer_profile import LayerProfile
 import numpy as np
 from exo.inference.tinygrad.tinygrad_helpers import concat_weights, load
 from exo.download.shard_download import ShardDownloader
 from concurrent.futures import ThreadPoolExecutor
-from .stateful_model import make_prompt_state
+from .stateful_model import make_prompt_state, copy_prompt_state
 from .losses import length_masked_ce_loss
-from collections import OrderedDict
 import asyncio
-from typing import Optional
+from typing import Optional, List
 Tensor.no_grad = True 
 # default settings
 TEMPERATURE = int(os.getenv("TEMPERATURE", 0.85))
@@ -66,18 +69,34 @@ class TinygradDynamicShardInferenceEngine(InferenceEngine):
   def __init__(self, shard_downloader: ShardDownloader):
     self.shard = None
     self.shard_downloader = shard_downloader
-    self.states = OrderedDict()
+    self.prefix_cache = PrefixCache()
+    self.kv_caches = KVCacheManager(on_evict=self.prefix_cache.remove)
+    self.layer_profile = LayerProfile()
     self.executor = _executor
 
-  def poll_state(self, x, request_id: str, max_states=2):
-    if request_id not in self.states:
-      if len(self.states) >= max_states:
-        self.states.popitem(last=False)
-      self.states[request_id] = make_prompt_state(x, self.model)
-    else:
-      self.states.move_to_end(request_id)
-    state = self.states[request_id]
-    return {"start_pos": state.start, "cache": state.cache}
+  def poll_state(self, x, request_id: str):
+    state = self.kv_caches.get(request_id)
+    if state is None:
+      self.kv_caches.check_not_evicted(request_id)
+      state = make_prompt_state(x, self.model)
+      self.kv_caches.put(request_id, state, state.nbytes())
+    return state
+
+  def restore_prefix(self, request_id: str, shard: Shard, input_data: np.ndarray) -> int:
+    prefix_len, source = self.match_prefix(request_id, shard, input_data)
+    if source is None: return 0
+    state = copy_prompt_state(self.kv_caches.get(source), prefix_len)
+    self.kv_caches.put(request_id, state, state.nbytes())
+    self.prefix_cache.extend(request_id, input_data[0, :prefix_len])
+    return prefix_len
+
+  async def trim_cache(self, request_id: str, n: int) -> None:
+    def trim():
+      # positions past start are rewritten before they are read again, moving start back is enough
+      state = self.kv_caches.get(request_id)
+      if state is not None: state.start = max(state.start - n, 0)
+    await asyncio.get_running_loop().run_in_executor(self.executor, trim)
+    await super().trim_cache(request_id, n)
 
   async def sample(self, x: np.ndarray, temp=TEMPERATURE, top_p: float = 0.0) -> np.ndarray:
     def sample_wrapper():
@@ -107,15 +126,50 @@ class TinygradDynamicShardInferenceEngine(InferenceEngine):
   
   async def infer_tensor(self, request_id: str, shard: Shard, input_data: np.ndarray, inference_state: Optional[dict] = None) -> tuple[np.ndarray, Optional[dict]]:
     await self.ensure_shard(shard)
-    def wrap_infer():
-      x = Tensor(input_data)
+    prefix_len = await asyncio.get_running_loop().run_in_executor(self.executor, self.restore_prefix, request_id, shard, input_data)
+    def wrap_infer(chunk):
+      x = Tensor(chunk)
       h = self.model.embed(x)
       state = self.poll_state(h, request_id)
-      out = self.model.forward(h, **state)
-      self.states[request_id].start += x.shape[1]
+      out = self.model.forward(h, start_pos=state.start, cache=state.cache)
+      state.start += x.shape[1]
+      self.kv_caches.resize(request_id, state.nbytes())
+      self.record_prefix_tokens(request_id, shard, chunk)
       return out.numpy()
-    output_data = await asyncio.get_running_loop().run_in_executor(self.executor, wrap_infer)
-    return output_data, inference_state
+    # each chunk is its own submission to the executor, so decode batches queued meanwhile run between chunks
+    outputs = [await asyncio.get_running_loop().run_in_executor(self.executor, wrap_infer, chunk) for chunk in self.prefill_chunks(input_data[:, prefix_len:])]
+    return (outputs[0] if len(outputs) == 1 else np.concatenate(outputs, axis=1)), inference_state
+
+  async def infer_tensor_batch(self, request_ids: List[str], shard: Shard, input_datas: List[np.ndarray], inference_states: List[Optional[dict]]) -> List[tuple[np.ndarray, Optional[dict]]]:
+    await self.ensure_shard(shard)
+    def wrap_infer_batch():
+      # timed on the executor thread, so the layer profile holds the forward alone and not the wait behind prefill chunks
+      start = time.perf_counter()
+      outputs = [None]*len(request_ids)
+      states = [self.kv_caches.get(request_id) for request_id in request_ids]
+      # single token steps of requests past their prompt are stacked into one [B, 1] forward, anything else runs on its own
+      stacked = [i for i, (state, input_data) in enumerate(zip(states, input_datas)) if state is not None and state.start > 0 and input_data.shape[:2] == (1, 1)]
+      if len(stacked) < 2: stacked = []
+      if stacked:
+        h = self.model.embed(Tensor(np.concatenate([input_datas[i] for i in stacked])))
+        out = self.model.forward_decode_batch(h, [states[i].start for i in stacked], [states[i].cache for i in stacked]).numpy()
+        for row, i in enumerate(stacked):
+          outputs[i] = out[row:row + 1]
+          states[i].start += 1
+      for i, (request_id, input_data) in enumerate(zip(request_ids, input_datas)):
+        if outputs[i] is None:
+          x = Tensor(input_data)
+          h = self.model.embed(x)
+          state = self.poll_state(h, request_id)
+          # copy out immediately, jitted calls reuse their output buffers
+          outputs[i] = self.model.forward(h, start_pos=state.start, cache=state.cache).numpy()
+          state.start += x.shape[1]
+        self.kv_caches.resize(request_id, self.kv_caches.get(request_id).nbytes())
+        self.record_prefix_tokens(request_id, shard, input_data)
+      self.layer_profile.record(shard, time.perf_counter() - start)
+      return outputs
+    outputs = await asyncio.get_running_loop().run_in_executor(self.executor, wrap_infer_batch)
+    return [(output, inference_state) for output, inference_state in zip(outputs, inference_states)]
 
   async def evaluate(self, request_id: str, shard: Shard, inputs, targets, lengths, loss=length_masked_ce_loss):
     def step(x, y, l):
@@ -155,3 +209,5 @@ class TinygradDynamicShardInferenceEngine(InferenceEngine):
       self.tokenizer = await resolve_tokenizer(tokenizer_path)
       self.shard = shard
       self.model = model_shard
+      self.kv_caches.clear()
+      self.prefix_cache.clear()
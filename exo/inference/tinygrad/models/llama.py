@@ -1,7 +1,9 @@
+import math
 from typing import Tuple, Union, Optional, Dict, Any, List
 from tinygrad import Tensor, Variable, TinyJit, dtypes, nn, Device
 from tinygrad.helpers import getenv
 from collections import OrderedDict
+from exo.inference.tinygrad.paged_kv_cache import PagedKVCache
 
 
 # https://github.com/facebookresearch/llama/blob/1076b9c51c77ad06e9d7ba8a4c6df775741732bd/llama/model.py#L47
@@ -48,6 +50,44 @@ def repeat_kv(x: Tensor, n_rep: int) -> Tensor:
   # NOTE: this is different from x.repeat((1, 1, n_rep, 1))
   return x.repeat((1, 1, 1, n_rep)).reshape(bs, seqlen, n_kv_heads*n_rep, head_dim)
 
+def paged_attention(cache: PagedKVCache, xq: Tensor, start_pos: Union[Variable, int], mask: Optional[Tensor], n_rep: int) -> Tensor:
+  # keys and values are read from the pages where they are, the per page softmax terms are merged against the max over all pages
+  q = xq.transpose(1, 2)
+  spans, scores, offset = cache.page_spans(start_pos, xq.shape[1]), [], 0
+  for page, n in spans:
+    keys = repeat_kv(page[0].shrink((None, (0, n), None, None)), n_rep).transpose(1, 2)
+    page_scores = q @ keys.transpose(-2, -1)/math.sqrt(q.shape[-1])
+    scores.append(page_scores + mask.shrink((None, None, None, (offset, offset + n))) if mask is not None else page_scores)
+    offset += n
+  top = scores[0].max(-1, keepdim=True)
+  for page_scores in scores[1:]: top = top.maximum(page_scores.max(-1, keepdim=True))
+  out, total = None, None
+  for (page, n), page_scores in zip(spans, scores):
+    values = repeat_kv(page[1].shrink((None, (0, n), None, None)), n_rep).transpose(1, 2)
+    weights = (page_scores - top).exp()
+    out = weights @ values if out is None else out + weights @ values
+    total = weights.sum(-1, keepdim=True) if total is None else total + weights.sum(-1, keepdim=True)
+  return (out/total).transpose(1, 2)
+
+
+def cached_attention(cache, xq: Tensor, xk: Tensor, xv: Tensor, start_pos: Union[Variable, int], mask: Optional[Tensor], n_rep: int) -> Tensor:
+  # writes the new keys and values at start_pos and attends over every position up to them, the first chunk attends to itself only
+  seqlen = xk.shape[1]
+  if isinstance(cache, PagedKVCache):
+    cache.update(xk, xv, start_pos)
+    if not isinstance(start_pos, int) or start_pos > 0: return paged_attention(cache, xq, start_pos, mask, n_rep)
+    keys, values = xk, xv
+  elif cache is not None:
+    assert xk.dtype == xv.dtype == cache.dtype, f"{xk.dtype=}, {xv.dtype=}, {cache.dtype=}"
+    cache.shrink((None, None, (start_pos, start_pos + seqlen), None, None)).assign(Tensor.stack(xk, xv)).realize()
+    keys = cache[0].shrink((None, (0, start_pos + seqlen), None, None)) if start_pos > 0 else xk
+    values = cache[1].shrink((None, (0, start_pos + seqlen), None, None)) if start_pos > 0 else xv
+  else:
+    keys, values = xk, xv
+  keys, values = repeat_kv(keys, n_rep).transpose(1, 2), repeat_kv(values, n_rep).transpose(1, 2)
+  return xq.transpose(1, 2).scaled_dot_product_attention(keys, values, mask).transpose(1, 2)
+
+
 class Attention:
   def __init__(self, dim, n_heads, n_kv_heads, max_context, linear=nn.Linear):
     self.n_heads = n_heads
@@ -76,21 +116,27 @@ class Attention:
     xq, xk = apply_rotary_emb(xq, xk, freqs_cis)
     bsz, seqlen, _, _ = xq.shape
 
-    if cache is not None:
-      # update the cache
-      assert xk.dtype == xv.dtype == cache.dtype, f"{xk.dtype=}, {xv.dtype=}, {cache.dtype=}"
-      cache.shrink((None, None, (start_pos, start_pos + seqlen), None, None)).assign(Tensor.stack(xk, xv)).realize()
+    attn = cached_attention(cache, xq, xk, xv, start_pos, mask, self.n_rep).reshape(bsz, seqlen, -1)
+    return self.wo(attn)
 
-      keys = cache[0].shrink((None, (0, start_pos + seqlen), None, None)) if start_pos > 0 else xk
-      values = cache[1].shrink((None, (0, start_pos + seqlen), None, None)) if start_pos > 0 else xv
-    else:
-      keys = xk
-      values = xv
+  def decode_batch(self, x: Tensor, start_positions: List[Union[Variable, int]], freqs_cis: Tensor, caches: List) -> Tensor:
+    """One decode step of len(caches) requests stacked into x of [B, 1, dim], row b at start_positions[b] of caches[b].
 
-    keys, values = repeat_kv(keys, self.n_rep), repeat_kv(values, self.n_rep)
-    xq, keys, values = xq.transpose(1, 2), keys.transpose(1, 2), values.transpose(1, 2)
-    attn = xq.scaled_dot_product_attention(keys, values, mask).transpose(1, 2)
-    attn = attn.reshape(bsz, seqlen, -1)
+    The projections run once for the whole batch, attention runs per row against that row's own cache.
+    """
+    bsz = x.shape[0]
+    xq = self.wq(x).reshape(bsz, 1, self.n_heads, self.head_dim)
+    xk = self.wk(x).reshape(bsz, 1, self.n_kv_heads, self.head_dim)
+    xv = self.wv(x).reshape(bsz, 1, self.n_kv_heads, self.head_dim)
+    xq, xk = apply_rotary_emb(xq, xk, freqs_cis)
+    # realized once so the per row cache writes don't each recompute the batched projections
+    xq, xk, xv = xq.realize(), xk.realize(), xv.realize()
+
+    rows = []
+    for b, (start_pos, cache) in enumerate(zip(start_positions, caches)):
+      # each row binds start_pos to its own value, so rows are realized one at a time
+      rows.append(cached_attention(cache, xq[b:b + 1], xk[b:b + 1], xv[b:b + 1], start_pos, None, self.n_rep).realize())
+    attn = (rows[0].cat(*rows[1:], dim=0) if len(rows) > 1 else rows[0]).reshape(bsz, 1, -1)
     return self.wo(attn)
 
 
@@ -115,6 +161,10 @@ class TransformerBlock:
     h = x + self.attention(self.attention_norm(x), start_pos, freqs_cis, mask, cache=cache)
     return (h + self.feed_forward(self.ffn_norm(h))).contiguous()
 
+  def decode_batch(self, x: Tensor, start_positions: List[Union[Variable, int]], freqs_cis: Tensor, caches: List):
+    h = x + self.attention.decode_batch(self.attention_norm(x), start_positions, freqs_cis, caches)
+    return (h + self.feed_forward(self.ffn_norm(h))).contiguous()
+
 
 # standard openai sampling
 def sample_logits(logits: Tensor, temp: float, k: int, p: float, af: float, ap: float):
@@ -226,8 +276,10 @@ class Transformer:
     return h
 
   def forward(self, x: Tensor, start_pos: int, cache: Optional[List[Tensor]] = None):
-    if x.shape[0:2] == (1, 1) and self.forward_jit is not None and start_pos != 0:
-      return self.forward_jit(x, Variable("start_pos", 1, self.max_context).bind(start_pos), cache=cache)
+    if x.shape[0:2] == (1, 1) and start_pos != 0:
+      # paged caches change shape as pages are added so they can't go through the jit, a bound start_pos still keeps kernels reusable
+      if cache and isinstance(cache[0], PagedKVCache): return self.forward_base(x, Variable("start_pos", 1, self.max_context).bind(start_pos), cache=cache)
+      if self.forward_jit is not None: return self.forward_jit(x, Variable("start_pos", 1, self.max_context).bind(start_pos), cache=cache)
     return self.forward_base(x, start_pos, cache=cache)
 
   def __call__(self, x: Tensor, start_pos: Variable, cache: Optional[List[Tensor]] = None):
@@ -266,10 +318,21 @@ class TransformerShard:
     return out
 
   def forward(self, x: Tensor, start_pos: int, cache: Optional[List[Tensor]] = None):
-    if x.shape[0:2] == (1, 1) and self.forward_jit is not None and start_pos != 0:
-      return self.forward_jit(x, Variable("start_pos", 1, self.max_context).bind(start_pos), cache=cache)
+    if x.shape[0:2] == (1, 1) and start_pos != 0:
+      # paged caches change shape as pages are added so they can't go through the jit, a bound start_pos still keeps kernels reusable
+      if cache and isinstance(cache[0], PagedKVCache): return self.forward_base(x, Variable("start_pos", 1, self.max_context).bind(start_pos), cache=cache)
+      if self.forward_jit is not None: return self.forward_jit(x, Variable("start_pos", 1, self.max_context).bind(start_pos), cache=cache)
     return self.forward_base(x, start_pos, cache=cache)
 
+  def forward_decode_batch(self, x: Tensor, start_positions: List[int], caches: List[List[Tensor]]) -> Tensor:
+    """One decode step for B requests: x is [B, 1, dim], row b continues from start_positions[b] with the per layer caches[b]."""
+    freqs_cis = self.freqs_cis[0][Tensor(start_positions)].unsqueeze(1)
+    # bound like the single request decode path so kernels are reused across positions
+    positions = [Variable("start_pos", 1, self.max_context).bind(start_pos) for start_pos in start_positions]
+    for i, layer in enumerate(self.layers):
+      x = layer.decode_batch(x, positions, freqs_cis, [cache[i] for cache in caches])
+    return self.post(x)
+
   def __call__(self, x: Tensor, start_pos: Variable, cache: Optional[List[Tensor]] = None):
     # TODO: better way to handle the first call v.s. the rest?
     h = self.embed(x)
@@ -0,0 +1,65 @@
+from typing import List, Tuple, Union
+from tinygrad import Tensor, Variable
+from tinygrad.helpers import getenv
+
+KV_PAGE_SIZE = getenv("KV_PAGE_SIZE", 256)
+
+
+class PagedKVCache:
+  """KV cache of one attention layer for one request, kept as a page table of fixed-size pages.
+
+  Pages of (2, bs, page_size, n_kv_heads, head_dim) are allocated as the sequence grows instead of reserving max_context up front,
+  so a short prompt only holds a single page per layer. Pages are freed with the cache. Attention reads the pages in place, one score
+  block per page (see paged_attention in models/llama.py), so the cache is never copied into one contiguous tensor.
+  """
+  def __init__(self, bs: int, max_context: int, n_kv_heads: int, head_dim: int, dtype, device, page_size: int = KV_PAGE_SIZE):
+    self.bs = bs
+    self.max_context = max_context
+    self.n_kv_heads = n_kv_heads
+    self.head_dim = head_dim
+    self.dtype = dtype
+    self.device = device
+    self.page_size = page_size
+    self.pages: List[Tensor] = []
+
+  def _allocate_page(self) -> Tensor:
+    return Tensor.zeros(2, self.bs, self.page_size, self.n_kv_heads, self.head_dim, dtype=self.dtype, device=self.device).contiguous().realize()
+
+  def nbytes(self) -> int:
+    return len(self.pages)*2*self.bs*self.page_size*self.n_kv_heads*self.head_dim*self.dtype.itemsize
+
+  def copy_prefix(self, n: int) -> "PagedKVCache":
+    # whole pages are copied, positions past n are overwritten before they are ever read back
+    copy = PagedKVCache(self.bs, self.max_context, self.n_kv_heads, self.head_dim, self.dtype, self.device, self.page_size)
+    copy.pages = [page.clone().realize() for page in self.pages[:(n + self.page_size - 1)//self.page_size]]
+    return copy
+
+  def update(self, xk: Tensor, xv: Tensor, start_pos: Union[Variable, int]) -> None:
+    # decode steps pass start_pos as a bound Variable so the kernels are reused across positions instead of recompiled per token
+    symbolic = not isinstance(start_pos, int)
+    start = start_pos.unbind()[1] if symbolic else start_pos
+    seqlen = xk.shape[1]
+    end = start + seqlen
+    assert end <= self.max_context, f"sequence of {end} tokens exceeds max_context {self.max_context}"
+    assert xk.dtype == xv.dtype == self.dtype, f"{xk.dtype=}, {xv.dtype=}, {self.dtype=}"
+    while len(self.pages)*self.page_size < end:
+      self.pages.append(self._allocate_page())
+
+    kv = Tensor.stack(xk, xv)
+    pos = start
+    while pos < end:
+      page, offset = divmod(pos, self.page_size)
+      n = min(self.page_size - offset, end - pos)
+      if symbolic and seqlen == 1: offset = Variable("kv_page_offset", 0, self.page_size - 1).bind(offset)
+      self.pages[page].shrink((None, None, (offset, offset + n), None, None)).assign(kv.shrink((None, None, (pos - start, pos - start + n), None, None))).realize()
+      pos += n
+
+  def page_spans(self, start_pos: Union[Variable, int], seqlen: int) -> List[Tuple[Tensor, Union[Variable, int]]]:
+    """(page, number of its positions in use) for every page holding positions before start_pos + seqlen."""
+    symbolic = not isinstance(start_pos, int)
+    end = (start_pos.unbind()[1] if symbolic else start_pos) + seqlen
+    n_pages = (end + self.page_size - 1)//self.page_size
+    last = end - (n_pages - 1)*self.page_size
+    # with a bound start_pos the last page's length is bound too, so the kernels are reused as the page fills up
+    if symbolic: last = Variable("kv_page_len", 1, self.page_size).bind(last)
+    return [(self.pages[i], self.page_size if i < n_pages - 1 else last) for i in range(n_pages)]
@@ -1,8 +1,12 @@
 from tinygrad import Tensor, Variable 
+from tinygrad.helpers import getenv
 from collections import OrderedDict
-from typing import List, Optional
+from typing import List, Optional, Union
+from .paged_kv_cache import PagedKVCache
 
 def create_kv_cache(x: Tensor, layer):
+  if getenv("PAGED_KVCACHE") and not isinstance(x.device, tuple):
+    return PagedKVCache(x.shape[0], layer.max_context, layer.n_kv_heads, layer.head_dim, x.dtype, x.device)
   cache_kv = Tensor.zeros(2, x.shape[0], layer.max_context, layer.n_kv_heads, layer.head_dim, dtype=x.dtype).contiguous().realize()
   if isinstance(x.device, tuple):
     # TODO: instead of specifying how to shard, it can follow how xk and xv are being sharded
@@ -10,12 +14,20 @@ def create_kv_cache(x: Tensor, layer):
   return cache_kv.realize()
 
 class ModelState:
-  cache: List[Tensor]
+  cache: List[Union[Tensor, PagedKVCache]]
   start: int 
-  def __init__(self, cache: List[Tensor], start: int = 0):
+  def __init__(self, cache: List[Union[Tensor, PagedKVCache]], start: int = 0):
     self.cache = cache
     self.start = start
 
+  def nbytes(self) -> int:
+    return sum(c.nbytes() for c in self.cache)
+
+def copy_prompt_state(source: ModelState, n: int) -> ModelState:
+  # dense caches are cloned whole, like pages only positions below n are ever read before being rewritten
+  cache = [c.copy_prefix(n) if isinstance(c, PagedKVCache) else c.clone().realize() for c in source.cache]
+  return ModelState(cache, start=n)
+
 def make_prompt_state(x: Tensor, model):
   cache = [create_kv_cache(x, l.attention) for l in model.layers]
 
@@ -0,0 +1,39 @@
+import unittest
+import numpy as np
+from tinygrad import Tensor, dtypes
+from exo.inference.shard import Shard
+from exo.inference.tinygrad.models.llama import Transformer, TransformerShard, precompute_freqs_cis
+from exo.inference.tinygrad.stateful_model import make_prompt_state
+
+
+class TestDecodeBatch(unittest.TestCase):
+  def test_matches_sequential_decode(self):
+    Tensor.manual_seed(0)
+    shard = Shard("test", 0, 1, 2)
+    base = Transformer(dim=16, hidden_dim=32, n_heads=4, n_layers=2, norm_eps=1e-5, vocab_size=50, n_kv_heads=2, max_context=32, jit=False, shard=shard)
+    model = TransformerShard(shard, base, jit=False)
+    model.freqs_cis = precompute_freqs_cis(4, 64, dtype=dtypes.float32).contiguous()
+
+    def prefill(prompt):
+      h = model.embed(Tensor(prompt))
+      state = make_prompt_state(h, model)
+      model.forward(h, 0, state.cache).realize()
+      state.start = prompt.shape[1]
+      return state
+
+    # prompts of different lengths, so every row attends over a different number of positions
+    prompts = [np.array([[1, 2, 3]]), np.array([[4, 5, 6, 7, 8]]), np.array([[9, 10]])]
+    sequential, batched = [prefill(p) for p in prompts], [prefill(p) for p in prompts]
+    for step in range(3):
+      tokens = [np.array([[11 + step + i]]) for i in range(len(prompts))]
+      expected = []
+      for state, token in zip(sequential, tokens):
+        expected.append(model.forward(model.embed(Tensor(token)), state.start, state.cache).numpy())
+        state.start += 1
+      actual = model.forward_decode_batch(model.embed(Tensor(np.concatenate(tokens))), [s.start for s in batched], [s.cache for s in batched]).numpy()
+      for state in batched: state.start += 1
+      np.testing.assert_allclose(actual, np.concatenate(expected), atol=1e-4)
+
+
+if __name__ == "__main__":
+  unittest.main()
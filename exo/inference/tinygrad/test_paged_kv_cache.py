@@ -0,0 +1,45 @@
+import unittest
+import numpy as np
+from tinygrad import Tensor, Variable, dtypes
+from exo.inference.tinygrad.models.llama import Attention, precompute_freqs_cis
+from exo.inference.tinygrad.paged_kv_cache import PagedKVCache
+
+
+class TestPagedKVCache(unittest.TestCase):
+  def test_matches_dense_cache(self):
+    Tensor.manual_seed(0)
+    dim, n_heads, n_kv_heads, max_context = 16, 4, 2, 32
+    attention = Attention(dim, n_heads, n_kv_heads, max_context)
+    freqs_cis = precompute_freqs_cis(dim // n_heads, max_context*2, dtype=dtypes.float32)
+    dense = Tensor.zeros(2, 1, max_context, n_kv_heads, dim // n_heads).contiguous().realize()
+    paged = PagedKVCache(1, max_context, n_kv_heads, dim // n_heads, dtypes.float32, Tensor.zeros(1).device, page_size=4)
+
+    prompt_len = 6
+    x = Tensor.randn(1, prompt_len, dim).realize()
+    mask = Tensor.full((1, 1, prompt_len, prompt_len), float("-inf")).triu(1).realize()
+    expected = attention(x, 0, freqs_cis.shrink((None, (0, prompt_len), None, None, None)), mask, cache=dense).numpy()
+    actual = attention(x, 0, freqs_cis.shrink((None, (0, prompt_len), None, None, None)), mask, cache=paged).numpy()
+    np.testing.assert_allclose(actual, expected, atol=1e-5)
+    self.assertEqual(len(paged.pages), 2)
+
+    for start_pos in range(prompt_len, prompt_len + 4):
+      x = Tensor.randn(1, 1, dim).realize()
+      expected = attention(x, start_pos, freqs_cis.shrink((None, (start_pos, start_pos + 1), None, None, None)), None, cache=dense).numpy()
+      bound = Variable("start_pos", 1, max_context).bind(start_pos)
+      actual = attention(x, bound, freqs_cis.shrink((None, (bound, bound + 1), None, None, None)), None, cache=paged).numpy()
+      np.testing.assert_allclose(actual, expected, atol=1e-5)
+
+    self.assertEqual(len(paged.pages), 3)
+    self.assertEqual(paged.nbytes(), 3*2*4*n_kv_heads*(dim // n_heads)*4)
+
+    # a later prefill chunk: its mask is split across the pages it attends over
+    start_pos, chunk_len = prompt_len + 4, 3
+    x = Tensor.randn(1, chunk_len, dim).realize()
+    mask = Tensor.full((1, 1, chunk_len, start_pos + chunk_len), float("-inf")).triu(start_pos + 1).realize()
+    freqs = freqs_cis.shrink((None, (start_pos, start_pos + chunk_len), None, None, None))
+    np.testing.assert_allclose(attention(x, start_pos, freqs, mask, cache=paged).numpy(), attention(x, start_pos, freqs, mask, cache=dense).numpy(), atol=1e-5)
+    self.assertEqual(len(paged.pages), 4)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -13,11 +13,19 @@ from tqdm import tqdm
 from exo.train.dataset import load_dataset, iterate_batches
 from exo.networking.manual.manual_discovery import ManualDiscovery
 from exo.orchestration.node import Node
+from exo.orchestration.speculative import DraftModelProposer, PromptLookupProposer
 from exo.networking.grpc.grpc_server import GRPCServer
+from exo.networking.shm.shm_peer_handle import ShmPeerHandle
+from exo.networking.tcp.tcp_peer_handle import TCPPeerHandle
+from exo.networking.tcp.tcp_server import TCPServer
+from exo.networking.shm.shm_server import ShmServer
 from exo.networking.udp.udp_discovery import UDPDiscovery
 from exo.networking.tailscale.tailscale_discovery import TailscaleDiscovery
 from exo.networking.grpc.grpc_peer_handle import GRPCPeerHandle
 from exo.topology.ring_memory_weighted_partitioning_strategy import RingMemoryWeightedPartitioningStrategy
+from exo.topology.latency_aware_partitioning_strategy import LatencyAwarePartitioningStrategy
+from exo.topology.adaptive_partitioning_strategy import AdaptivePartitioningStrategy
+from exo.topology.replicated_partitioning_strategy import ReplicatedPartitioningStrategy
 from exo.api import ChatGPTAPI
 from exo.download.shard_download import ShardDownloader, NoopShardDownloader
 from exo.download.download_progress import RepoProgressEvent
@@ -26,7 +34,7 @@ from exo.helpers import print_yellow_exo, find_available_port, DEBUG, get_system
 from exo.inference.shard import Shard
 from exo.inference.inference_engine import get_inference_engine
 from exo.inference.tokenizers import resolve_tokenizer
-from exo.models import build_base_shard, get_repo
+from exo.models import build_base_shard, build_full_shard, get_repo
 from exo.viz.topology_viz import TopologyViz
 import uvloop
 import concurrent.futures
@@ -81,8 +89,28 @@ parser.add_argument("--wait-for-peers", type=int, default=0, help="Number of pee
 parser.add_argument("--chatgpt-api-port", type=int, default=52415, help="ChatGPT API port")
 parser.add_argument("--chatgpt-api-response-timeout", type=int, default=900, help="ChatGPT API response timeout in seconds")
 parser.add_argument("--max-generate-tokens", type=int, default=10000, help="Max tokens to generate in each request")
+parser.add_argument("--kv-cache-budget-mb", type=int, default=None, help="Memory budget for KV caches in MB (default: a quarter of device memory)")
+parser.add_argument("--prefill-chunk-size", type=int, default=512, help="Process prompts in chunks of this many tokens, interleaved with other requests' decode steps (0 to disable)")
+parser.add_argument("--max-decode-batch-size", type=int, default=16, help="Max number of concurrent requests' decode steps run in one batch (tinygrad only, MLX runs each step on its own)")
+parser.add_argument("--speculative-decoding", type=str, choices=["draft", "prompt-lookup"], default=None, help="Propose tokens with a draft model (see --draft-model) or by looking up n-grams in the prompt and output so far")
+parser.add_argument("--draft-model", type=str, default=None, help="Small model (e.g. llama-3.2-1b) proposing tokens for speculative decoding, must share the served model's tokenizer")
+parser.add_argument("--num-speculative-tokens", type=int, default=4, help="Number of tokens proposed per speculative decoding step")
+parser.add_argument("--tensor-compression", type=str, choices=["none", "auto", "auto-int8", "fp16", "bf16", "int8"], default="none", help="Lossy encoding of large activations sent between nodes (auto: 16-bit for float32 ones, auto-int8: also int8 on links slower than 100MB/s)")
+parser.add_argument("--transport", type=str, choices=["grpc", "tcp"], default="grpc", help="Transport between nodes, all nodes of a cluster must use the same one (tcp: length-prefixed frames over plain sockets, lower per-hop latency)")
+parser.add_argument("--partitioning-strategy", type=str, choices=["memory", "latency"], default="memory", help="How layers are split between nodes (memory: in proportion to memory, latency: to minimize estimated per-token latency from flops and link speeds, within each node's memory)")
+parser.add_argument("--ring-ordering", action=argparse.BooleanOptionalAction, default=True, help="Arrange nodes into the ring with the fastest links between neighbours (measured, or by interface type) instead of by memory")
+parser.add_argument("--calibrate", action=argparse.BooleanOptionalAction, default=True, help="Measure this device's flops and memory bandwidth at startup instead of using the chip table (cached per host)")
+parser.add_argument("--recalibrate", action="store_true", help="Measure again even if this host has a cached calibration")
+parser.add_argument("--adaptive-partitioning", action=argparse.BooleanOptionalAction, default=False, help="Move layer boundaries between nodes when their measured per-layer times leave the pipeline imbalanced")
+parser.add_argument("--rebalance-interval", type=float, default=10.0, help="Seconds between layer profile broadcasts and rebalancing checks with --adaptive-partitioning")
+parser.add_argument("--pipeline-replicas", type=int, default=1, help="Split the nodes into this many independent pipelines that each hold the whole model, new requests go to the least busy one")
+parser.add_argument("--min-replica-memory-mb", type=int, default=0, help="Form fewer pipeline replicas when they would get less memory than this (MB) each, the model has to fit in every replica")
+parser.add_argument("--link-probe-interval", type=float, default=15.0, help="Seconds between measurements of the latency and bandwidth of the links to peers, 0 to disable")
+parser.add_argument("--channels-per-peer", type=int, default=2, help="gRPC connections opened to each peer, calls are spread over them so large transfers don't hold up the others")
+parser.add_argument("--shm-transport", action=argparse.BooleanOptionalAction, default=True, help="Send tensors to nodes on the same host through shared memory")
 parser.add_argument("--inference-engine", type=str, default=None, help="Inference engine to use (mlx, tinygrad, or dummy)")
 parser.add_argument("--disable-tui", action=argparse.BooleanOptionalAction, help="Disable TUI")
+parser.add_argument("--observe-results", action="store_true", help="Receive generated tokens of requests started on other nodes (e.g. to show them in the TUI)")
 parser.add_argument("--run-model", type=str, help="Specify a model to run directly")
 parser.add_argument("--prompt", type=str, help="Prompt for the model when using --run-model", default="Who are you?")
 parser.add_argument("--default-temp", type=float, help="Default token sampling temperature", default=0.0)
@@ -116,6 +144,15 @@ print(f"Inference engine name after selection: {inference_engine_name}")
 inference_engine = get_inference_engine(inference_engine_name, shard_downloader)
 print(f"Using inference engine: {inference_engine.__class__.__name__} with shard downloader: {shard_downloader.__class__.__name__}")
 
+speculator = None
+if args.speculative_decoding == "prompt-lookup":
+  speculator = PromptLookupProposer(args.num_speculative_tokens)
+elif args.speculative_decoding == "draft" or args.draft_model:
+  if not args.draft_model: raise ValueError("--draft-model is required for --speculative-decoding draft")
+  draft_shard = build_full_shard(args.draft_model, inference_engine.__class__.__name__)
+  if draft_shard is None: raise ValueError(f"Draft model {args.draft_model} is not supported by {inference_engine.__class__.__name__}")
+  speculator = DraftModelProposer(get_inference_engine(inference_engine_name, shard_downloader), draft_shard, args.num_speculative_tokens)
+
 if args.node_port is None:
   args.node_port = find_available_port(args.node_host)
   if DEBUG >= 1: print(f"Using available port: {args.node_port}")
@@ -135,13 +172,21 @@ if DEBUG >= 0:
 allowed_node_ids = args.node_id_filter.split(',') if args.node_id_filter else None
 allowed_interface_types = args.interface_type_filter.split(',') if args.interface_type_filter else None
 
+def create_peer_handle(peer_id, address, description, device_capabilities):
+  if args.transport == "tcp":
+    peer_handle = TCPPeerHandle(peer_id, address, description, device_capabilities, tensor_compression=args.tensor_compression)
+  else:
+    peer_handle = GRPCPeerHandle(peer_id, address, description, device_capabilities, tensor_compression=args.tensor_compression, channels=args.channels_per_peer)
+  return ShmPeerHandle(peer_handle) if args.shm_transport else peer_handle
+
+
 if args.discovery_module == "udp":
   discovery = UDPDiscovery(
     args.node_id,
     args.node_port,
     args.listen_port,
     args.broadcast_port,
-    lambda peer_id, address, description, device_capabilities: GRPCPeerHandle(peer_id, address, description, device_capabilities),
+    create_peer_handle,
     discovery_timeout=args.discovery_timeout,
     allowed_node_ids=allowed_node_ids,
     allowed_interface_types=allowed_interface_types
@@ -150,7 +195,7 @@ elif args.discovery_module == "tailscale":
   discovery = TailscaleDiscovery(
     args.node_id,
     args.node_port,
-    lambda peer_id, address, description, device_capabilities: GRPCPeerHandle(peer_id, address, description, device_capabilities),
+    create_peer_handle,
     discovery_timeout=args.discovery_timeout,
     tailscale_api_key=args.tailscale_api_key,
     tailnet=args.tailnet_name,
@@ -159,20 +204,36 @@ elif args.discovery_module == "tailscale":
 elif args.discovery_module == "manual":
   if not args.discovery_config_path:
     raise ValueError(f"--discovery-config-path is required when using manual discovery. Please provide a path to a config json file.")
-  discovery = ManualDiscovery(args.discovery_config_path, args.node_id, create_peer_handle=lambda peer_id, address, description, device_capabilities: GRPCPeerHandle(peer_id, address, description, device_capabilities))
+  discovery = ManualDiscovery(args.discovery_config_path, args.node_id, create_peer_handle=create_peer_handle)
 topology_viz = TopologyViz(chatgpt_api_endpoints=chatgpt_api_endpoints, web_chat_urls=web_chat_urls) if not args.disable_tui else None
+partitioning_strategy = LatencyAwarePartitioningStrategy(ring_ordering=args.ring_ordering) if args.partitioning_strategy == "latency" else RingMemoryWeightedPartitioningStrategy(ring_ordering=args.ring_ordering)
+if args.pipeline_replicas > 1:
+  if args.adaptive_partitioning:
+    print("Warning: --adaptive-partitioning only works with a single pipeline replica, disabling it.")
+    args.adaptive_partitioning = False
+  partitioning_strategy = ReplicatedPartitioningStrategy(partitioning_strategy, args.pipeline_replicas, args.min_replica_memory_mb)
 node = Node(
   args.node_id,
   None,
   inference_engine,
   discovery,
   shard_downloader,
-  partitioning_strategy=RingMemoryWeightedPartitioningStrategy(),
+  partitioning_strategy=AdaptivePartitioningStrategy(partitioning_strategy) if args.adaptive_partitioning else partitioning_strategy,
   max_generate_tokens=args.max_generate_tokens,
   topology_viz=topology_viz,
-  default_sample_temperature=args.default_temp
+  default_sample_temperature=args.default_temp,
+  max_decode_batch_size=args.max_decode_batch_size,
+  observe_results=args.observe_results,
+  kv_cache_budget=args.kv_cache_budget_mb*1024*1024 if args.kv_cache_budget_mb is not None else None,
+  prefill_chunk_size=args.prefill_chunk_size or None,
+  speculator=speculator,
+  link_probe_interval=args.link_probe_interval,
+  rebalance_interval=args.rebalance_interval,
+  calibrate=args.calibrate,
+  recalibrate=args.recalibrate,
 )
-server = GRPCServer(node, args.node_host, args.node_port)
+server = TCPServer(node, args.node_host, args.node_port) if args.transport == "tcp" else GRPCServer(node, args.node_host, args.node_port)
+if args.shm_transport: server = ShmServer(args.node_id, server)
 node.server = server
 api = ChatGPTAPI(
   node,
@@ -0,0 +1,86 @@
+from typing import Iterable, Optional, Tuple
+import numpy as np
+
+# encodings this build can decode, advertised to peers in health checks so a sender never uses one the receiver doesn't know
+TENSOR_ENCODINGS = ("none", "fp16", "bf16", "int8")
+FP16_MAX = float(np.finfo(np.float16).max)
+# auto picks a 16-bit encoding for large float32 tensors, auto-int8 also quantizes on slow links, the rest force one encoding
+TENSOR_COMPRESSION_MODES = ("none", "auto", "auto-int8", "fp16", "bf16", "int8")
+
+
+def tensor_buffer(array: np.ndarray) -> memoryview:
+  return memoryview(np.ascontiguousarray(array).reshape(-1).view(np.uint8))
+
+
+def encode_tensor(tensor: np.ndarray, encoding: str) -> Tuple[memoryview, bytes]:
+  """Returns the encoded data and, for int8, the per-channel scales. The original dtype and shape travel separately.
+
+  The data is a view of the tensor when it isn't encoded, so serializing it is the only copy.
+  """
+  if encoding == "none":
+    return tensor_buffer(tensor), b""
+  if encoding == "fp16":
+    return tensor_buffer(tensor.astype(np.float16)), b""
+  if encoding == "bf16":
+    # bfloat16 is the upper half of a float32, round to nearest even before dropping the low bits
+    bits = np.ascontiguousarray(tensor, dtype=np.float32).view(np.uint32)
+    bits = bits + (np.uint32(0x7FFF) + ((bits >> 16) & 1))
+    return tensor_buffer((bits >> 16).astype(np.uint16)), b""
+  if encoding == "int8":
+    # one scale per channel (last axis), activations have a few channels with much larger magnitudes than the rest
+    x = tensor.astype(np.float32)
+    scales = np.abs(x).reshape(-1, x.shape[-1]).max(axis=0) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.clip(np.rint(x/scales), -127, 127).astype(np.int8)
+    return tensor_buffer(q), scales.astype(np.float32).tobytes()
+  raise ValueError(f"Unknown tensor encoding: {encoding}")
+
+
+def decode_tensor(data, shape, dtype: str, encoding: str = "none", scales: bytes = b"") -> np.ndarray:
+  dtype = np.dtype(dtype)
+  if not encoding or encoding == "none":
+    return np.frombuffer(data, dtype=dtype).reshape(shape)
+  if encoding == "fp16":
+    return np.frombuffer(data, dtype=np.float16).reshape(shape).astype(dtype)
+  if encoding == "bf16":
+    return (np.frombuffer(data, dtype=np.uint16).astype(np.uint32) << 16).view(np.float32).reshape(shape).astype(dtype)
+  if encoding == "int8":
+    q = np.frombuffer(data, dtype=np.int8).reshape(shape)
+    return (q.astype(np.float32)*np.frombuffer(scales, dtype=np.float32)).astype(dtype)
+  raise ValueError(f"Unknown tensor encoding: {encoding}")
+
+
+class TensorCodecPolicy:
+  """Picks the encoding of each tensor sent over one link.
+
+  Tensors are sent as is by default, every encoding but none is lossy and has to be asked for. Small tensors (decode steps) are always
+  sent as is: they are latency bound and encoding them only costs time. In auto mode large tensors (prefill) are downcast to 16 bits
+  when they are float32; auto-int8 also quantizes them to int8 when the link's measured bandwidth is below slow_link_bandwidth. With
+  mode set to a specific encoding, that encoding is used for every large float tensor the receiver can decode.
+  """
+  def __init__(self, mode: str = "none", min_bytes: int = 256*1024, slow_link_bandwidth: float = 100e6, smoothing: float = 0.3):
+    if mode not in TENSOR_COMPRESSION_MODES: raise ValueError(f"Unknown tensor compression mode: {mode}")
+    self.mode = mode
+    self.min_bytes = min_bytes
+    self.slow_link_bandwidth = slow_link_bandwidth
+    self.smoothing = smoothing
+    # bytes per second, exponentially weighted over recent large transfers
+    self.bandwidth: Optional[float] = None
+
+  def record_transfer(self, nbytes: int, seconds: float) -> None:
+    # small transfers are dominated by fixed overheads and say little about bandwidth
+    if nbytes < self.min_bytes or seconds <= 0: return
+    sample = nbytes/seconds
+    self.bandwidth = sample if self.bandwidth is None else (1 - self.smoothing)*self.bandwidth + self.smoothing*sample
+
+  def select(self, tensor: np.ndarray, supported: Iterable[str] = ("none", )) -> str:
+    supported = set(supported)
+    if self.mode == "none" or tensor.nbytes < self.min_bytes or not np.issubdtype(tensor.dtype, np.floating): return "none"
+    if self.mode not in ("auto", "auto-int8"): return self.mode if self.mode in supported else "none"
+    if self.mode == "auto-int8" and self.bandwidth is not None and self.bandwidth < self.slow_link_bandwidth and "int8" in supported: return "int8"
+    if tensor.dtype == np.float32:
+      # fp16 keeps more precision, but bf16 is needed when the activations don't fit in fp16's range
+      encoding = "fp16" if np.abs(tensor).max() <= FP16_MAX else "bf16"
+      if encoding in supported: return encoding
+    return "none"
+
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Tuple
+from exo.helpers import AsyncCallbackSystem
 from .peer_handle import PeerHandle
 
 
@@ -15,3 +16,9 @@ class Discovery(ABC):
   @abstractmethod
   async def discover_peers(self, wait_for_peers: int = 0) -> List[PeerHandle]:
     pass
+
+  @property
+  def on_peers_changed(self) -> AsyncCallbackSystem[str, Tuple[()]]:
+    """Triggered when a peer is added, removed or found at a new address, so nodes don't have to wait for their next poll of discover_peers."""
+    if "_on_peers_changed" not in self.__dict__: self._on_peers_changed = AsyncCallbackSystem[str, Tuple[()]]()
+    return self._on_peers_changed
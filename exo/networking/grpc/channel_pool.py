@@ -0,0 +1,52 @@
+import asyncio
+import itertools
+from typing import Callable, List
+import grpc
+from . import node_service_pb2_grpc
+
+
+class ChannelPool:
+  """Several channels to one peer, with calls spread over them in turn.
+
+  The calls on a channel are multiplexed over one HTTP/2 connection, where a large transfer holds up everything queued behind it and
+  is limited by the one TCP window. Calls on different channels of the pool go over separate connections and run in parallel.
+  """
+  def __init__(self, address: str, options: List[tuple], size: int = 2):
+    # channels with the same target and options share one connection unless each has its own subchannel pool
+    self.channels = [grpc.aio.insecure_channel(address, options=options + [("grpc.use_local_subchannel_pool", 1)]) for _ in range(max(1, size))]
+    self.counter = itertools.count()
+
+  def next_index(self) -> int:
+    return next(self.counter) % len(self.channels)
+
+  def stub(self) -> "PooledStub":
+    return PooledStub(self)
+
+  def unary_unary(self, method: str, request_serializer: Callable, response_deserializer: Callable) -> Callable:
+    calls = [channel.unary_unary(method, request_serializer=request_serializer, response_deserializer=response_deserializer) for channel in self.channels]
+    return lambda request, **kwargs: calls[self.next_index()](request, **kwargs)
+
+  async def channel_ready(self) -> None:
+    await asyncio.gather(*(channel.channel_ready() for channel in self.channels))
+
+  async def close(self) -> None:
+    await asyncio.gather(*(channel.close() for channel in self.channels), return_exceptions=True)
+
+
+class PooledStub:
+  """A NodeServiceStub whose calls each go to the next channel of a ChannelPool.
+
+  Calls on different channels can overtake each other, calls whose order matters (the results and statuses of a request) go through
+  pinned(request_id) instead.
+  """
+  def __init__(self, pool: ChannelPool):
+    self.pool = pool
+    self.stubs = [node_service_pb2_grpc.NodeServiceStub(channel) for channel in pool.channels]
+
+  def pinned(self, key: str) -> node_service_pb2_grpc.NodeServiceStub:
+    """The stub of the one channel all calls for key go through, in the order they are made."""
+    return self.stubs[hash(key) % len(self.stubs)]
+
+  def __getattr__(self, method: str):
+    if method in ("pool", "stubs"): raise AttributeError(method)
+    return getattr(self.stubs[self.pool.next_index()], method)
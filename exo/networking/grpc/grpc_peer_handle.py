@@ -1,33 +1,56 @@
 import grpc
 import numpy as np
 import asyncio
-from typing import Optional, Tuple, List
+import time
+import uuid
+from typing import Optional, Tuple, List, Dict
 
 from . import node_service_pb2
-from . import node_service_pb2_grpc
+from .tensor_codec import serialize_tensor_chunk, serialize_tensor_frame, serialize_tensor_request
+from .inference_state_codec import InferenceStateEncoder
+from .channel_pool import ChannelPool
+from .topology_codec import delta_from_proto, delta_to_proto
 
 from ..peer_handle import PeerHandle
 from exo.inference.shard import Shard
 from exo.topology.topology import Topology
+from exo.topology.topology_sync import NodeRecord
 from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
 from exo.helpers import DEBUG
-import json
-import platform
-
-if platform.system().lower() == "darwin" and platform.machine().lower() == "arm64":
-  import mlx.core as mx
-else:
-  import numpy as mx
+from exo.networking.compression import TensorCodecPolicy, encode_tensor
+from exo.networking.striping import StripePolicy
 
 
 class GRPCPeerHandle(PeerHandle):
-  def __init__(self, _id: str, address: str, desc: str, device_capabilities: DeviceCapabilities):
+  def __init__(self, _id: str, address: str, desc: str, device_capabilities: DeviceCapabilities, use_tensor_stream: bool = True, max_frames_in_flight: int = 64, tensor_compression: str = "none", channels: int = 2):
     self._id = _id
     self.address = address
     self.desc = desc
     self._device_capabilities = device_capabilities
+    self.channels = channels
+    self.channel_pool: Optional[ChannelPool] = None
+    # the pool's first channel, which carries the tensor stream and tells whether the peer is connected
     self.channel = None
     self.stub = None
+    self.send_tensor_call = None
+    self.stream_tensors_call = None
+    self.send_tensor_chunk_call = None
+    # tensors go over one long-lived StreamTensors call per peer instead of a SendTensor call per hop
+    self.use_tensor_stream = use_tensor_stream
+    self.tensor_stream = None
+    self.tensor_stream_reader: Optional[asyncio.Task] = None
+    self.pending_frames: Dict[int, asyncio.Future] = {}
+    self.frame_sequence = 0
+    self.frame_window = asyncio.Semaphore(max_frames_in_flight)
+    self._stream_lock = asyncio.Lock()
+    self.codec_policy = TensorCodecPolicy(tensor_compression)
+    # learned from the peer's health check, until then tensors are sent unencoded
+    self.tensor_encodings = ("none", )
+    self.inference_state_encoder = InferenceStateEncoder()
+    # large tensors are striped across every address the peer is known at, over one extra connection per address
+    self.stripe_policy = StripePolicy()
+    self.stripe_links: Dict[str, tuple] = {}
+    self.stripe_sender_id = uuid.uuid4().hex
     self.channel_options = [
       ("grpc.max_metadata_size", 32 * 1024 * 1024),
       ("grpc.max_receive_message_length", 256 * 1024 * 1024),
@@ -55,21 +78,37 @@ class GRPCPeerHandle(PeerHandle):
   def device_capabilities(self) -> DeviceCapabilities:
     return self._device_capabilities
 
+  def update_addresses(self, addresses: List[str]) -> None:
+    self.stripe_policy.update_addresses(addresses)
+
   async def connect(self):
-    self.channel = grpc.aio.insecure_channel(
-      self.address,
-      options=self.channel_options,
-      compression=grpc.Compression.Gzip
+    self.close_tensor_stream()
+    await self.close_stripe_links()
+    # no channel compression: activations are float data that gzip barely shrinks, tensors are encoded by codec_policy instead
+    self.channel_pool = ChannelPool(self.address, self.channel_options, self.channels)
+    self.channel = self.channel_pool.channels[0]
+    self.stub = self.channel_pool.stub()
+    # tensors are serialized from their own buffers by the tensor codec rather than copied into the protobuf message first
+    self.send_tensor_call = self.channel_pool.unary_unary(
+      "/node_service.NodeService/SendTensor", request_serializer=serialize_tensor_request, response_deserializer=node_service_pb2.Tensor.FromString
+    )
+    self.stream_tensors_call = self.channel.stream_stream(
+      "/node_service.NodeService/StreamTensors", request_serializer=serialize_tensor_frame, response_deserializer=node_service_pb2.TensorAck.FromString
     )
-    self.stub = node_service_pb2_grpc.NodeServiceStub(self.channel)
-    await asyncio.wait_for(self.channel.channel_ready(), timeout=10.0)
+    self.send_tensor_chunk_call = self.channel_pool.unary_unary(
+      "/node_service.NodeService/SendTensorChunk", request_serializer=serialize_tensor_chunk, response_deserializer=node_service_pb2.Empty.FromString
+    )
+    await asyncio.wait_for(self.channel_pool.channel_ready(), timeout=10.0)
 
   async def is_connected(self) -> bool:
     return self.channel is not None and self.channel.get_state() == grpc.ChannelConnectivity.READY
 
   async def disconnect(self):
-    if self.channel:
-      await self.channel.close()
+    self.close_tensor_stream()
+    await self.close_stripe_links()
+    if self.channel_pool:
+      await self.channel_pool.close()
+    self.channel_pool = None
     self.channel = None
     self.stub = None
 
@@ -87,6 +126,7 @@ class GRPCPeerHandle(PeerHandle):
       await self._ensure_connected()
       request = node_service_pb2.HealthCheckRequest()
       response = await asyncio.wait_for(self.stub.HealthCheck(request), timeout=5)
+      self.tensor_encodings = tuple(response.tensor_encodings) or ("none", )
       return response.is_healthy
     except asyncio.TimeoutError:
       return False
@@ -97,7 +137,7 @@ class GRPCPeerHandle(PeerHandle):
         traceback.print_exc()
       return False
 
-  async def send_prompt(self, shard: Shard, prompt: str, inference_state: Optional[dict] = None, request_id: Optional[str] = None) -> Optional[np.array]:
+  async def send_prompt(self, shard: Shard, prompt: str, inference_state: Optional[dict] = None, request_id: Optional[str] = None, origin_node_id: Optional[str] = None) -> Optional[np.array]:
     await self._ensure_connected()
     request = node_service_pb2.PromptRequest(
       prompt=prompt,
@@ -108,29 +148,166 @@ class GRPCPeerHandle(PeerHandle):
         n_layers=shard.n_layers,
       ),
       request_id=request_id,
-      inference_state=None if inference_state is None else self.serialize_inference_state(inference_state)
+      inference_state=None if inference_state is None else self.serialize_inference_state(inference_state),
+      origin_node_id=origin_node_id,
     )
     await self.stub.SendPrompt(request)
 
-  async def send_tensor(self, shard: Shard, tensor: np.ndarray, inference_state: Optional[dict] = None, request_id: Optional[str] = None) -> Optional[np.array]:
+  async def send_tensor(self, shard: Shard, tensor: np.ndarray, inference_state: Optional[dict] = None, request_id: Optional[str] = None, origin_node_id: Optional[str] = None) -> Optional[np.array]:
     await self._ensure_connected()
-    request = node_service_pb2.TensorRequest(
+    encoding = self.codec_policy.select(tensor, self.tensor_encodings)
+    tensor_data, scales = encode_tensor(tensor, encoding)
+    tensor_proto = node_service_pb2.Tensor(shape=tensor.shape, dtype=str(tensor.dtype), encoding=encoding, scales=scales)
+    transfer_id = await self.send_stripes(tensor_data)
+    request = self.tensor_request(shard, tensor_proto, inference_state, request_id, origin_node_id)
+    if transfer_id is not None:
+      request.transfer_id = transfer_id
+      tensor_data = b""
+    try:
+      response = await self.deliver_tensor(request, tensor_data)
+    except BaseException:
+      # the peer may or may not have the inference state, the next one goes in full rather than as a delta against it
+      self.inference_state_encoder.discard(request_id)
+      raise
+    self.inference_state_encoder.confirm(request_id)
+
+    if response is None or not response.tensor_data or not response.shape or not response.dtype:
+      return None
+
+    return np.frombuffer(response.tensor_data, dtype=np.dtype(response.dtype)).reshape(response.shape)
+
+  async def deliver_tensor(self, request: node_service_pb2.TensorRequest, tensor_data: memoryview) -> Optional[node_service_pb2.Tensor]:
+    if self.use_tensor_stream:
+      try:
+        await self.send_tensor_frame(request, tensor_data)
+        return None
+      except grpc.aio.AioRpcError as e:
+        if e.code() != grpc.StatusCode.UNIMPLEMENTED: raise
+        # peer runs an older version without StreamTensors, the frame was never processed so it is safe to resend
+        if DEBUG >= 1: print(f"{self._id} does not support tensor streams, falling back to SendTensor")
+        self.use_tensor_stream = False
+
+    return await self.send_tensor_call((request, tensor_data))
+
+  def tensor_request(self, shard: Shard, tensor: node_service_pb2.Tensor, inference_state: Optional[dict], request_id: Optional[str], origin_node_id: Optional[str]) -> node_service_pb2.TensorRequest:
+    return node_service_pb2.TensorRequest(
       shard=node_service_pb2.Shard(
         model_id=shard.model_id,
         start_layer=shard.start_layer,
         end_layer=shard.end_layer,
         n_layers=shard.n_layers,
       ),
-      tensor=node_service_pb2.Tensor(tensor_data=tensor.tobytes(), shape=tensor.shape, dtype=str(tensor.dtype)),
+      tensor=tensor,
       request_id=request_id,
-      inference_state=None if inference_state is None else self.serialize_inference_state(inference_state)
+      inference_state=None if inference_state is None else self.serialize_inference_state(inference_state, request_id),
+      origin_node_id=origin_node_id,
     )
-    response = await self.stub.SendTensor(request)
 
-    if not response.tensor_data or not response.shape or not response.dtype:
-      return None
+  async def send_stripes(self, tensor_data: memoryview) -> Optional[str]:
+    """Sends the chunks of a large tensor over the links to the peer in parallel, returning the id of the transfer once they are all
+    sent, or None when the tensor should go over the primary link as usual (it is small, there is one link, or a chunk failed)."""
+    stripes = self.stripe_policy.plan(len(tensor_data), self.address)
+    if stripes is None: return None
+    transfer_id = uuid.uuid4().hex
 
-    return np.frombuffer(response.tensor_data, dtype=np.dtype(response.dtype)).reshape(response.shape)
+    async def send_stripe(address: str, start: int, end: int):
+      call = await self.stripe_link(address)
+      chunk = node_service_pb2.TensorChunk(transfer_id=transfer_id, offset=start, total_bytes=len(tensor_data), sender_id=self.stripe_sender_id)
+      stripe_start = time.perf_counter()
+      await asyncio.wait_for(call((chunk, tensor_data[start:end])), timeout=30.0)
+      self.stripe_policy.record_transfer(address, end - start, time.perf_counter() - stripe_start)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[send_stripe(*stripe) for stripe in stripes], return_exceptions=True)
+    failed = False
+    for (address, _, _), result in zip(stripes, results):
+      if not isinstance(result, BaseException): continue
+      failed = True
+      if isinstance(result, grpc.aio.AioRpcError) and result.code() == grpc.StatusCode.UNIMPLEMENTED:
+        if DEBUG >= 1: print(f"{self._id} does not support striped transfers")
+        self.stripe_policy.enabled = False
+      else:
+        if DEBUG >= 1: print(f"Striped transfer to {self._id} over {address} failed: {result!r}")
+        self.stripe_policy.link_failed(address)
+        await self.close_stripe_link(address)
+    if failed: return None
+    self.codec_policy.record_transfer(len(tensor_data), time.perf_counter() - start)
+    return transfer_id
+
+  async def stripe_link(self, address: str):
+    if address == self.address: return self.send_tensor_chunk_call
+    if address not in self.stripe_links: self.stripe_links[address] = await self.open_stripe_link(address)
+    return self.stripe_links[address][1]
+
+  async def open_stripe_link(self, address: str):
+    channel = grpc.aio.insecure_channel(address, options=self.channel_options)
+    call = channel.unary_unary(
+      "/node_service.NodeService/SendTensorChunk", request_serializer=serialize_tensor_chunk, response_deserializer=node_service_pb2.Empty.FromString
+    )
+    return channel, call
+
+  async def close_stripe_link(self, address: str) -> None:
+    link = self.stripe_links.pop(address, None)
+    if link is None: return
+    try:
+      await link[0].close()
+    except Exception as e:
+      if DEBUG >= 2: print(f"Error closing link to {self._id}@{address}: {e!r}")
+
+  async def close_stripe_links(self) -> None:
+    for address in list(self.stripe_links):
+      await self.close_stripe_link(address)
+
+  async def send_tensor_frame(self, request: node_service_pb2.TensorRequest, tensor_data: memoryview) -> None:
+    async with self.frame_window:
+      async with self._stream_lock:
+        stream = self.tensor_stream
+        if stream is None:
+          stream = self.tensor_stream = self.stream_tensors_call()
+          self.tensor_stream_reader = asyncio.create_task(self.read_tensor_acks(stream))
+        # sequence numbers are assigned under the lock, so frames are written in the order they were numbered
+        self.frame_sequence += 1
+        sequence = self.frame_sequence
+        ack = asyncio.get_running_loop().create_future()
+        self.pending_frames[sequence] = ack
+        try:
+          # a large frame's write only completes as flow control lets it onto the wire, which makes it a bandwidth sample for the link
+          start = time.perf_counter()
+          await stream.write((node_service_pb2.TensorFrame(sequence=sequence, request=request), tensor_data))
+          self.codec_policy.record_transfer(len(tensor_data), time.perf_counter() - start)
+        except Exception:
+          self.pending_frames.pop(sequence, None)
+          self.close_tensor_stream()
+          raise
+      await ack
+
+  async def read_tensor_acks(self, stream) -> None:
+    error = None
+    try:
+      while (ack := await stream.read()) != grpc.aio.EOF:
+        future = self.pending_frames.pop(ack.sequence, None)
+        if future is None or future.done(): continue
+        if ack.HasField("error"): future.set_exception(RuntimeError(f"{self._id} failed to process tensor: {ack.error}"))
+        else: future.set_result(None)
+    except Exception as e:
+      error = e
+      if DEBUG >= 2: print(f"Tensor stream to {self._id}@{self.address} closed: {e}")
+    finally:
+      if self.tensor_stream is stream:
+        self.tensor_stream = None
+        # frames without an ack may or may not have been processed, fail them rather than resend
+        for future in self.pending_frames.values():
+          if not future.done(): future.set_exception(error if isinstance(error, grpc.aio.AioRpcError) else ConnectionError(f"Tensor stream to {self._id} closed: {error}"))
+        self.pending_frames.clear()
+
+  def close_tensor_stream(self) -> None:
+    if self.tensor_stream is not None: self.tensor_stream.cancel()
+    if self.tensor_stream_reader is not None: self.tensor_stream_reader.cancel()
+    self.tensor_stream = None
+    self.tensor_stream_reader = None
+    for future in self.pending_frames.values():
+      if not future.done(): future.set_exception(ConnectionError(f"Tensor stream to {self._id} closed"))
+    self.pending_frames.clear()
 
   async def send_example(self, shard: Shard, example: np.ndarray, target: np.ndarray, length: np.ndarray, train: bool, request_id: Optional[str] = None) -> Optional[np.array]:
     await self._ensure_connected()
@@ -181,7 +358,8 @@ class GRPCPeerHandle(PeerHandle):
     topology = Topology()
     for node_id, capabilities in response.nodes.items():
       device_capabilities = DeviceCapabilities(
-        model=capabilities.model, chip=capabilities.chip, memory=capabilities.memory, flops=DeviceFlops(fp16=capabilities.flops.fp16, fp32=capabilities.flops.fp32, int8=capabilities.flops.int8)
+        model=capabilities.model, chip=capabilities.chip, memory=capabilities.memory, flops=DeviceFlops(fp16=capabilities.flops.fp16, fp32=capabilities.flops.fp32, int8=capabilities.flops.int8),
+        memory_bandwidth=capabilities.memory_bandwidth
       )
       topology.update_node(node_id, device_capabilities)
     for node_id, peer_connections in response.peer_graph.items():
@@ -189,6 +367,19 @@ class GRPCPeerHandle(PeerHandle):
         topology.add_edge(node_id, conn.to_id, conn.description)
     return topology
 
+  async def ping(self, payload_bytes: int = 0) -> None:
+    await self._ensure_connected()
+    await asyncio.wait_for(self.stub.Ping(node_service_pb2.PingRequest(payload=bytes(payload_bytes))), timeout=10.0)
+
+  async def sync_topology(self, versions: Dict[str, int], records: Dict[str, NodeRecord]) -> Tuple[Dict[str, int], Dict[str, NodeRecord]]:
+    await self._ensure_connected()
+    try:
+      response = await asyncio.wait_for(self.stub.SyncTopology(delta_to_proto(versions, records)), timeout=5.0)
+    except grpc.aio.AioRpcError as e:
+      if e.code() == grpc.StatusCode.UNIMPLEMENTED: raise NotImplementedError(f"{self._id} does not support SyncTopology") from e
+      raise
+    return delta_from_proto(response)
+
   async def send_result(self, request_id: str, result: List[int], is_finished: bool) -> None:
     await self._ensure_connected()
     tensor = None
@@ -196,31 +387,17 @@ class GRPCPeerHandle(PeerHandle):
       tensor = node_service_pb2.Tensor(tensor_data=result.tobytes(), shape=result.shape, dtype=str(result.dtype))
       result = []
     request = node_service_pb2.SendResultRequest(request_id=request_id, result=result, tensor=tensor, is_finished=is_finished)
-    await self.stub.SendResult(request)
+    await self.stub.pinned(request_id).SendResult(request)
+
+  async def cancel_request(self, request_id: str) -> None:
+    await self._ensure_connected()
+    request = node_service_pb2.CancelRequestRequest(request_id=request_id)
+    await asyncio.wait_for(self.stub.pinned(request_id).CancelRequest(request), timeout=10.0)
 
   async def send_opaque_status(self, request_id: str, status: str) -> None:
     await self._ensure_connected()
     request = node_service_pb2.SendOpaqueStatusRequest(request_id=request_id, status=status)
-    await asyncio.wait_for(self.stub.SendOpaqueStatus(request), timeout=10.0)
-
-  def serialize_inference_state(self, inference_state: dict) -> node_service_pb2.InferenceState:
-    proto_inference_state = node_service_pb2.InferenceState()
-    other_data = {}
-    for k, v in inference_state.items():
-      if isinstance(v, mx.array):
-        np_array = np.array(v)
-        tensor_data = node_service_pb2.Tensor(tensor_data=np_array.tobytes(), shape=list(np_array.shape), dtype=str(np_array.dtype))
-        proto_inference_state.tensor_data[k].CopyFrom(tensor_data)
-      elif isinstance(v, list) and all(isinstance(item, mx.array) for item in v):
-        tensor_list = node_service_pb2.TensorList()
-        for tensor in v:
-          np_array = np.array(tensor)
-          tensor_data = node_service_pb2.Tensor(tensor_data=np_array.tobytes(), shape=list(np_array.shape), dtype=str(np_array.dtype))
-          tensor_list.tensors.append(tensor_data)
-        proto_inference_state.tensor_list_data[k].CopyFrom(tensor_list)
-      else:
-        # For non-tensor data, we'll still use JSON
-        other_data[k] = v
-    if other_data:
-      proto_inference_state.other_data_json = json.dumps(other_data)
-    return proto_inference_state
+    await asyncio.wait_for(self.stub.pinned(request_id).SendOpaqueStatus(request), timeout=10.0)
+
+  def serialize_inference_state(self, inference_state: dict, request_id: Optional[str] = None) -> node_service_pb2.InferenceState:
+    return self.inference_state_encoder.encode(inference_state, request_id)
@@ -1,21 +1,20 @@
 import grpc
+import asyncio
 from concurrent import futures
 import numpy as np
 from asyncio import CancelledError
-
-import platform
+from typing import Optional
 
 from . import node_service_pb2
 from . import node_service_pb2_grpc
+from .tensor_codec import add_tensor_method_handlers
+from .inference_state_codec import InferenceStateDecoder
+from .topology_codec import delta_from_proto, delta_to_proto
 from exo import DEBUG
+from exo.networking.compression import TENSOR_ENCODINGS, decode_tensor
+from exo.networking.striping import StripeAssembler
 from exo.inference.shard import Shard
 from exo.orchestration import Node
-import json
-
-if platform.system().lower() == "darwin" and platform.machine().lower() == "arm64":
-  import mlx.core as mx
-else:
-  import numpy as mx
 
 
 class GRPCServer(node_service_pb2_grpc.NodeServiceServicer):
@@ -24,6 +23,8 @@ class GRPCServer(node_service_pb2_grpc.NodeServiceServicer):
     self.host = host
     self.port = port
     self.server = None
+    self.inference_state_decoder = InferenceStateDecoder()
+    self.stripe_assembler = StripeAssembler()
 
   async def start(self) -> None:
     self.server = grpc.aio.server(
@@ -44,6 +45,7 @@ class GRPCServer(node_service_pb2_grpc.NodeServiceServicer):
         ("grpc.http2.max_concurrent_streams", 0),  # Unlimited concurrent streams
       ],
     )
+    add_tensor_method_handlers(self, self.server)
     node_service_pb2_grpc.add_NodeServiceServicer_to_server(self, self.server)
     listen_addr = f"{self.host}:{self.port}"
     self.server.add_insecure_port(listen_addr)
@@ -69,27 +71,73 @@ class GRPCServer(node_service_pb2_grpc.NodeServiceServicer):
     prompt = request.prompt
     request_id = request.request_id
     inference_state = None if request.inference_state is None else self.deserialize_inference_state(request.inference_state)
-    result = await self.node.process_prompt(shard, prompt, request_id, inference_state)
+    origin_node_id = request.origin_node_id if request.HasField("origin_node_id") else None
+    result = await self.node.process_prompt(shard, prompt, request_id, inference_state, origin_node_id)
     if DEBUG >= 5: print(f"SendPrompt {shard=} {prompt=} {request_id=} result: {result}")
     tensor_data = result.tobytes() if result is not None else None
     return node_service_pb2.Tensor(tensor_data=tensor_data, shape=result.shape, dtype=str(result.dtype)) if result is not None else node_service_pb2.Tensor()
 
   async def SendTensor(self, request, context):
+    request, tensor_data = request
+    result = await self.process_tensor_request(request, tensor_data)
+    tensor_data = result.tobytes() if result is not None else None
+    return node_service_pb2.Tensor(tensor_data=tensor_data, shape=result.shape, dtype=str(result.dtype)) if result is not None else node_service_pb2.Tensor()
+
+  async def StreamTensors(self, request_iterator, context):
+    # Frames of all requests share one stream. Each frame is handed to the node as it arrives, in order, and acked once processed,
+    # so the sender's window of unacked frames bounds how much work it can queue here.
+    acks = asyncio.Queue()
+
+    async def process_frame(frame, tensor_data):
+      try:
+        await self.process_tensor_request(frame.request, tensor_data)
+        await acks.put(node_service_pb2.TensorAck(sequence=frame.sequence))
+      except Exception as e:
+        await acks.put(node_service_pb2.TensorAck(sequence=frame.sequence, error=str(e)))
+
+    async def read_frames():
+      tasks = set()
+      try:
+        async for frame, tensor_data in request_iterator:
+          task = asyncio.create_task(process_frame(frame, tensor_data))
+          tasks.add(task)
+          task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+      finally:
+        await acks.put(None)
+
+    reader = asyncio.create_task(read_frames())
+    try:
+      while (ack := await acks.get()) is not None:
+        yield ack
+    finally:
+      reader.cancel()
+
+  async def SendTensorChunk(self, request, context):
+    chunk, data = request
+    self.stripe_assembler.add(chunk.transfer_id, chunk.offset, chunk.total_bytes, data, chunk.sender_id)
+    return node_service_pb2.Empty()
+
+  async def process_tensor_request(self, request, tensor_data):
+    # tensor_data is a read-only view of the received message, it is only copied by the inference engine
+    if request.HasField("transfer_id"):
+      # the tensor was striped across links, its chunks were all sent before the request
+      tensor_data = self.stripe_assembler.take(request.transfer_id)
     shard = Shard(
       model_id=request.shard.model_id,
       start_layer=request.shard.start_layer,
       end_layer=request.shard.end_layer,
       n_layers=request.shard.n_layers,
     )
-    tensor = np.frombuffer(request.tensor.tensor_data, dtype=np.dtype(request.tensor.dtype)).reshape(request.tensor.shape)
+    tensor = decode_tensor(tensor_data, request.tensor.shape, request.tensor.dtype, request.tensor.encoding, request.tensor.scales)
     request_id = request.request_id
 
-    inference_state = None if request.inference_state is None else self.deserialize_inference_state(request.inference_state)
+    inference_state = None if request.inference_state is None else self.deserialize_inference_state(request.inference_state, request_id)
+    origin_node_id = request.origin_node_id if request.HasField("origin_node_id") else None
 
-    result = await self.node.process_tensor(shard, tensor, request_id, inference_state)
+    result = await self.node.process_tensor(shard, tensor, request_id, inference_state, origin_node_id)
     if DEBUG >= 5: print(f"SendTensor tensor {shard=} {tensor=} {request_id=} result: {result}")
-    tensor_data = result.tobytes() if result is not None else None
-    return node_service_pb2.Tensor(tensor_data=tensor_data, shape=result.shape, dtype=str(result.dtype)) if result is not None else node_service_pb2.Tensor()
+    return result
 
   async def SendExample(self, request, context):
     shard = Shard(
@@ -124,6 +172,7 @@ class GRPCServer(node_service_pb2_grpc.NodeServiceServicer):
           chip=cap.chip,
           memory=cap.memory,
           flops=node_service_pb2.DeviceFlops(fp32=cap.flops.fp32, fp16=cap.flops.fp16, int8=cap.flops.int8),
+          memory_bandwidth=cap.memory_bandwidth,
         )
       for node_id, cap in topology.nodes.items()
     }
@@ -134,6 +183,13 @@ class GRPCServer(node_service_pb2_grpc.NodeServiceServicer):
     if DEBUG >= 5: print(f"CollectTopology {max_depth=} {visited=} {nodes=} {peer_graph=}")
     return node_service_pb2.Topology(nodes=nodes, peer_graph=peer_graph)
 
+  async def SyncTopology(self, request, context):
+    versions, records = await self.node.sync_topology(*delta_from_proto(request))
+    return delta_to_proto(versions, records)
+
+  async def Ping(self, request, context):
+    return node_service_pb2.Empty()
+
   async def SendResult(self, request, context):
     request_id = request.request_id
     result = request.result
@@ -143,7 +199,8 @@ class GRPCServer(node_service_pb2_grpc.NodeServiceServicer):
     result = list(result)
     if len(img.tensor_data) > 0:
       result = np.frombuffer(img.tensor_data, dtype=np.dtype(img.dtype)).reshape(img.shape)
-    self.node.on_token.trigger_all(request_id, result, is_finished)
+    # through the node, so a request finishing elsewhere is also taken off the replica it was routed to
+    self.node.trigger_on_token_callbacks(request_id, result, is_finished)
     return node_service_pb2.Empty()
 
   async def SendOpaqueStatus(self, request, context):
@@ -154,20 +211,13 @@ class GRPCServer(node_service_pb2_grpc.NodeServiceServicer):
     return node_service_pb2.Empty()
 
   async def HealthCheck(self, request, context):
-    return node_service_pb2.HealthCheckResponse(is_healthy=True)
+    return node_service_pb2.HealthCheckResponse(is_healthy=True, tensor_encodings=TENSOR_ENCODINGS)
 
-  def deserialize_inference_state(self, inference_state_proto: node_service_pb2.InferenceState) -> dict:
-    inference_state = {}
-
-    for k, tensor_data in inference_state_proto.tensor_data.items():
-      np_array = np.frombuffer(tensor_data.tensor_data, dtype=tensor_data.dtype).reshape(tensor_data.shape)
-      inference_state[k] = mx.array(np_array)
-
-    for k, tensor_list in inference_state_proto.tensor_list_data.items():
-      inference_state[k] = [mx.array(np.frombuffer(tensor.tensor_data, dtype=tensor.dtype).reshape(tensor.shape)) for tensor in tensor_list.tensors]
-
-    if inference_state_proto.other_data_json:
-      other_data = json.loads(inference_state_proto.other_data_json)
-      inference_state.update(other_data)
+  async def CancelRequest(self, request, context):
+    request_id = request.request_id
+    if DEBUG >= 2: print(f"Received CancelRequest request: {request_id=}")
+    await self.node.cancel_request(request_id, broadcast=False)
+    return node_service_pb2.Empty()
 
-    return inference_state
+  def deserialize_inference_state(self, inference_state_proto: node_service_pb2.InferenceState, request_id: Optional[str] = None) -> dict:
+    return self.inference_state_decoder.decode(inference_state_proto, request_id)
@@ -0,0 +1,146 @@
+import json
+import platform
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import numpy as np
+from . import node_service_pb2
+
+if platform.system().lower() == "darwin" and platform.machine().lower() == "arm64":
+  import mlx.core as mx
+  array_types = (mx.array, np.ndarray)
+else:
+  import numpy as mx
+  array_types = (np.ndarray, )
+
+
+def _is_tensor_list(v) -> bool:
+  return isinstance(v, list) and len(v) > 0 and all(isinstance(item, array_types) for item in v)
+
+
+def _unchanged(previous, value) -> bool:
+  # tensors are compared by identity: engines return new arrays rather than writing into the ones they were given, and a tensor
+  # passed along unchanged (e.g. stable diffusion's conditioning) stays the same object
+  if previous is value: return True
+  if isinstance(value, array_types) or isinstance(previous, array_types): return False
+  if _is_tensor_list(value) or _is_tensor_list(previous):
+    return _is_tensor_list(value) and _is_tensor_list(previous) and len(value) == len(previous) and all(a is b for a, b in zip(previous, value))
+  try:
+    return type(previous) is type(value) and bool(previous == value)
+  except Exception:
+    return False
+
+
+def _tensor(v) -> node_service_pb2.Tensor:
+  np_array = np.array(v)
+  return node_service_pb2.Tensor(tensor_data=np_array.tobytes(), shape=list(np_array.shape), dtype=str(np_array.dtype))
+
+
+def _value(v) -> Optional[node_service_pb2.Value]:
+  if v is None: return node_service_pb2.Value(none=True)
+  if isinstance(v, (bool, np.bool_)): return node_service_pb2.Value(bool_value=bool(v))
+  if isinstance(v, (int, np.integer)): return node_service_pb2.Value(int_value=int(v))
+  if isinstance(v, (float, np.floating)): return node_service_pb2.Value(float_value=float(v))
+  if isinstance(v, str): return node_service_pb2.Value(string_value=v)
+  if isinstance(v, (list, tuple)) and all(isinstance(item, (int, np.integer)) and not isinstance(item, (bool, np.bool_)) for item in v):
+    return node_service_pb2.Value(int_list=node_service_pb2.IntList(values=[int(item) for item in v]))
+  return None
+
+
+def _from_value(value: node_service_pb2.Value):
+  kind = value.WhichOneof("kind")
+  if kind == "none" or kind is None: return None
+  if kind == "int_list": return list(value.int_list.values)
+  return getattr(value, kind)
+
+
+class InferenceStateEncoder:
+  """Serializes inference states, sending only what changed since the previous state of the same request on this link.
+
+  An encoded state only becomes the base of the next delta once confirm says the peer got it, discard after a failed send makes the
+  next state go in full.
+  """
+  def __init__(self, max_requests: int = 64):
+    self.sender_id = uuid.uuid4().hex
+    self.max_requests = max_requests
+    # request_id -> (version, state) last sent
+    self.sent: OrderedDict[str, Tuple[int, dict]] = OrderedDict()
+    # request_id -> (version, state) encoded but not confirmed yet
+    self.pending: Dict[str, Tuple[int, dict]] = {}
+
+  def encode(self, inference_state: dict, request_id: Optional[str] = None) -> node_service_pb2.InferenceState:
+    proto = node_service_pb2.InferenceState()
+    base_version, base = self.sent.get(request_id, (0, {})) if request_id is not None else (0, {})
+    other_data = {}
+    for k, v in inference_state.items():
+      if k in base and _unchanged(base[k], v):
+        proto.unchanged_keys.append(k)
+      elif isinstance(v, array_types):
+        proto.tensor_data[k].CopyFrom(_tensor(v))
+      elif _is_tensor_list(v):
+        proto.tensor_list_data[k].CopyFrom(node_service_pb2.TensorList(tensors=[_tensor(tensor) for tensor in v]))
+      elif (value := _value(v)) is not None:
+        proto.values[k].CopyFrom(value)
+      else:
+        other_data[k] = v
+    if other_data:
+      proto.other_data_json = json.dumps(other_data)
+
+    if request_id is not None:
+      proto.sender_id = self.sender_id
+      proto.version = base_version + 1
+      proto.base_version = base_version
+      self.pending[request_id] = (proto.version, dict(inference_state))
+    return proto
+
+  def confirm(self, request_id: Optional[str]) -> None:
+    pending = self.pending.pop(request_id, None)
+    if pending is None: return
+    if pending[1].get("is_finished"):
+      self.sent.pop(request_id, None)
+      return
+    self.sent[request_id] = pending
+    self.sent.move_to_end(request_id)
+    # a forgotten request is sent in full next time
+    while len(self.sent) > self.max_requests: self.sent.popitem(last=False)
+
+  def discard(self, request_id: Optional[str]) -> None:
+    self.pending.pop(request_id, None)
+    self.sent.pop(request_id, None)
+
+
+class InferenceStateDecoder:
+  """Rebuilds the states an InferenceStateEncoder sent, reusing the values of unchanged keys rather than deserializing them again."""
+  def __init__(self, max_requests: int = 256):
+    self.max_requests = max_requests
+    # (sender_id, request_id) -> (version, state)
+    self.received: OrderedDict[Tuple[str, str], Tuple[int, dict]] = OrderedDict()
+
+  def decode(self, proto: node_service_pb2.InferenceState, request_id: Optional[str] = None) -> dict:
+    inference_state = {}
+    key = (proto.sender_id, request_id)
+    if proto.base_version:
+      version, base = self.received.get(key, (None, None))
+      if version != proto.base_version:
+        raise ValueError(f"Inference state {proto.version} of request {request_id} is a delta against version {proto.base_version}, which was never received")
+      for k in proto.unchanged_keys:
+        inference_state[k] = base[k]
+
+    for k, tensor_data in proto.tensor_data.items():
+      np_array = np.frombuffer(tensor_data.tensor_data, dtype=tensor_data.dtype).reshape(tensor_data.shape)
+      inference_state[k] = mx.array(np_array)
+    for k, tensor_list in proto.tensor_list_data.items():
+      inference_state[k] = [mx.array(np.frombuffer(tensor.tensor_data, dtype=tensor.dtype).reshape(tensor.shape)) for tensor in tensor_list.tensors]
+    for k, value in proto.values.items():
+      inference_state[k] = _from_value(value)
+    if proto.other_data_json:
+      inference_state.update(json.loads(proto.other_data_json))
+
+    if proto.sender_id and request_id is not None:
+      if inference_state.get("is_finished"):
+        self.received.pop(key, None)
+      else:
+        self.received[key] = (proto.version, inference_state)
+        self.received.move_to_end(key)
+        while len(self.received) > self.max_requests: self.received.popitem(last=False)
+    return dict(inference_state)
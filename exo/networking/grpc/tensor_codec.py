@@ -0,0 +1,137 @@
+from typing import Optional, Sequence, Tuple, Type, Union
+import grpc
+from google.protobuf.message import Message
+from . import node_service_pb2
+
+# field numbers from the message down to the Tensor.tensor_data carrying the payload
+TENSOR_REQUEST_PAYLOAD = (2, 1)  # TensorRequest.tensor.tensor_data
+TENSOR_FRAME_PAYLOAD = (2, 2, 1)  # TensorFrame.request.tensor.tensor_data
+TENSOR_CHUNK_PAYLOAD = (4, )  # TensorChunk.data
+
+Buffer = Union[bytes, memoryview]
+
+
+def _varint(n: int) -> bytes:
+  out = bytearray()
+  while n >= 0x80:
+    out.append((n & 0x7F) | 0x80)
+    n >>= 7
+  out.append(n)
+  return bytes(out)
+
+
+def _read_varint(data: memoryview, pos: int) -> Tuple[int, int]:
+  n, shift = 0, 0
+  while True:
+    b = data[pos]
+    pos += 1
+    n |= (b & 0x7F) << shift
+    if b < 0x80: return n, pos
+    shift += 7
+
+
+def _payload_prefix(path: Sequence[int], nbytes: int) -> bytes:
+  # nested length-delimited fields wrapping the payload, innermost first
+  prefix = _varint(path[-1] << 3 | 2) + _varint(nbytes)
+  for field in reversed(path[:-1]):
+    prefix = _varint(field << 3 | 2) + _varint(len(prefix) + nbytes) + prefix
+  return prefix
+
+
+def serialize_with_payload(message: Message, path: Sequence[int], payload: Buffer) -> bytes:
+  """Serializes message with payload as the bytes field at path, copying the payload once, straight into the wire buffer.
+
+  The payload goes after the rest of the message as a separate occurrence of the path's fields, which protobuf parsers merge into
+  the message, so peers parsing it as a whole see the same message.
+  """
+  return b"".join((message.SerializeToString(), _payload_prefix(path, len(payload)), payload))
+
+
+def _fields(data: memoryview, start: int, end: int):
+  pos = start
+  while pos < end:
+    field_start = pos
+    key, pos = _read_varint(data, pos)
+    wire_type = key & 7
+    if wire_type == 0: _, pos = _read_varint(data, pos)
+    elif wire_type == 1: pos += 8
+    elif wire_type == 5: pos += 4
+    elif wire_type == 2:
+      length, pos = _read_varint(data, pos)
+      yield key >> 3, field_start, pos, pos + length
+      pos += length
+      continue
+    else: raise ValueError(f"Unsupported wire type {wire_type}")
+    yield key >> 3, field_start, None, pos
+
+
+def _trailing_payload(data: memoryview, path: Sequence[int]) -> Optional[Tuple[int, int, int]]:
+  # (start of the trailer, start and end of the payload) when data ends with the fields serialize_with_payload appends
+  start, end, trailer = 0, len(data), None
+  for i, number in enumerate(path):
+    fields = list(_fields(data, start, end))
+    if not fields: return None
+    field, field_start, content_start, field_end = fields[-1]
+    if field != number or content_start is None or field_end != end: return None
+    if i == 0: trailer = field_start
+    # below the top level the trailer wraps nothing but the next field
+    elif len(fields) > 1: return None
+    start = content_start
+  return trailer, start, end
+
+
+def parse_with_payload(message_class: Type[Message], path: Sequence[int], data: bytes) -> Tuple[Message, Buffer]:
+  """Parses data into message_class, returning the bytes field at path as a read-only view of data rather than a copy."""
+  view = memoryview(data)
+  location = _trailing_payload(view, path)
+  if location is not None:
+    trailer, start, end = location
+    return message_class.FromString(view[:trailer]), view[start:end]
+  # not serialized by serialize_with_payload, parse it all and take the field
+  message = message_class.FromString(data)
+  field = message
+  for number in path:
+    field = getattr(field, field.DESCRIPTOR.fields_by_number[number].name)
+  return message, field
+
+
+# SendTensor, StreamTensors and SendTensorChunk requests travel as (message, payload) pairs, with the message's tensor_data left empty
+def serialize_tensor_request(request: Tuple[Message, Buffer]) -> bytes:
+  return serialize_with_payload(request[0], TENSOR_REQUEST_PAYLOAD, request[1])
+
+
+def parse_tensor_request(data: bytes) -> Tuple[Message, Buffer]:
+  return parse_with_payload(node_service_pb2.TensorRequest, TENSOR_REQUEST_PAYLOAD, data)
+
+
+def serialize_tensor_frame(frame: Tuple[Message, Buffer]) -> bytes:
+  return serialize_with_payload(frame[0], TENSOR_FRAME_PAYLOAD, frame[1])
+
+
+def parse_tensor_frame(data: bytes) -> Tuple[Message, Buffer]:
+  return parse_with_payload(node_service_pb2.TensorFrame, TENSOR_FRAME_PAYLOAD, data)
+
+
+def serialize_tensor_chunk(chunk: Tuple[Message, Buffer]) -> bytes:
+  return serialize_with_payload(chunk[0], TENSOR_CHUNK_PAYLOAD, chunk[1])
+
+
+def parse_tensor_chunk(data: bytes) -> Tuple[Message, Buffer]:
+  return parse_with_payload(node_service_pb2.TensorChunk, TENSOR_CHUNK_PAYLOAD, data)
+
+
+def add_tensor_method_handlers(servicer, server: grpc.aio.Server) -> None:
+  """Serves SendTensor, StreamTensors and SendTensorChunk with the (message, payload) codec. Must be called before add_NodeServiceServicer_to_server,
+  the first handler registered for a method is the one used."""
+  handlers = {
+    "SendTensor": grpc.unary_unary_rpc_method_handler(
+      servicer.SendTensor, request_deserializer=parse_tensor_request, response_serializer=node_service_pb2.Tensor.SerializeToString
+    ),
+    "StreamTensors": grpc.stream_stream_rpc_method_handler(
+      servicer.StreamTensors, request_deserializer=parse_tensor_frame, response_serializer=node_service_pb2.TensorAck.SerializeToString
+    ),
+    "SendTensorChunk": grpc.unary_unary_rpc_method_handler(
+      servicer.SendTensorChunk, request_deserializer=parse_tensor_chunk, response_serializer=node_service_pb2.Empty.SerializeToString
+    ),
+  }
+  server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler("node_service.NodeService", handlers), ))
@@ -0,0 +1,58 @@
+import unittest
+from exo.networking.grpc import node_service_pb2
+from exo.networking.grpc.channel_pool import ChannelPool
+from exo.networking.grpc.grpc_server import GRPCServer
+
+
+class RecordingServer(GRPCServer):
+  def __init__(self, port):
+    super().__init__(None, "localhost", port)
+    self.clients = []
+
+  async def HealthCheck(self, request, context):
+    self.clients.append(context.peer())
+    return await super().HealthCheck(request, context)
+
+  async def SendOpaqueStatus(self, request, context):
+    self.clients.append((request.request_id, request.status, context.peer()))
+    return node_service_pb2.Empty()
+
+
+class TestChannelPool(unittest.IsolatedAsyncioTestCase):
+  async def test_calls_spread_over_connections(self):
+    server = RecordingServer(50076)
+    await server.start()
+    pool = ChannelPool("localhost:50076", [], size=3)
+    try:
+      await pool.channel_ready()
+      stub = pool.stub()
+      for _ in range(6):
+        response = await stub.HealthCheck(node_service_pb2.HealthCheckRequest())
+        self.assertTrue(response.is_healthy)
+      # one connection, and so one client address, per channel
+      self.assertEqual(len(set(server.clients)), 3)
+      self.assertEqual(server.clients[:3], server.clients[3:])
+    finally:
+      await pool.close()
+      await server.stop()
+
+  async def test_request_statuses_keep_their_order(self):
+    server = RecordingServer(50077)
+    await server.start()
+    pool = ChannelPool("localhost:50077", [], size=3)
+    try:
+      await pool.channel_ready()
+      stub = pool.stub()
+      for i in range(12):
+        await stub.pinned(f"request{i % 2}").SendOpaqueStatus(node_service_pb2.SendOpaqueStatusRequest(request_id=f"request{i % 2}", status=str(i)))
+      for request_id in ("request0", "request1"):
+        calls = [(status, client) for id, status, client in server.clients if id == request_id]
+        self.assertEqual([int(status) for status, _ in calls], list(range(int(request_id[-1]), 12, 2)))
+        self.assertEqual(len({client for _, client in calls}), 1)
+    finally:
+      await pool.close()
+      await server.stop()
+
+
+if __name__ == "__main__":
+  unittest.main()
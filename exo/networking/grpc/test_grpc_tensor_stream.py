@@ -0,0 +1,59 @@
+import asyncio
+import unittest
+import numpy as np
+from exo.inference.shard import Shard
+from exo.networking.grpc.grpc_server import GRPCServer
+from exo.networking.grpc.grpc_peer_handle import GRPCPeerHandle
+from exo.networking.test_doubles import RecordingNode
+from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
+
+
+class TestGRPCTensorStream(unittest.IsolatedAsyncioTestCase):
+  async def asyncSetUp(self):
+    self.node = RecordingNode()
+    self.server = GRPCServer(self.node, "localhost", 50071)
+    await self.server.start()
+    caps = DeviceCapabilities(model="test", chip="test", memory=0, flops=DeviceFlops(fp32=0, fp16=0, int8=0))
+    self.peer = GRPCPeerHandle("peer", "localhost:50071", "test", caps, max_frames_in_flight=4)
+    self.shard = Shard("test", 0, 0, 2)
+
+  async def asyncTearDown(self):
+    await self.peer.disconnect()
+    await self.server.stop()
+
+  async def test_frames_are_dispatched_in_order(self):
+    await self.peer.connect()
+    await asyncio.gather(*[self.peer.send_tensor(self.shard, np.array([[i]]), request_id=f"request{i % 3}") for i in range(32)])
+    self.assertEqual(len(self.node.received), 32)
+    for request_id in ("request0", "request1", "request2"):
+      values = [int(tensor.flat[0]) for r, tensor, _, _ in self.node.received if r == request_id]
+      self.assertEqual(values, sorted(values))
+    self.assertEqual(self.peer.pending_frames, {})
+
+  async def test_errors_fail_only_their_frame(self):
+    with self.assertRaises(RuntimeError):
+      await self.peer.send_tensor(self.shard, np.array([[0]]), request_id="fail")
+    await self.peer.send_tensor(self.shard, np.array([[1]]), request_id="ok")
+    self.assertEqual([(r, int(tensor.flat[0])) for r, tensor, _, _ in self.node.received], [("ok", 1)])
+
+  async def test_unary_fallback(self):
+    self.peer.use_tensor_stream = False
+    await self.peer.send_tensor(self.shard, np.array([[5]]), request_id="unary")
+    self.assertEqual([(r, int(tensor.flat[0])) for r, tensor, _, _ in self.node.received], [("unary", 5)])
+    self.assertIsNone(self.peer.tensor_stream)
+
+  async def test_encoded_tensors_are_decoded(self):
+    self.peer.codec_policy.mode = "fp16"
+    tensor = np.random.default_rng(0).standard_normal((1, 256, 512)).astype(np.float32)
+    await self.peer.send_tensor(self.shard, tensor, request_id="unhealthchecked")
+    np.testing.assert_array_equal(self.node.received[-1][1], tensor)
+    self.assertTrue(await self.peer.health_check())
+    await self.peer.send_tensor(self.shard, tensor, request_id="encoded")
+    received = self.node.received[-1][1]
+    self.assertEqual(received.dtype, np.float32)
+    np.testing.assert_allclose(received, tensor, rtol=1e-3, atol=1e-3)
+    self.assertFalse(np.array_equal(received, tensor))
+
+
+if __name__ == "__main__":
+  unittest.main()
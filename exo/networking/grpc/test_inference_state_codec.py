@@ -0,0 +1,105 @@
+import unittest
+import numpy as np
+from exo.networking.grpc import node_service_pb2
+from exo.networking.grpc.inference_state_codec import InferenceStateDecoder, InferenceStateEncoder
+
+
+def roundtrip(encoder, decoder, state, request_id="request"):
+  proto = encoder.encode(state, request_id)
+  encoder.confirm(request_id)
+  # what goes over the wire
+  proto = node_service_pb2.InferenceState.FromString(proto.SerializeToString())
+  return proto, decoder.decode(proto, request_id)
+
+
+class TestInferenceStateCodec(unittest.TestCase):
+  def setUp(self):
+    self.encoder = InferenceStateEncoder()
+    self.decoder = InferenceStateDecoder()
+    rng = np.random.default_rng(0)
+    self.conditioning = rng.standard_normal((2, 77, 64)).astype(np.float16)
+    self.residual = [rng.standard_normal((2, 8, 8, 32)).astype(np.float16) for _ in range(3)]
+
+  def step_state(self, step, x_t_prev):
+    return {
+      "conditioning": self.conditioning, "mask": None, "residual": self.residual, "x_t_prev": x_t_prev, "is_finished": False,
+      "is_step_finished": True, "step": step, "total_steps": 50, "start_step": 999.5, "image": None,
+    }
+
+  def test_typed_values(self):
+    state = {"flag": True, "count": 3, "scale": 0.5, "name": "x", "tokens": [1, 2, 3], "missing": None, "nested": {"a": [1.5]}}
+    proto, decoded = roundtrip(self.encoder, self.decoder, state)
+    self.assertEqual(decoded, state)
+    self.assertIs(type(decoded["flag"]), bool)
+    # only what the typed values can't express falls back to json
+    self.assertEqual(proto.other_data_json, '{"nested": {"a": [1.5]}}')
+
+  def test_only_changes_are_sent(self):
+    x = np.zeros((1, 8, 8, 4), dtype=np.float32)
+    first, decoded = roundtrip(self.encoder, self.decoder, self.step_state(0, x))
+    self.assertEqual(first.base_version, 0)
+    self.assertEqual(set(first.tensor_data), {"conditioning", "x_t_prev"})
+
+    for step in range(1, 4):
+      x = x + 1
+      proto, decoded = roundtrip(self.encoder, self.decoder, self.step_state(step, x))
+      self.assertEqual(proto.base_version, step)
+      self.assertEqual(set(proto.tensor_data), {"x_t_prev"})
+      self.assertEqual(set(proto.tensor_list_data), set())
+      self.assertEqual(set(proto.values), {"step"})
+      self.assertIn("conditioning", proto.unchanged_keys)
+      self.assertLess(proto.ByteSize(), first.ByteSize()/10)
+      np.testing.assert_array_equal(decoded["conditioning"], self.conditioning)
+      np.testing.assert_array_equal(decoded["x_t_prev"], x)
+      self.assertEqual(len(decoded["residual"]), 3)
+      self.assertEqual(decoded["step"], step)
+
+  def test_removed_keys_and_requests_are_separate(self):
+    roundtrip(self.encoder, self.decoder, {"kv_trim": 2, "speculative_tokens": [5, 6]})
+    _, decoded = roundtrip(self.encoder, self.decoder, {"speculative_tokens": [5, 6]})
+    self.assertEqual(decoded, {"speculative_tokens": [5, 6]})
+    proto, decoded = roundtrip(self.encoder, self.decoder, {"kv_trim": 1}, request_id="other")
+    self.assertEqual(proto.base_version, 0)
+    self.assertEqual(decoded, {"kv_trim": 1})
+    # mutating a decoded state doesn't change the base of the next delta
+    decoded["kv_trim"] = 7
+    _, decoded = roundtrip(self.encoder, self.decoder, {"kv_trim": 1}, request_id="other")
+    self.assertEqual(decoded, {"kv_trim": 1})
+
+  def test_missing_base(self):
+    roundtrip(self.encoder, self.decoder, {"step": 0})
+    with self.assertRaises(ValueError):
+      roundtrip(self.encoder, InferenceStateDecoder(), {"step": 1})
+
+  def test_finished_and_evicted_requests_are_sent_in_full(self):
+    encoder = InferenceStateEncoder(max_requests=2)
+    for request_id in ["a", "b", "c"]:
+      roundtrip(encoder, self.decoder, {"step": 0}, request_id)
+    self.assertEqual(encoder.encode({"step": 1}, "a").base_version, 0)
+    self.assertEqual(encoder.encode({"step": 1}, "c").base_version, 1)
+    encoder.confirm("c")
+    roundtrip(self.encoder, self.decoder, {"is_finished": True}, "d")
+    self.assertNotIn("d", self.encoder.sent)
+    self.assertEqual(self.encoder.encode({"is_finished": False}, "d").base_version, 0)
+
+  def test_base_only_advances_once_confirmed(self):
+    roundtrip(self.encoder, self.decoder, {"step": 0, "total_steps": 50})
+    # a state that was never confirmed isn't the base of the next one
+    self.encoder.encode({"step": 1, "total_steps": 50}, "request")
+    proto, decoded = roundtrip(self.encoder, self.decoder, {"step": 2, "total_steps": 50})
+    self.assertEqual((proto.base_version, decoded), (1, {"step": 2, "total_steps": 50}))
+    # after a failed send the peer may or may not have the state, the next one is sent in full
+    self.encoder.encode({"step": 3, "total_steps": 50}, "request")
+    self.encoder.discard("request")
+    proto, decoded = roundtrip(self.encoder, InferenceStateDecoder(), {"step": 4, "total_steps": 50})
+    self.assertEqual((proto.base_version, list(proto.unchanged_keys), decoded), (0, [], {"step": 4, "total_steps": 50}))
+
+  def test_states_without_request_are_sent_in_full(self):
+    state = {"step": 1}
+    self.assertEqual(self.encoder.encode(state).sender_id, "")
+    self.assertEqual(self.decoder.decode(self.encoder.encode(state)), state)
+    self.assertEqual(len(self.encoder.sent), 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
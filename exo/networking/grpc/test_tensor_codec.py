@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+from exo.networking.compression import tensor_buffer
+from exo.networking.grpc import node_service_pb2
+from exo.networking.grpc.tensor_codec import parse_tensor_frame, parse_tensor_request, serialize_tensor_frame, serialize_tensor_request
+
+
+class TestTensorCodec(unittest.TestCase):
+  def setUp(self):
+    self.tensor = np.random.default_rng(0).standard_normal((1, 300, 64)).astype(np.float16)
+    self.request = node_service_pb2.TensorRequest(
+      shard=node_service_pb2.Shard(model_id="model", start_layer=0, end_layer=3, n_layers=8),
+      tensor=node_service_pb2.Tensor(shape=self.tensor.shape, dtype=str(self.tensor.dtype)),
+      request_id="request",
+      origin_node_id="origin",
+    )
+
+  def test_payload_is_a_view_of_the_received_buffer(self):
+    data = serialize_tensor_request((self.request, tensor_buffer(self.tensor)))
+    request, payload = parse_tensor_request(data)
+    self.assertIsInstance(payload, memoryview)
+    self.assertIs(payload.obj, data)
+    self.assertTrue(payload.readonly)
+    self.assertEqual(request.request_id, "request")
+    self.assertEqual(request.tensor.tensor_data, b"")
+    np.testing.assert_array_equal(np.frombuffer(payload, dtype=np.float16).reshape(request.tensor.shape), self.tensor)
+
+  def test_interoperates_with_plain_protobuf(self):
+    # what a peer without the codec parses
+    data = serialize_tensor_request((self.request, tensor_buffer(self.tensor)))
+    plain = node_service_pb2.TensorRequest.FromString(data)
+    self.assertEqual(plain.tensor.tensor_data, self.tensor.tobytes())
+    self.assertEqual(plain.origin_node_id, "origin")
+
+    # what a peer without the codec sends
+    self.request.tensor.tensor_data = self.tensor.tobytes()
+    request, payload = parse_tensor_request(self.request.SerializeToString())
+    self.assertEqual(request, self.request)
+    self.assertEqual(bytes(payload), self.tensor.tobytes())
+
+  def test_frames(self):
+    frame = node_service_pb2.TensorFrame(sequence=42, request=self.request)
+    data = serialize_tensor_frame((frame, tensor_buffer(self.tensor)))
+    parsed, payload = parse_tensor_frame(data)
+    self.assertEqual(parsed.sequence, 42)
+    self.assertIs(payload.obj, data)
+    self.assertEqual(bytes(payload), self.tensor.tobytes())
+    self.assertEqual(node_service_pb2.TensorFrame.FromString(data).request.tensor.tensor_data, self.tensor.tobytes())
+
+  def test_empty_and_non_contiguous_tensors(self):
+    for tensor in [np.zeros((1, 0, 8), dtype=np.float32), np.arange(24, dtype=np.int64).reshape(4, 6).T]:
+      request, payload = parse_tensor_request(serialize_tensor_request((self.request, tensor_buffer(tensor))))
+      np.testing.assert_array_equal(np.frombuffer(payload, dtype=tensor.dtype).reshape(tensor.shape), tensor)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,57 @@
+from typing import Dict, Optional, Tuple
+from . import node_service_pb2
+from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
+from exo.topology.topology import LinkStats
+from exo.topology.topology_sync import NodeRecord
+
+
+def _stats_to_proto(stats: Optional[LinkStats]) -> Optional[node_service_pb2.LinkStats]:
+  if stats is None: return None
+  return node_service_pb2.LinkStats(rtt=stats.rtt, rtt_p90=stats.rtt_p90, bandwidth=stats.bandwidth, samples=stats.samples, updated_at=stats.updated_at)
+
+
+def _stats_from_proto(proto: node_service_pb2.LinkStats) -> LinkStats:
+  return LinkStats(
+    rtt=proto.rtt, rtt_p90=proto.rtt_p90, bandwidth=proto.bandwidth if proto.HasField("bandwidth") else None, samples=proto.samples, updated_at=proto.updated_at
+  )
+
+
+def _record_to_proto(record: NodeRecord) -> node_service_pb2.NodeRecord:
+  cap = record.capabilities
+  return node_service_pb2.NodeRecord(
+    version=record.version,
+    capabilities=node_service_pb2.DeviceCapabilities(
+      model=cap.model,
+      chip=cap.chip,
+      memory=cap.memory,
+      flops=node_service_pb2.DeviceFlops(fp32=cap.flops.fp32, fp16=cap.flops.fp16, int8=cap.flops.int8),
+      memory_bandwidth=cap.memory_bandwidth,
+    ),
+    connections=[
+      node_service_pb2.PeerConnection(to_id=to_id, description=description, stats=_stats_to_proto(record.link_stats.get(to_id))) for to_id, description in record.edges.items()
+    ],
+    agreed_links=[
+      node_service_pb2.AgreedLink(from_id=from_id, to_id=to_id, stats=_stats_to_proto(stats)) for (from_id, to_id), stats in record.agreed_link_stats.items()
+    ],
+  )
+
+
+def _record_from_proto(proto: node_service_pb2.NodeRecord) -> NodeRecord:
+  cap = proto.capabilities
+  return NodeRecord(
+    version=proto.version,
+    capabilities=DeviceCapabilities(
+      model=cap.model, chip=cap.chip, memory=cap.memory, flops=DeviceFlops(fp32=cap.flops.fp32, fp16=cap.flops.fp16, int8=cap.flops.int8), memory_bandwidth=cap.memory_bandwidth
+    ),
+    edges={conn.to_id: conn.description if conn.HasField("description") else None for conn in proto.connections},
+    link_stats={conn.to_id: _stats_from_proto(conn.stats) for conn in proto.connections if conn.HasField("stats")},
+    agreed_link_stats={(link.from_id, link.to_id): _stats_from_proto(link.stats) for link in proto.agreed_links},
+  )
+
+
+def delta_to_proto(versions: Dict[str, int], records: Dict[str, NodeRecord]) -> node_service_pb2.TopologyDelta:
+  return node_service_pb2.TopologyDelta(versions=versions, records={node_id: _record_to_proto(record) for node_id, record in records.items()})
+
+
+def delta_from_proto(proto: node_service_pb2.TopologyDelta) -> Tuple[Dict[str, int], Dict[str, NodeRecord]]:
+  return dict(proto.versions), {node_id: _record_from_proto(record) for node_id, record in proto.records.items()}
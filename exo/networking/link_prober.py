@@ -0,0 +1,78 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+import numpy as np
+from exo import DEBUG
+from exo.topology.topology import LinkStats
+from .peer_handle import PeerHandle
+
+
+class LinkProber:
+  """Measures the links from this node to its peers: a few empty pings for the round trip time, then one payload_bytes ping whose
+  extra time over the fastest empty ping is the time the payload took on the wire.
+
+  Statistics are over the last window probes of each link. They are only republished (and so gossiped with the topology) when the
+  round trip time or bandwidth moved by more than change_threshold, small fluctuations would otherwise change the topology constantly.
+  """
+  def __init__(self, pings: int = 3, payload_bytes: int = 1024*1024, window: int = 20, change_threshold: float = 0.2, timeout: float = 10.0):
+    self.pings = pings
+    self.payload_bytes = payload_bytes
+    self.window = window
+    self.change_threshold = change_threshold
+    self.timeout = timeout
+    self.rtts: Dict[str, Deque[float]] = {}
+    self.bandwidths: Dict[str, Deque[float]] = {}
+    # peer id -> stats as last published
+    self.published: Dict[str, LinkStats] = {}
+
+  async def probe_all(self, peers: List[PeerHandle]) -> bool:
+    """Probes every peer in parallel, returns whether the published stats changed."""
+    peer_ids = {peer.id() for peer in peers}
+    changed = any(peer_id not in peer_ids for peer_id in self.published)
+    for samples in (self.rtts, self.bandwidths, self.published):
+      for peer_id in [peer_id for peer_id in samples if peer_id not in peer_ids]: del samples[peer_id]
+    results = await asyncio.gather(*(self.probe(peer) for peer in peers), return_exceptions=True)
+    return changed or any(result is True for result in results)
+
+  async def probe(self, peer: PeerHandle) -> bool:
+    rtts = self.rtts.setdefault(peer.id(), deque(maxlen=self.window*self.pings))
+    bandwidths = self.bandwidths.setdefault(peer.id(), deque(maxlen=self.window))
+    try:
+      probe_rtts = []
+      for _ in range(self.pings):
+        start = time.perf_counter()
+        await asyncio.wait_for(peer.ping(), self.timeout)
+        probe_rtts.append(time.perf_counter() - start)
+      rtts.extend(probe_rtts)
+      if self.payload_bytes > 0:
+        start = time.perf_counter()
+        await asyncio.wait_for(peer.ping(self.payload_bytes), self.timeout)
+        transfer_time = time.perf_counter() - start - min(probe_rtts)
+        if transfer_time > 0: bandwidths.append(self.payload_bytes/transfer_time)
+    except Exception as e:
+      if DEBUG >= 2: print(f"Probing link to {peer.id()} failed: {e!r}")
+      if not rtts: return False
+    return self.publish(peer.id(), self.stats(peer.id()))
+
+  def stats(self, peer_id: str) -> Optional[LinkStats]:
+    rtts, bandwidths = self.rtts.get(peer_id), self.bandwidths.get(peer_id)
+    if not rtts: return None
+    return LinkStats(
+      rtt=float(np.median(rtts)),
+      rtt_p90=float(np.percentile(rtts, 90)),
+      bandwidth=float(np.median(bandwidths)) if bandwidths else None,
+      samples=len(rtts),
+      updated_at=time.time(),
+    )
+
+  def publish(self, peer_id: str, stats: Optional[LinkStats]) -> bool:
+    if stats is None: return False
+    published = self.published.get(peer_id)
+    if published is not None and not self._moved(published.rtt, stats.rtt) and not self._moved(published.bandwidth, stats.bandwidth): return False
+    self.published[peer_id] = stats
+    return True
+
+  def _moved(self, before: Optional[float], after: Optional[float]) -> bool:
+    if before is None or after is None: return before is not after
+    return abs(after - before) > self.change_threshold*before
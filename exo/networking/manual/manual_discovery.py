@@ -63,7 +63,9 @@ class ManualDiscovery(Discovery):
             print(f"{peer_id=} at {peer_config.address}:{peer_config.port} is not healthy. Removing.")
         except Exception as e:
           if DEBUG_DISCOVERY >= 2: print(f"Exception occurred when attempting to add {peer_id=}: {e}")
+      peers_changed = new_known_peers != self.known_peers
       self.known_peers = new_known_peers
+      if peers_changed: self.on_peers_changed.trigger_all()
       await asyncio.sleep(5.0)
 
       if DEBUG_DISCOVERY >= 2: print(f"Current known peers: {[peer.id() for peer in self.known_peers.values()]}")
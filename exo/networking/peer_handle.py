@@ -1,9 +1,10 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Tuple, List
+from typing import Dict, Optional, Tuple, List
 import numpy as np
 from exo.inference.shard import Shard
 from exo.topology.device_capabilities import DeviceCapabilities
 from exo.topology.topology import Topology
+from exo.topology.topology_sync import NodeRecord
 
 
 class PeerHandle(ABC):
@@ -23,6 +24,10 @@ class PeerHandle(ABC):
   def device_capabilities(self) -> DeviceCapabilities:
     pass
 
+  def update_addresses(self, addresses: List[str]) -> None:
+    """Called by discovery with every address the peer is currently reachable at, best first."""
+    pass
+
   @abstractmethod
   async def connect(self) -> None:
     pass
@@ -40,17 +45,32 @@ class PeerHandle(ABC):
     pass
 
   @abstractmethod
-  async def send_prompt(self, shard: Shard, prompt: str, request_id: Optional[str] = None) -> Optional[np.array]:
+  async def send_prompt(self, shard: Shard, prompt: str, inference_state: Optional[dict] = None, request_id: Optional[str] = None, origin_node_id: Optional[str] = None) -> Optional[np.array]:
     pass
 
   @abstractmethod
-  async def send_tensor(self, shard: Shard, tensor: np.array, request_id: Optional[str] = None) -> Optional[np.array]:
+  async def send_tensor(self, shard: Shard, tensor: np.array, inference_state: Optional[dict] = None, request_id: Optional[str] = None, origin_node_id: Optional[str] = None) -> Optional[np.array]:
     pass
 
   @abstractmethod
   async def send_result(self, request_id: str, result: List[int], is_finished: bool) -> None:
     pass
 
+  @abstractmethod
+  async def cancel_request(self, request_id: str) -> None:
+    pass
+
   @abstractmethod
   async def collect_topology(self, visited: set[str], max_depth: int) -> Topology:
     pass
+
+  @abstractmethod
+  async def ping(self, payload_bytes: int = 0) -> None:
+    """A round trip to the peer carrying payload_bytes of filler, for measuring the link."""
+    pass
+
+  @abstractmethod
+  async def sync_topology(self, versions: Dict[str, int], records: Dict[str, NodeRecord]) -> Tuple[Dict[str, int], Dict[str, NodeRecord]]:
+    """Sends the peer this node's topology versions and the records it is missing, returns the peer's versions and the records this
+    node is missing. Raises NotImplementedError when the peer only supports collect_topology."""
+    pass
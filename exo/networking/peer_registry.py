@@ -0,0 +1,93 @@
+import asyncio
+import traceback
+from typing import Dict, Iterable, List, Optional, Tuple
+from exo import DEBUG
+from .peer_handle import PeerHandle
+
+
+class PeerRegistry:
+  """The peers of a node by id, with their connection state cached between updates.
+
+  peer_list is replaced rather than modified when the peers change, so holders of the previous list (a PartitionPlan) can tell it is
+  stale by identity.
+  """
+  def __init__(self, connect_timeout: float = 5.0, disconnect_timeout: float = 5.0):
+    self.connect_timeout = connect_timeout
+    self.disconnect_timeout = disconnect_timeout
+    self.peers: Dict[str, PeerHandle] = {}
+    self.connected: Dict[str, bool] = {}
+    self.peer_list: List[PeerHandle] = []
+
+  def get(self, node_id: str) -> Optional[PeerHandle]:
+    return self.peers.get(node_id)
+
+  def is_connected(self, node_id: str) -> bool:
+    """Connection state as of the last update, without asking the peer."""
+    return self.connected.get(node_id, False)
+
+  def __contains__(self, node_id: str) -> bool:
+    return node_id in self.peers
+
+  def __len__(self) -> int:
+    return len(self.peers)
+
+  def __iter__(self):
+    return iter(self.peer_list)
+
+  def replace(self, peers: Iterable[PeerHandle]) -> None:
+    self.peer_list = list(peers)
+    self.peers = {peer.id(): peer for peer in self.peer_list}
+    self.connected = {node_id: connected for node_id, connected in self.connected.items() if node_id in self.peers}
+
+  def diff(self, next_peers: List[PeerHandle]) -> Tuple[List[PeerHandle], List[PeerHandle], List[PeerHandle], List[PeerHandle]]:
+    """Splits next_peers into (added, removed, updated, unchanged) relative to the current peers, updated ones having a new address."""
+    next_ids = {peer.id() for peer in next_peers}
+    added, updated, unchanged = [], [], []
+    for peer in next_peers:
+      current = self.peers.get(peer.id())
+      if current is None: added.append(peer)
+      elif current.addr() != peer.addr(): updated.append(peer)
+      else: unchanged.append(peer)
+    removed = [peer for peer in self.peer_list if peer.id() not in next_ids]
+    return added, removed, updated, unchanged
+
+  async def refresh_connected(self, peers: List[PeerHandle]) -> None:
+    results = await asyncio.gather(*(peer.is_connected() for peer in peers), return_exceptions=True)
+    for peer, result in zip(peers, results):
+      self.connected[peer.id()] = result is True
+
+  async def update(self, next_peers: List[PeerHandle]) -> bool:
+    """Makes next_peers the current peers, connecting the ones that aren't and disconnecting removed ones. Returns whether the set of
+    peers or any of their addresses changed."""
+    added, removed, updated, unchanged = self.diff(next_peers)
+    # connection states are checked concurrently, a slow peer doesn't hold up the others
+    await self.refresh_connected(removed + added + updated + unchanged)
+    to_disconnect = [peer for peer in removed if self.connected[peer.id()]]
+    to_connect = [peer for peer in added + updated + unchanged if not self.connected[peer.id()]]
+
+    if DEBUG >= 2:
+      print(f"update_peers: added={added} removed={removed} updated={updated} unchanged={unchanged} to_disconnect={to_disconnect} to_connect={to_connect}")
+
+    disconnect_results = await asyncio.gather(*(self._call(peer, "disconnect", self.disconnect_timeout) for peer in to_disconnect))
+    connect_results = await asyncio.gather(*(self._call(peer, "connect", self.connect_timeout) for peer in to_connect))
+    for peer, result in zip(to_connect, connect_results):
+      self.connected[peer.id()] = result
+
+    if DEBUG >= 1:
+      for action, peers, results in [("disconnect", to_disconnect, disconnect_results), ("connect", to_connect, connect_results)]:
+        succeeded = [f"{peer.id()}@{peer.addr()}" for peer, result in zip(peers, results) if result]
+        failed = [f"{peer.id()}@{peer.addr()}" for peer, result in zip(peers, results) if not result]
+        if succeeded: print(f"Successfully {action}ed peers: {succeeded}")
+        if failed: print(f"Failed to {action} peers: {failed}")
+
+    self.replace(next_peers)
+    return len(added) > 0 or len(removed) > 0 or len(updated) > 0
+
+  async def _call(self, peer: PeerHandle, method: str, timeout: float) -> bool:
+    try:
+      await asyncio.wait_for(getattr(peer, method)(), timeout)
+      return True
+    except Exception as e:
+      print(f"Error {method}ing peer {peer.id()}@{peer.addr()}: {e}")
+      traceback.print_exc()
+      return False
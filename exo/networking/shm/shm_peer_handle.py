@@ -0,0 +1,163 @@
+import asyncio
+import os
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from exo import DEBUG
+from exo.inference.shard import Shard
+from exo.networking.peer_handle import PeerHandle
+from exo.networking.grpc import node_service_pb2
+from exo.networking.grpc.grpc_peer_handle import GRPCPeerHandle
+from exo.topology.device_capabilities import DeviceCapabilities
+from exo.topology.topology import Topology
+from exo.topology.topology_sync import NodeRecord
+from .shm_ring_buffer import ShmRingBuffer
+from .shm_server import ACK, FRAME, HELLO, shm_socket_path
+
+
+class ShmPeerHandle(PeerHandle):
+  """Sends tensors to a peer on the same host through a shared memory ring buffer, and everything else through its GRPCPeerHandle.
+
+  The peer is on the same host when its ShmServer's unix socket exists here. Otherwise, or when the shared memory connection fails,
+  tensors go through gRPC as well.
+  """
+  def __init__(self, peer: GRPCPeerHandle, ring_size: int = 64*1024*1024):
+    self.peer = peer
+    self.ring_size = ring_size
+    self.ring: Optional[ShmRingBuffer] = None
+    self.reader: Optional[asyncio.StreamReader] = None
+    self.writer: Optional[asyncio.StreamWriter] = None
+    self.ack_reader: Optional[asyncio.Task] = None
+    self.pending_frames: Dict[int, Tuple[asyncio.Future, int]] = {}
+    self.frame_sequence = 0
+    self.shm_attempted = False
+    self._connect_lock = asyncio.Lock()
+
+  def __getattr__(self, name):
+    # methods the PeerHandle interface doesn't declare (send_example, send_opaque_status, ...) go to gRPC as they are
+    if name == "peer": raise AttributeError(name)
+    return getattr(self.peer, name)
+
+  def id(self) -> str:
+    return self.peer.id()
+
+  def addr(self) -> str:
+    return self.peer.addr()
+
+  def description(self) -> str:
+    return self.peer.description()
+
+  def device_capabilities(self) -> DeviceCapabilities:
+    return self.peer.device_capabilities()
+
+  def update_addresses(self, addresses: List[str]) -> None:
+    self.peer.update_addresses(addresses)
+
+  async def connect(self) -> None:
+    await self.peer.connect()
+    await self.close_shm()
+    await self.connect_shm()
+
+  async def is_connected(self) -> bool:
+    return await self.peer.is_connected()
+
+  async def disconnect(self) -> None:
+    await self.close_shm()
+    self.shm_attempted = False
+    await self.peer.disconnect()
+
+  async def health_check(self) -> bool:
+    return await self.peer.health_check()
+
+  async def send_prompt(self, shard: Shard, prompt: str, inference_state: Optional[dict] = None, request_id: Optional[str] = None, origin_node_id: Optional[str] = None) -> Optional[np.array]:
+    return await self.peer.send_prompt(shard, prompt, inference_state, request_id, origin_node_id)
+
+  async def send_tensor(self, shard: Shard, tensor: np.ndarray, inference_state: Optional[dict] = None, request_id: Optional[str] = None, origin_node_id: Optional[str] = None) -> Optional[np.array]:
+    if not self.shm_attempted:
+      async with self._connect_lock:
+        if not self.shm_attempted: await self.connect_shm()
+    if self.ring is None or tensor.nbytes > self.ring.size//2:
+      return await self.peer.send_tensor(shard, tensor, inference_state, request_id, origin_node_id)
+
+    tensor = np.ascontiguousarray(tensor)
+    ring, writer = self.ring, self.writer
+    offset = await ring.allocate(tensor.nbytes)
+    ring.write(offset, tensor)
+    request = self.peer.tensor_request(shard, node_service_pb2.Tensor(shape=tensor.shape, dtype=str(tensor.dtype)), inference_state, request_id, origin_node_id)
+    message = request.SerializeToString()
+    self.frame_sequence += 1
+    sequence = self.frame_sequence
+    ack = asyncio.get_running_loop().create_future()
+    self.pending_frames[sequence] = (ack, offset)
+    try:
+      writer.write(FRAME.pack(sequence, offset, tensor.nbytes, len(message)) + message)
+      await writer.drain()
+    except Exception:
+      self.pending_frames.pop(sequence, None)
+      await ring.release(offset)
+      await self.close_shm()
+      raise
+    await ack
+
+  async def send_result(self, request_id: str, result: List[int], is_finished: bool) -> None:
+    await self.peer.send_result(request_id, result, is_finished)
+
+  async def cancel_request(self, request_id: str) -> None:
+    await self.peer.cancel_request(request_id)
+
+  async def collect_topology(self, visited: set[str], max_depth: int) -> Topology:
+    return await self.peer.collect_topology(visited, max_depth)
+
+  async def ping(self, payload_bytes: int = 0) -> None:
+    await self.peer.ping(payload_bytes)
+
+  async def sync_topology(self, versions: Dict[str, int], records: Dict[str, NodeRecord]) -> Tuple[Dict[str, int], Dict[str, NodeRecord]]:
+    return await self.peer.sync_topology(versions, records)
+
+  async def connect_shm(self) -> None:
+    self.shm_attempted = True
+    path = shm_socket_path(self.id())
+    if not os.path.exists(path): return
+    ring = None
+    try:
+      reader, writer = await asyncio.open_unix_connection(path)
+      ring = ShmRingBuffer(self.ring_size)
+      name = ring.name.encode()
+      writer.write(HELLO.pack(len(name)) + name)
+      await writer.drain()
+      _, error_length = ACK.unpack(await reader.readexactly(ACK.size))
+      if error_length: raise ConnectionError((await reader.readexactly(error_length)).decode())
+    except Exception as e:
+      if DEBUG >= 1: print(f"Not using shared memory for {self.id()}@{self.addr()}: {e}")
+      if ring is not None: await ring.close()
+      return
+    self.ring, self.reader, self.writer = ring, reader, writer
+    self.ack_reader = asyncio.create_task(self.read_acks(reader, ring))
+    if DEBUG >= 1: print(f"Sending tensors to {self.id()} through shared memory")
+
+  async def read_acks(self, reader: asyncio.StreamReader, ring: ShmRingBuffer) -> None:
+    error = None
+    try:
+      while True:
+        sequence, error_length = ACK.unpack(await reader.readexactly(ACK.size))
+        message = (await reader.readexactly(error_length)).decode() if error_length else None
+        ack, offset = self.pending_frames.pop(sequence, (None, None))
+        if ack is None: continue
+        await ring.release(offset)
+        if ack.done(): continue
+        if message is None: ack.set_result(None)
+        else: ack.set_exception(RuntimeError(f"{self.id()} failed to process tensor: {message}"))
+    except Exception as e:
+      error = e
+      if DEBUG >= 2: print(f"Shared memory connection to {self.id()} closed: {e}")
+    finally:
+      if self.ring is ring: await self.close_shm(ConnectionError(f"Shared memory connection to {self.id()} closed: {error}"))
+
+  async def close_shm(self, error: Optional[Exception] = None) -> None:
+    if self.ack_reader is not None and self.ack_reader is not asyncio.current_task(): self.ack_reader.cancel()
+    if self.writer is not None: self.writer.close()
+    # frames without an ack may or may not have been processed, fail them rather than resend
+    for ack, _ in self.pending_frames.values():
+      if not ack.done(): ack.set_exception(error or ConnectionError(f"Shared memory connection to {self.id()} closed"))
+    self.pending_frames.clear()
+    if self.ring is not None: await self.ring.close()
+    self.ring, self.reader, self.writer, self.ack_reader = None, None, None, None
@@ -0,0 +1,82 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional
+import numpy as np
+
+ALIGNMENT = 64
+
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+  shm = shared_memory.SharedMemory(name=name, create=False)
+  # before python 3.13 attaching registers the segment with this process' resource tracker, which would unlink it on exit while the
+  # producer still uses it
+  try:
+    resource_tracker.unregister(shm._name, "shared_memory")
+  except Exception:
+    pass
+  return shm
+
+
+class ShmRingBuffer:
+  """Ring of variable-sized regions in a shared memory segment, written by one producer.
+
+  Only the producer tracks which regions are in use: it tells the consumer where each tensor is over the control channel and
+  releases the region when the consumer acks it. Regions can be released in any order, space is reclaimed in allocation order.
+  """
+  def __init__(self, size: int = 64*1024*1024, name: Optional[str] = None):
+    self.size = size
+    self.shm = shared_memory.SharedMemory(name=name or f"exo-{uuid.uuid4().hex[:16]}", create=True, size=size)
+    self.name = self.shm.name
+    # offset -> [end, released] in allocation order
+    self.regions: OrderedDict[int, list] = OrderedDict()
+    self.space_freed = asyncio.Condition()
+    self.closed = False
+
+  def try_allocate(self, nbytes: int) -> Optional[int]:
+    nbytes = max(-(-nbytes // ALIGNMENT)*ALIGNMENT, ALIGNMENT)
+    if not self.regions:
+      offset = 0 if nbytes <= self.size else None
+    else:
+      head = next(iter(self.regions))
+      last = next(reversed(self.regions))
+      tail = self.regions[last][0]
+      if last >= head:
+        # free space is [tail, size) and [0, head)
+        offset = tail if tail + nbytes <= self.size else (0 if nbytes <= head else None)
+      else:
+        offset = tail if tail + nbytes <= head else None
+    if offset is not None: self.regions[offset] = [offset + nbytes, False]
+    return offset
+
+  async def allocate(self, nbytes: int) -> int:
+    if nbytes > self.size: raise ValueError(f"{nbytes} bytes don't fit in a ring buffer of {self.size} bytes")
+    async with self.space_freed:
+      while True:
+        if self.closed: raise ConnectionError(f"Ring buffer {self.name} is closed")
+        if (offset := self.try_allocate(nbytes)) is not None: return offset
+        await self.space_freed.wait()
+
+  async def release(self, offset: int) -> None:
+    region = self.regions.get(offset)
+    if region is None: return
+    region[1] = True
+    while self.regions and next(iter(self.regions.values()))[1]:
+      self.regions.popitem(last=False)
+    async with self.space_freed:
+      self.space_freed.notify_all()
+
+  def write(self, offset: int, tensor: np.ndarray) -> None:
+    np.ndarray(tensor.shape, dtype=tensor.dtype, buffer=self.shm.buf, offset=offset)[...] = tensor
+
+  async def close(self) -> None:
+    self.closed = True
+    self.regions.clear()
+    async with self.space_freed:
+      self.space_freed.notify_all()
+    try:
+      self.shm.close()
+      self.shm.unlink()
+    except FileNotFoundError:
+      pass
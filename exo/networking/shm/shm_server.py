@@ -0,0 +1,88 @@
+import asyncio
+import os
+import struct
+import tempfile
+from exo import DEBUG
+from exo.networking.server import Server
+from exo.networking.grpc import node_service_pb2
+from exo.networking.grpc.grpc_server import GRPCServer
+from .shm_ring_buffer import attach_shared_memory
+
+# control messages on the unix socket: the producer opens with its ring buffer's name, then sends one frame per tensor
+HELLO = struct.Struct("<I")  # name length
+FRAME = struct.Struct("<QQQI")  # sequence, offset in the ring, tensor bytes, TensorRequest length
+ACK = struct.Struct("<QI")  # sequence, error length
+
+
+def shm_socket_path(node_id: str) -> str:
+  # a node's socket is only reachable by processes on the same host, which is how peers find out they can use shared memory
+  return os.path.join(tempfile.gettempdir(), f"exo-{node_id}.sock")
+
+
+async def write_ack(writer: asyncio.StreamWriter, sequence: int, error: str = "") -> None:
+  error = error.encode()
+  writer.write(ACK.pack(sequence, len(error)) + error)
+  await writer.drain()
+
+
+class ShmServer(Server):
+  """Accepts tensors from peers on the same host through shared memory, next to a GRPCServer that handles everything else."""
+  def __init__(self, node_id: str, server: GRPCServer):
+    self.node_id = node_id
+    self.server = server
+    self.path = shm_socket_path(node_id)
+    self.unix_server = None
+
+  async def start(self) -> None:
+    await self.server.start()
+    if os.path.exists(self.path): os.unlink(self.path)
+    self.unix_server = await asyncio.start_unix_server(self.handle_connection, path=self.path)
+    if DEBUG >= 1: print(f"Shared memory server listening on {self.path}")
+
+  async def stop(self) -> None:
+    if self.unix_server:
+      self.unix_server.close()
+      await self.unix_server.wait_closed()
+      self.unix_server = None
+    if os.path.exists(self.path): os.unlink(self.path)
+    await self.server.stop()
+
+  async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    shm, tasks = None, set()
+    try:
+      name_length, = HELLO.unpack(await reader.readexactly(HELLO.size))
+      name = (await reader.readexactly(name_length)).decode()
+      try:
+        shm = attach_shared_memory(name)
+      except Exception as e:
+        await write_ack(writer, 0, f"Failed to attach to {name}: {e}")
+        return
+      await write_ack(writer, 0)
+
+      while True:
+        sequence, offset, nbytes, request_length = FRAME.unpack(await reader.readexactly(FRAME.size))
+        request = node_service_pb2.TensorRequest.FromString(await reader.readexactly(request_length))
+        # copied out rather than viewed, engines may hold on to their input after it's processed and the region is reused once acked
+        tensor_data = bytes(shm.buf[offset:offset + nbytes])
+        task = asyncio.create_task(self.process_frame(writer, sequence, request, tensor_data))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    except asyncio.IncompleteReadError:
+      pass
+    except Exception as e:
+      if DEBUG >= 2: print(f"Shared memory connection failed: {e}")
+    finally:
+      await asyncio.gather(*tasks, return_exceptions=True)
+      if shm is not None: shm.close()
+      writer.close()
+
+  async def process_frame(self, writer: asyncio.StreamWriter, sequence: int, request: node_service_pb2.TensorRequest, tensor_data: bytes) -> None:
+    try:
+      await self.server.process_tensor_request(request, tensor_data)
+      error = ""
+    except Exception as e:
+      error = str(e) or repr(e)
+    try:
+      await write_ack(writer, sequence, error)
+    except ConnectionError:
+      pass
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import unittest
+import uuid
+import numpy as np
+from exo.inference.shard import Shard
+from exo.networking.grpc.grpc_peer_handle import GRPCPeerHandle
+from exo.networking.grpc.grpc_server import GRPCServer
+from exo.networking.shm.shm_peer_handle import ShmPeerHandle
+from exo.networking.shm.shm_ring_buffer import ShmRingBuffer
+from exo.networking.shm.shm_server import ShmServer
+from exo.networking.test_doubles import RecordingNode
+from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
+
+
+class TestShmRingBuffer(unittest.IsolatedAsyncioTestCase):
+  async def asyncSetUp(self):
+    self.ring = ShmRingBuffer(1024)
+
+  async def asyncTearDown(self):
+    await self.ring.close()
+
+  async def test_allocation_wraps_around(self):
+    a = self.ring.try_allocate(400)
+    b = self.ring.try_allocate(400)
+    self.assertEqual((a, b), (0, 448))
+    self.assertIsNone(self.ring.try_allocate(400))
+    await self.ring.release(b)
+    # b is free but a, allocated before it, is still in use
+    self.assertIsNone(self.ring.try_allocate(400))
+    await self.ring.release(a)
+    self.assertEqual(self.ring.try_allocate(400), 0)
+    self.assertEqual(self.ring.try_allocate(400), 448)
+
+  async def test_allocate_waits_for_space(self):
+    offset = self.ring.try_allocate(1000)
+    waiter = asyncio.create_task(self.ring.allocate(500))
+    await asyncio.sleep(0.01)
+    self.assertFalse(waiter.done())
+    await self.ring.release(offset)
+    self.assertEqual(await asyncio.wait_for(waiter, 1), 0)
+
+  async def test_close_wakes_waiters(self):
+    self.ring.try_allocate(1000)
+    waiter = asyncio.create_task(self.ring.allocate(500))
+    await asyncio.sleep(0.01)
+    await self.ring.close()
+    with self.assertRaises(ConnectionError):
+      await asyncio.wait_for(waiter, 1)
+
+
+class TestShmTransport(unittest.IsolatedAsyncioTestCase):
+  async def asyncSetUp(self):
+    self.node = RecordingNode()
+    self.node_id = f"test-{uuid.uuid4().hex[:8]}"
+    self.server = ShmServer(self.node_id, GRPCServer(self.node, "localhost", 50072))
+    await self.server.start()
+    caps = DeviceCapabilities(model="test", chip="test", memory=0, flops=DeviceFlops(fp32=0, fp16=0, int8=0))
+    self.peer = ShmPeerHandle(GRPCPeerHandle(self.node_id, "localhost:50072", "test", caps), ring_size=1024*1024)
+    self.shard = Shard("test", 0, 0, 2)
+
+  async def asyncTearDown(self):
+    await self.peer.disconnect()
+    await self.server.stop()
+
+  async def test_tensors_go_through_shared_memory(self):
+    await self.peer.connect()
+    self.assertIsNotNone(self.peer.ring)
+    tensors = [np.random.default_rng(i).standard_normal((1, i + 1, 64)).astype(np.float16) for i in range(16)]
+    await asyncio.gather(*[self.peer.send_tensor(self.shard, t, {"step": i}, f"request{i}", "origin") for i, t in enumerate(tensors)])
+    self.assertEqual(len(self.node.received), 16)
+    for (request_id, tensor, inference_state, origin_node_id), expected in zip(self.node.received, tensors):
+      np.testing.assert_array_equal(tensor, expected)
+      self.assertEqual(inference_state, {"step": int(request_id[len("request"):])})
+      self.assertEqual(origin_node_id, "origin")
+    # every region was released once acked
+    self.assertEqual(len(self.peer.ring.regions), 0)
+    self.assertIsNone(self.peer.peer.tensor_stream)
+
+  async def test_errors_and_large_tensors(self):
+    with self.assertRaises(RuntimeError):
+      await self.peer.send_tensor(self.shard, np.zeros((1, 4)), request_id="fail")
+    large = np.ones((1, 1024, 512), dtype=np.float32)
+    await self.peer.send_tensor(self.shard, large, request_id="large")
+    np.testing.assert_array_equal(self.node.received[-1][1], large)
+    # too large for the ring, sent through gRPC
+    self.assertIsNotNone(self.peer.peer.tensor_stream)
+
+  async def test_falls_back_without_socket(self):
+    await self.server.stop()
+    self.server = GRPCServer(self.node, "localhost", 50072)
+    await self.server.start()
+    self.assertFalse(os.path.exists(f"/tmp/exo-{self.node_id}.sock"))
+    await self.peer.send_tensor(self.shard, np.ones((1, 8)), request_id="grpc")
+    self.assertIsNone(self.peer.ring)
+    self.assertEqual(self.node.received[-1][0], "grpc")
+
+
+if __name__ == "__main__":
+  unittest.main()
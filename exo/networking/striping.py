@@ -0,0 +1,96 @@
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class StripePolicy:
+  """Splits large tensor transfers to one peer across all the addresses it is reachable at, in proportion to each link's throughput.
+
+  Small tensors (decode steps) are latency bound and always go over the primary link only. A link that would only carry a sliver of
+  a transfer costs more in per-call overhead than it adds in bandwidth, it is left out except for every probe_interval-th transfer,
+  which keeps its throughput estimate current. A link whose transfer failed is left out for retry_after seconds.
+  """
+  def __init__(self, min_bytes: int = 2*1024*1024, min_share: float = 0.1, smoothing: float = 0.3, retry_after: float = 30.0, probe_interval: int = 32):
+    self.min_bytes = min_bytes
+    self.min_share = min_share
+    self.smoothing = smoothing
+    self.retry_after = retry_after
+    self.probe_interval = probe_interval
+    self.enabled = True
+    # every address the peer is known at, best first
+    self.addresses: List[str] = []
+    # address -> bytes per second, exponentially weighted over recent transfers
+    self.rates: Dict[str, float] = {}
+    self.failed_at: Dict[str, float] = {}
+    self.transfers = 0
+
+  def update_addresses(self, addresses: Sequence[str]) -> None:
+    self.addresses = list(addresses)
+
+  def record_transfer(self, address: str, nbytes: int, seconds: float) -> None:
+    if seconds <= 0: return
+    sample = nbytes/seconds
+    rate = self.rates.get(address)
+    self.rates[address] = sample if rate is None else (1 - self.smoothing)*rate + self.smoothing*sample
+
+  def link_failed(self, address: str) -> None:
+    self.failed_at[address] = time.monotonic()
+
+  def plan(self, nbytes: int, primary: str) -> Optional[List[Tuple[str, int, int]]]:
+    """Returns the (address, start, end) byte range each link carries, or None when the transfer goes over the primary link as is."""
+    if not self.enabled or nbytes < self.min_bytes: return None
+    now = time.monotonic()
+    addresses = [primary] + [a for a in self.addresses if a != primary and (a not in self.failed_at or now - self.failed_at[a] >= self.retry_after)]
+    if len(addresses) < 2: return None
+
+    # links not measured yet get the average rate of the others, which gives them a fair first share
+    measured = [self.rates[a] for a in addresses if a in self.rates]
+    default_rate = sum(measured)/len(measured) if measured else 1.0
+    weights = {a: self.rates.get(a, default_rate) for a in addresses}
+    self.transfers += 1
+    if self.transfers % self.probe_interval != 0:
+      total = sum(weights.values())
+      weights = {a: w for a, w in weights.items() if w >= self.min_share*total}
+    if len(weights) < 2: return None
+
+    total = sum(weights.values())
+    stripes, start = [], 0
+    for i, (address, weight) in enumerate(weights.items()):
+      end = nbytes if i == len(weights) - 1 else start + int(nbytes*weight/total)
+      if end > start: stripes.append((address, start, end))
+      start = end
+    return stripes
+
+
+class StripeAssembler:
+  """Collects the chunks of striped transfers until the request referencing them arrives.
+
+  Transfers a sender gave up on are never taken. They are dropped after max_age seconds, or when the same sender has more than
+  max_transfers in progress, oldest first, so one sender's concurrent transfers can't push out another's.
+  """
+  def __init__(self, max_transfers: int = 16, max_age: float = 60.0):
+    self.max_transfers = max_transfers
+    self.max_age = max_age
+    # transfer_id -> (buffer, bytes received, sender_id, monotonic time of the first chunk)
+    self.transfers: OrderedDict[str, Tuple[bytearray, int, str, float]] = OrderedDict()
+
+  def add(self, transfer_id: str, offset: int, total_bytes: int, data, sender_id: str = "") -> None:
+    now = time.monotonic()
+    self.expire(now)
+    buffer, received, _, started_at = self.transfers.get(transfer_id, (None, 0, sender_id, now))
+    if buffer is None:
+      buffer = bytearray(total_bytes)
+      pending = [tid for tid, transfer in self.transfers.items() if transfer[2] == sender_id]
+      for tid in pending[:max(len(pending) - self.max_transfers + 1, 0)]: self.transfers.pop(tid)
+    if offset + len(data) > len(buffer): raise ValueError(f"Chunk at {offset} of transfer {transfer_id} overruns its {len(buffer)} bytes")
+    buffer[offset:offset + len(data)] = data
+    self.transfers[transfer_id] = (buffer, received + len(data), sender_id, started_at)
+
+  def expire(self, now: Optional[float] = None) -> None:
+    now = time.monotonic() if now is None else now
+    for transfer_id in [tid for tid, transfer in self.transfers.items() if now - transfer[3] > self.max_age]: self.transfers.pop(transfer_id)
+
+  def take(self, transfer_id: str) -> memoryview:
+    buffer, received, _, _ = self.transfers.pop(transfer_id, (None, 0, "", 0.0))
+    if buffer is None or received != len(buffer): raise ValueError(f"Transfer {transfer_id} is incomplete")
+    return memoryview(buffer)
@@ -102,10 +102,12 @@ class TailscaleDiscovery(Discovery):
               current_time,
               current_time,
             )
+            self.on_peers_changed.trigger_all()
           else:
             if not await self.known_peers[peer_id][0].health_check():
               if DEBUG >= 1: print(f"Peer {peer_id} at {peer_host}:{peer_port} is not healthy. Removing.")
               if peer_id in self.known_peers: del self.known_peers[peer_id]
+              self.on_peers_changed.trigger_all()
               continue
             self.known_peers[peer_id] = (self.known_peers[peer_id][0], self.known_peers[peer_id][1], current_time)
 
@@ -157,6 +159,7 @@ class TailscaleDiscovery(Discovery):
           if peer_id in self.known_peers:
             del self.known_peers[peer_id]
             if DEBUG_DISCOVERY >= 2: print(f"Removed peer {peer_id} due to inactivity or failed health check.")
+        if peers_to_remove: self.on_peers_changed.trigger_all()
       except Exception as e:
         print(f"Error in cleanup peers: {e}")
         print(traceback.format_exc())
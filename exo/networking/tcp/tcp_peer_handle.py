@@ -0,0 +1,124 @@
+import asyncio
+from typing import Dict, Optional
+from exo import DEBUG
+from exo.networking.grpc import node_service_pb2
+from exo.networking.grpc.grpc_peer_handle import GRPCPeerHandle
+from exo.topology.device_capabilities import DeviceCapabilities
+from .tcp_server import ERROR, METHOD_IDS, read_frame, write_frame
+
+# method -> response type
+RESPONSES = {
+  "SendPrompt": node_service_pb2.Tensor,
+  "SendTensor": node_service_pb2.Tensor,
+  "SendExample": node_service_pb2.Loss,
+  "CollectTopology": node_service_pb2.Topology,
+  "SendResult": node_service_pb2.Empty,
+  "SendOpaqueStatus": node_service_pb2.Empty,
+  "HealthCheck": node_service_pb2.HealthCheckResponse,
+  "CancelRequest": node_service_pb2.Empty,
+  "SendTensorChunk": node_service_pb2.Empty,
+  "SyncTopology": node_service_pb2.TopologyDelta,
+  "Ping": node_service_pb2.Empty,
+}
+
+
+class TCPConnection:
+  """One connection to a TCPServer, shared by all calls to the peer: requests are pipelined and matched to responses by sequence."""
+  def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    self.reader = reader
+    self.writer = writer
+    self.pending: Dict[int, asyncio.Future] = {}
+    self.sequence = 0
+    self.closed = False
+    self.response_reader = asyncio.create_task(self.read_responses())
+
+  @classmethod
+  async def open(cls, host: str, port: int) -> "TCPConnection":
+    reader, writer = await asyncio.open_connection(host, port)
+    return cls(reader, writer)
+
+  async def call(self, method: str, request, payload=b""):
+    if self.closed: raise ConnectionError("Connection closed")
+    self.sequence += 1
+    sequence = self.sequence
+    response = asyncio.get_running_loop().create_future()
+    self.pending[sequence] = response
+    try:
+      write_frame(self.writer, sequence, METHOD_IDS[method], request.SerializeToString(), payload)
+      await self.writer.drain()
+      kind, message = await response
+    finally:
+      self.pending.pop(sequence, None)
+    if kind == ERROR: raise RuntimeError(message.decode())
+    return RESPONSES[method].FromString(message)
+
+  async def read_responses(self) -> None:
+    error = None
+    try:
+      while True:
+        sequence, kind, message, _ = await read_frame(self.reader)
+        response = self.pending.get(sequence)
+        if response is not None and not response.done(): response.set_result((kind, message))
+    except Exception as e:
+      error = e
+    finally:
+      self.closed = True
+      for response in self.pending.values():
+        if not response.done(): response.set_exception(ConnectionError(f"Connection closed: {error!r}"))
+
+  async def close(self) -> None:
+    self.closed = True
+    self.response_reader.cancel()
+    self.writer.close()
+    try:
+      await self.writer.wait_closed()
+    except Exception:
+      pass
+
+
+class TCPStub:
+  """Stands in for NodeServiceStub, so GRPCPeerHandle's calls go over a TCPConnection."""
+  def __init__(self, connection: TCPConnection):
+    self.connection = connection
+
+  def pinned(self, key: str) -> "TCPStub":
+    # one connection, calls already arrive in the order they are made
+    return self
+
+  def __getattr__(self, method: str):
+    if method not in RESPONSES: raise AttributeError(method)
+    return lambda request: self.connection.call(method, request)
+
+
+class TCPPeerHandle(GRPCPeerHandle):
+  """Talks to a TCPServer. Building requests and parsing responses is GRPCPeerHandle's, only the connection is different."""
+  def __init__(self, _id: str, address: str, desc: str, device_capabilities: DeviceCapabilities, tensor_compression: str = "none"):
+    # pipelining on the one connection already does what the gRPC tensor stream is for
+    super().__init__(_id, address, desc, device_capabilities, use_tensor_stream=False, tensor_compression=tensor_compression)
+    self.connection: Optional[TCPConnection] = None
+
+  async def connect(self):
+    await self.close_stripe_links()
+    if self.connection is not None: await self.connection.close()
+    host, port = self.address.rsplit(":", 1)
+    self.connection = await asyncio.wait_for(TCPConnection.open(host, int(port)), timeout=10.0)
+    self.stub = TCPStub(self.connection)
+    self.send_tensor_call = lambda request: self.connection.call("SendTensor", *request)
+    self.send_tensor_chunk_call = lambda request: self.connection.call("SendTensorChunk", *request)
+    if DEBUG >= 2: print(f"Connected to {self._id}@{self.address} over TCP")
+
+  async def is_connected(self) -> bool:
+    return self.connection is not None and not self.connection.closed
+
+  async def disconnect(self):
+    await self.close_stripe_links()
+    if self.connection is not None: await self.connection.close()
+    self.connection = None
+    self.stub = None
+    self.send_tensor_call = None
+    self.send_tensor_chunk_call = None
+
+  async def open_stripe_link(self, address: str):
+    host, port = address.rsplit(":", 1)
+    connection = await asyncio.wait_for(TCPConnection.open(host, int(port)), timeout=10.0)
+    return connection, lambda request: connection.call("SendTensorChunk", *request)
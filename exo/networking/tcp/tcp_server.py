@@ -0,0 +1,109 @@
+import asyncio
+import struct
+from exo import DEBUG
+from exo.networking.server import Server
+from exo.networking.grpc import node_service_pb2
+from exo.networking.grpc.grpc_server import GRPCServer
+from exo.orchestration import Node
+
+# every frame is a header followed by a serialized protobuf message and, for tensors, the raw tensor data. Requests on one
+# connection are told apart by their sequence number, so a peer can pipeline them and responses come back as they complete.
+HEADER = struct.Struct("<QBIQ")  # sequence, method (requests) or status (responses), message length, payload length
+OK, ERROR = 0, 1
+
+# method -> request type, in the order of their ids on the wire
+METHODS = {
+  "SendPrompt": node_service_pb2.PromptRequest,
+  "SendTensor": node_service_pb2.TensorRequest,
+  "SendExample": node_service_pb2.ExampleRequest,
+  "CollectTopology": node_service_pb2.CollectTopologyRequest,
+  "SendResult": node_service_pb2.SendResultRequest,
+  "SendOpaqueStatus": node_service_pb2.SendOpaqueStatusRequest,
+  "HealthCheck": node_service_pb2.HealthCheckRequest,
+  "CancelRequest": node_service_pb2.CancelRequestRequest,
+  "SendTensorChunk": node_service_pb2.TensorChunk,
+  "SyncTopology": node_service_pb2.TopologyDelta,
+  "Ping": node_service_pb2.PingRequest,
+}
+METHOD_IDS = {name: i for i, name in enumerate(METHODS)}
+METHOD_NAMES = list(METHODS)
+# methods whose request is a (message, payload) pair
+PAYLOAD_METHODS = {"SendTensor", "SendTensorChunk"}
+
+
+def write_frame(writer: asyncio.StreamWriter, sequence: int, kind: int, message: bytes, payload=b"") -> None:
+  writer.write(HEADER.pack(sequence, kind, len(message), len(payload)))
+  writer.write(message)
+  if len(payload) > 0: writer.write(payload)
+
+
+async def read_frame(reader: asyncio.StreamReader):
+  sequence, kind, message_length, payload_length = HEADER.unpack(await reader.readexactly(HEADER.size))
+  message = await reader.readexactly(message_length) if message_length else b""
+  payload = await reader.readexactly(payload_length) if payload_length else b""
+  return sequence, kind, message, payload
+
+
+class TCPServer(Server):
+  """Serves the NodeService methods over plain asyncio streams with length-prefixed binary frames.
+
+  The handlers are GRPCServer's, which don't depend on gRPC themselves, so both transports process requests the same way.
+  """
+  def __init__(self, node: Node, host: str, port: int):
+    self.node = node
+    self.host = host
+    self.port = port
+    self.servicer = GRPCServer(node, host, port)
+    self.server = None
+    # writer -> task handling the connection
+    self.connections = {}
+
+  async def start(self) -> None:
+    self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+    if DEBUG >= 1: print(f"TCP server started, listening on {self.host}:{self.port}")
+
+  async def stop(self) -> None:
+    if self.server:
+      self.server.close()
+      # closing the server only stops accepting, established connections are closed here
+      tasks = list(self.connections.values())
+      for writer in list(self.connections):
+        writer.close()
+      await asyncio.gather(*tasks, return_exceptions=True)
+      await self.server.wait_closed()
+      self.server = None
+      if DEBUG >= 1: print("TCP server stopped")
+
+  async def process_tensor_request(self, request, tensor_data):
+    return await self.servicer.process_tensor_request(request, tensor_data)
+
+  async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    tasks = set()
+    self.connections[writer] = asyncio.current_task()
+    try:
+      while True:
+        sequence, method, message, payload = await read_frame(reader)
+        task = asyncio.create_task(self.handle_request(writer, sequence, method, message, payload))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    except (asyncio.IncompleteReadError, ConnectionError):
+      pass
+    finally:
+      # requests already received still run to completion, their responses just have nowhere to go
+      self.connections.pop(writer, None)
+      writer.close()
+
+  async def handle_request(self, writer: asyncio.StreamWriter, sequence: int, method: int, message: bytes, payload: bytes) -> None:
+    try:
+      name = METHOD_NAMES[method]
+      request = METHODS[name].FromString(message)
+      # tensor data arrives next to the message rather than inside it, the handler gets a view of it
+      response = await getattr(self.servicer, name)((request, memoryview(payload)) if name in PAYLOAD_METHODS else request, None)
+      write_frame(writer, sequence, OK, response.SerializeToString())
+    except Exception as e:
+      if DEBUG >= 2: print(f"TCP request {sequence} failed: {e!r}")
+      write_frame(writer, sequence, ERROR, (str(e) or repr(e)).encode())
+    try:
+      await writer.drain()
+    except ConnectionError:
+      pass
@@ -0,0 +1,69 @@
+import asyncio
+import unittest
+import numpy as np
+from exo.inference.shard import Shard
+from exo.networking.tcp.tcp_peer_handle import TCPPeerHandle
+from exo.networking.tcp.tcp_server import TCPServer
+from exo.networking.test_doubles import RecordingNode
+from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
+from exo.topology.topology import LinkStats
+from exo.topology.topology_sync import TopologyState
+
+
+class TestTCPTransport(unittest.IsolatedAsyncioTestCase):
+  async def asyncSetUp(self):
+    self.node = RecordingNode()
+    self.caps = DeviceCapabilities(model="test", chip="test", memory=1024, flops=DeviceFlops(fp32=1, fp16=2, int8=4))
+    self.node.current_topology.update_node("node", self.caps)
+    self.node.topology_state.update_local(self.caps, {"other": "Thunderbolt"})
+    self.server = TCPServer(self.node, "localhost", 50073)
+    await self.server.start()
+    self.peer = TCPPeerHandle("node", "localhost:50073", "test", self.caps)
+    self.shard = Shard("test", 0, 0, 2)
+
+  async def asyncTearDown(self):
+    await self.peer.disconnect()
+    await self.server.stop()
+
+  async def test_pipelined_tensors(self):
+    self.assertTrue(await self.peer.health_check())
+    tensors = {f"request{i}": np.full((1, i + 1, 16), i, dtype=np.float32) for i in range(20)}
+    await asyncio.gather(*[self.peer.send_tensor(self.shard, t, {"step": 1}, request_id) for request_id, t in tensors.items()])
+    self.assertEqual(len(self.node.received), 20)
+    for request_id, tensor, inference_state, _ in self.node.received:
+      np.testing.assert_array_equal(tensor, tensors[request_id])
+      self.assertEqual(inference_state, {"step": 1})
+
+  async def test_other_methods(self):
+    await self.peer.send_prompt(self.shard, "hello", request_id="prompt")
+    self.assertEqual(self.node.received[-1][:2], ("prompt", "hello"))
+    await self.peer.send_result("prompt", [1, 2], True)
+    self.assertEqual(self.node.results[-1], ("prompt", [1, 2], True))
+    await self.peer.cancel_request("prompt")
+    self.assertEqual(self.node.cancelled, ["prompt"])
+    topology = await self.peer.collect_topology(set(), 2)
+    self.assertEqual(topology.nodes["node"].memory, 1024)
+    other = TopologyState("other")
+    stats = LinkStats(rtt=0.001, rtt_p90=0.002, bandwidth=None, samples=3, updated_at=1.0)
+    other.update_local(self.caps, {"node": None}, {"node": stats})
+    versions, records = await self.peer.sync_topology({}, other.delta({}))
+    self.assertEqual(versions.keys(), {"node", "other"})
+    self.assertEqual(records["node"].edges, {"other": "Thunderbolt"})
+    self.assertEqual(self.node.topology_state.records["other"].edges, {"node": None})
+    self.assertEqual(self.node.topology_state.records["other"].link_stats, {"node": stats})
+    await self.peer.ping(100_000)
+
+  async def test_errors_and_reconnect(self):
+    with self.assertRaises(RuntimeError):
+      await self.peer.send_tensor(self.shard, np.zeros((1, 1)), request_id="fail")
+    await self.server.stop()
+    await asyncio.sleep(0.05)
+    self.assertFalse(await self.peer.is_connected())
+    self.server = TCPServer(self.node, "localhost", 50073)
+    await self.server.start()
+    await self.peer.send_tensor(self.shard, np.ones((1, 1)), request_id="again")
+    self.assertEqual(self.node.received[-1][0], "again")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import numpy as np
+from exo.networking.compression import TENSOR_ENCODINGS, TensorCodecPolicy, decode_tensor, encode_tensor
+
+
+def roundtrip(tensor, encoding):
+  data, scales = encode_tensor(tensor, encoding)
+  return decode_tensor(data, tensor.shape, str(tensor.dtype), encoding, scales), len(data) + len(scales)
+
+
+def fake_activations(rng, tokens=256, hidden=512, dtype=np.float32):
+  x = rng.standard_normal((1, tokens, hidden)).astype(np.float32)
+  # a few outlier channels, like the hidden states of real transformer layers
+  x[..., rng.choice(hidden, 4, replace=False)] *= 40
+  return x.astype(dtype)
+
+
+def perplexity(hidden, head, targets):
+  logits = hidden[0].astype(np.float64) @ head
+  logits -= logits.max(axis=-1, keepdims=True)
+  log_probs = logits - np.log(np.exp(logits).sum(axis=-1, keepdims=True))
+  return float(np.exp(-log_probs[np.arange(len(targets)), targets].mean()))
+
+
+class TestTensorCodecs(unittest.TestCase):
+  def setUp(self):
+    self.rng = np.random.default_rng(0)
+
+  def test_roundtrip_shapes_and_sizes(self):
+    x = fake_activations(self.rng)
+    for encoding, ratio in [("none", 1), ("fp16", 2), ("bf16", 2), ("int8", 4)]:
+      decoded, nbytes = roundtrip(x, encoding)
+      self.assertEqual(decoded.shape, x.shape)
+      self.assertEqual(decoded.dtype, x.dtype)
+      self.assertLessEqual(nbytes, x.nbytes/ratio + x.shape[-1]*4)
+    np.testing.assert_array_equal(roundtrip(x, "none")[0], x)
+    # lossless when the source is already fp16
+    x16 = x.astype(np.float16)
+    np.testing.assert_array_equal(roundtrip(x16, "fp16")[0], x16)
+
+  def test_relative_error(self):
+    x = fake_activations(self.rng)
+    bounds = {"fp16": 1e-3, "bf16": 1e-2, "int8": 5e-2}
+    for encoding, bound in bounds.items():
+      decoded, _ = roundtrip(x, encoding)
+      error = np.linalg.norm(decoded - x)/np.linalg.norm(x)
+      self.assertLess(error, bound, encoding)
+
+  def test_perplexity_change(self):
+    hidden, vocab = 512, 1000
+    x = fake_activations(self.rng, hidden=hidden)
+    head = self.rng.standard_normal((hidden, vocab))/np.sqrt(hidden)*0.1
+    targets = np.argmax(x[0] @ head + self.rng.gumbel(size=(x.shape[1], vocab)), axis=-1)
+    reference = perplexity(x, head, targets)
+    for encoding, bound in {"fp16": 1e-4, "bf16": 1e-3, "int8": 1e-2}.items():
+      decoded, _ = roundtrip(x, encoding)
+      self.assertLess(abs(perplexity(decoded, head, targets)/reference - 1), bound, encoding)
+      top1 = np.mean(np.argmax(decoded[0] @ head, axis=-1) == np.argmax(x[0] @ head, axis=-1))
+      self.assertGreater(top1, 0.95, encoding)
+
+  def test_bf16_keeps_range(self):
+    x = np.array([[1e6, -3e5, 1.5, 0.0]], dtype=np.float32)
+    np.testing.assert_allclose(roundtrip(x, "bf16")[0], x, rtol=1e-2)
+    self.assertTrue(np.isinf(roundtrip(x, "fp16")[0]).any())
+
+
+class TestTensorCodecPolicy(unittest.TestCase):
+  def test_small_and_integer_tensors_are_not_encoded(self):
+    policy = TensorCodecPolicy(min_bytes=1024)
+    self.assertEqual(policy.select(np.zeros((1, 1, 64), dtype=np.float32), TENSOR_ENCODINGS), "none")
+    self.assertEqual(policy.select(np.zeros((1, 4096), dtype=np.int64), TENSOR_ENCODINGS), "none")
+
+  def test_lossless_by_default(self):
+    policy = TensorCodecPolicy(min_bytes=1024)
+    policy.record_transfer(1 << 20, 1.0)
+    self.assertEqual(policy.select(np.ones((1, 64, 64), dtype=np.float32), TENSOR_ENCODINGS), "none")
+
+  def test_auto_selection(self):
+    policy = TensorCodecPolicy("auto-int8", min_bytes=1024, slow_link_bandwidth=100e6)
+    x32 = np.ones((1, 64, 64), dtype=np.float32)
+    x16 = x32.astype(np.float16)
+    self.assertEqual(policy.select(x32, TENSOR_ENCODINGS), "fp16")
+    self.assertEqual(policy.select(x32*1e6, TENSOR_ENCODINGS), "bf16")
+    self.assertEqual(policy.select(x16, TENSOR_ENCODINGS), "none")
+    # only encodings the receiver advertised are used
+    self.assertEqual(policy.select(x32, ("none", )), "none")
+
+    policy.record_transfer(1 << 20, 1.0)
+    self.assertLess(policy.bandwidth, 100e6)
+    self.assertEqual(policy.select(x16, TENSOR_ENCODINGS), "int8")
+    self.assertEqual(policy.select(x16, ("none", "fp16")), "none")
+    for _ in range(20):
+      policy.record_transfer(1 << 30, 1.0)
+    self.assertEqual(policy.select(x16, TENSOR_ENCODINGS), "none")
+
+    # plain auto never quantizes
+    policy = TensorCodecPolicy("auto", min_bytes=1024, slow_link_bandwidth=100e6)
+    policy.record_transfer(1 << 20, 1.0)
+    self.assertEqual(policy.select(x16, TENSOR_ENCODINGS), "none")
+    self.assertEqual(policy.select(x32, TENSOR_ENCODINGS), "fp16")
+
+  def test_fixed_mode(self):
+    policy = TensorCodecPolicy("int8", min_bytes=1024)
+    x = np.ones((1, 64, 64), dtype=np.float16)
+    self.assertEqual(policy.select(x, TENSOR_ENCODINGS), "int8")
+    self.assertEqual(policy.select(x, ("none", )), "none")
+    self.assertEqual(TensorCodecPolicy("none", min_bytes=0).select(np.ones((1, 4096), dtype=np.float32), TENSOR_ENCODINGS), "none")
+    with self.assertRaises(ValueError):
+      TensorCodecPolicy("gzip")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,38 @@
+import asyncio
+from exo.topology.topology import Topology
+from exo.topology.topology_sync import TopologyState
+
+
+class RecordingNode:
+  """Stands in for the Node behind a server in transport tests, recording what reaches it. Tensors of request "fail" raise."""
+  def __init__(self, node_id: str = "node"):
+    # (request_id, tensor or prompt, inference_state, origin_node_id)
+    self.received = []
+    self.results = []
+    self.statuses = []
+    self.cancelled = []
+    self.current_topology = Topology()
+    self.on_opaque_status = self
+    self.topology_state = TopologyState(node_id)
+
+  def trigger_all(self, *args):
+    self.statuses.append(args)
+
+  def trigger_on_token_callbacks(self, request_id, tokens, is_finished):
+    self.results.append((request_id, tokens, is_finished))
+
+  async def process_tensor(self, shard, tensor, request_id, inference_state, origin_node_id):
+    if request_id == "fail": raise ValueError("boom")
+    self.received.append((request_id, tensor.copy(), inference_state, origin_node_id))
+    # later requests finish first, responses must still reach the right caller
+    await asyncio.sleep(0.01/(1 + len(self.received)))
+
+  async def process_prompt(self, shard, prompt, request_id, inference_state, origin_node_id):
+    self.received.append((request_id, prompt, inference_state, origin_node_id))
+
+  async def cancel_request(self, request_id, broadcast=True):
+    self.cancelled.append(request_id)
+
+  async def sync_topology(self, versions, records):
+    self.topology_state.merge(records)
+    return self.topology_state.digest(), self.topology_state.delta(versions)
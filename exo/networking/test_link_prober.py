@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+from exo.networking.link_prober import LinkProber
+from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
+from exo.topology.topology_sync import TopologyState
+
+
+class SimulatedLink:
+  def __init__(self, _id, latency, bandwidth):
+    self._id = _id
+    self.latency = latency
+    self.bandwidth = bandwidth
+    self.fail = False
+
+  def id(self):
+    return self._id
+
+  async def ping(self, payload_bytes=0):
+    if self.fail: raise ConnectionError("down")
+    await asyncio.sleep(self.latency + payload_bytes/self.bandwidth)
+
+
+class TestLinkProber(unittest.IsolatedAsyncioTestCase):
+  async def test_probe(self):
+    prober = LinkProber(pings=2, payload_bytes=1_000_000, change_threshold=0.5)
+    fast, slow = SimulatedLink("fast", 0.005, 500e6), SimulatedLink("slow", 0.02, 50e6)
+    self.assertTrue(await prober.probe_all([fast, slow]))
+    self.assertLess(prober.published["fast"].rtt, prober.published["slow"].rtt)
+    self.assertGreater(prober.published["fast"].bandwidth, prober.published["slow"].bandwidth)
+    self.assertAlmostEqual(prober.published["slow"].bandwidth, 50e6, delta=15e6)
+
+    # small fluctuations don't republish, a link that got much slower does
+    self.assertFalse(await prober.probe_all([fast, slow]))
+    slow.latency = 0.2
+    for _ in range(3): await prober.probe(slow)
+    self.assertGreater(prober.published["slow"].rtt, 0.1)
+
+    # a failed probe keeps what was measured before, a peer that is gone is forgotten
+    slow.fail = True
+    self.assertFalse(await prober.probe(slow))
+    self.assertIn("slow", prober.published)
+    self.assertTrue(await prober.probe_all([fast]))
+    self.assertEqual(prober.published.keys(), {"fast"})
+
+  async def test_stats_travel_with_topology(self):
+    prober = LinkProber(pings=1, payload_bytes=0)
+    await prober.probe_all([SimulatedLink("b", 0.001, 1e9)])
+    caps = DeviceCapabilities(model="test", chip="test", memory=1, flops=DeviceFlops(fp32=0, fp16=0, int8=0))
+    a, b = TopologyState("a"), TopologyState("b")
+    a.update_local(caps, {"b": "Ethernet"}, prober.published)
+    b.update_local(caps, {"a": "Ethernet"})
+    b.merge(a.delta({}))
+    topology = b.topology()
+    self.assertEqual(topology.link_stats("a", "b"), prober.published["b"])
+    self.assertIsNone(topology.link_stats("b", "a"))
+    edge = next(iter(topology.to_json()["peer_graph"]["a"]))
+    self.assertEqual(edge["stats"]["samples"], 1)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from exo.networking.peer_registry import PeerRegistry
+
+
+class FakePeer:
+  def __init__(self, _id, address, connected=False, fail_connect=False):
+    self._id = _id
+    self.address = address
+    self.connected = connected
+    self.fail_connect = fail_connect
+    self.calls = []
+
+  def id(self):
+    return self._id
+
+  def addr(self):
+    return self.address
+
+  async def is_connected(self):
+    return self.connected
+
+  async def connect(self):
+    self.calls.append("connect")
+    if self.fail_connect: raise ConnectionError("unreachable")
+    self.connected = True
+
+  async def disconnect(self):
+    self.calls.append("disconnect")
+    self.connected = False
+
+
+class TestPeerRegistry(unittest.IsolatedAsyncioTestCase):
+  async def test_update(self):
+    registry = PeerRegistry()
+    a, b = FakePeer("a", "10.0.0.1:1"), FakePeer("b", "10.0.0.2:1", connected=True)
+    self.assertTrue(await registry.update([a, b]))
+    self.assertEqual(a.calls, ["connect"])
+    self.assertEqual(b.calls, [])
+    self.assertIs(registry.get("a"), a)
+    self.assertTrue(registry.is_connected("a"))
+    peer_list = registry.peer_list
+
+    self.assertFalse(await registry.update([a, b]))
+    self.assertEqual(a.calls, ["connect"])
+    self.assertIsNot(registry.peer_list, peer_list)
+
+    moved, c = FakePeer("a", "10.0.0.9:1"), FakePeer("c", "10.0.0.3:1", fail_connect=True)
+    self.assertEqual(registry.diff([moved, c]), ([c], [b], [moved], []))
+    self.assertTrue(await registry.update([moved, c]))
+    self.assertEqual(b.calls, ["disconnect"])
+    self.assertEqual(moved.calls, ["connect"])
+    self.assertFalse(registry.is_connected("c"))
+    self.assertNotIn("b", registry)
+    self.assertEqual([peer.id() for peer in registry], ["a", "c"])
+
+  def test_replace(self):
+    registry = PeerRegistry()
+    registry.replace([FakePeer("a", "x:1"), FakePeer("b", "y:1")])
+    self.assertEqual(len(registry), 2)
+    self.assertEqual(registry.get("b").addr(), "y:1")
+    self.assertIsNone(registry.get("c"))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+from unittest import mock
+import numpy as np
+from exo.inference.shard import Shard
+from exo.networking.grpc.grpc_peer_handle import GRPCPeerHandle
+from exo.networking.grpc.grpc_server import GRPCServer
+from exo.networking import striping
+from exo.networking.striping import StripeAssembler, StripePolicy
+from exo.networking.tcp.tcp_peer_handle import TCPPeerHandle
+from exo.networking.tcp.tcp_server import TCPServer
+from exo.networking.test_doubles import RecordingNode
+from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
+
+
+class TestStripePolicy(unittest.TestCase):
+  def test_small_transfers_and_single_links_are_not_striped(self):
+    policy = StripePolicy(min_bytes=1024)
+    policy.update_addresses(["a:1", "b:1"])
+    self.assertIsNone(policy.plan(1000, "a:1"))
+    policy.update_addresses(["a:1"])
+    self.assertIsNone(policy.plan(4096, "a:1"))
+
+  def test_split_follows_measured_rates(self):
+    policy = StripePolicy(min_bytes=1024)
+    policy.update_addresses(["a:1", "b:1"])
+    self.assertEqual(policy.plan(4096, "a:1"), [("a:1", 0, 2048), ("b:1", 2048, 4096)])
+    policy.record_transfer("a:1", 3000, 1.0)
+    policy.record_transfer("b:1", 1000, 1.0)
+    self.assertEqual(policy.plan(4096, "a:1"), [("a:1", 0, 3072), ("b:1", 3072, 4096)])
+
+  def test_slow_links_are_only_probed(self):
+    policy = StripePolicy(min_bytes=1024, min_share=0.1, probe_interval=4)
+    policy.update_addresses(["a:1", "b:1", "c:1"])
+    for address, rate in [("a:1", 1000), ("b:1", 1000), ("c:1", 10)]:
+      policy.record_transfer(address, rate, 1.0)
+    plans = [policy.plan(4096, "a:1") for _ in range(4)]
+    self.assertEqual([len(plan) for plan in plans], [2, 2, 2, 3])
+
+  def test_failed_links_are_skipped_until_retry(self):
+    policy = StripePolicy(min_bytes=1024, retry_after=60)
+    policy.update_addresses(["a:1", "b:1"])
+    policy.link_failed("b:1")
+    self.assertIsNone(policy.plan(4096, "a:1"))
+    policy.retry_after = 0
+    self.assertEqual(len(policy.plan(4096, "a:1")), 2)
+
+
+class TestStripeAssembler(unittest.TestCase):
+  def test_chunks_in_any_order(self):
+    assembler = StripeAssembler()
+    data = bytes(range(256))*4
+    assembler.add("t", 512, len(data), memoryview(data)[512:])
+    with self.assertRaises(ValueError):
+      assembler.take("t")
+    assembler.add("t", 512, len(data), memoryview(data)[512:])
+    assembler.add("t", 0, len(data), memoryview(data)[:512])
+    self.assertEqual(bytes(assembler.take("t")), data)
+
+  def test_abandoned_transfers_are_dropped(self):
+    assembler = StripeAssembler(max_transfers=2)
+    for transfer_id in ["a", "b", "c"]:
+      assembler.add(transfer_id, 0, 8, b"1234", "sender")
+    self.assertEqual(list(assembler.transfers), ["b", "c"])
+    # another sender's transfers don't push these out
+    for transfer_id in ["d", "e"]:
+      assembler.add(transfer_id, 0, 8, b"1234", "other")
+    self.assertEqual(list(assembler.transfers), ["b", "c", "d", "e"])
+
+  def test_stale_transfers_expire(self):
+    assembler = StripeAssembler(max_age=60.0)
+    with mock.patch.object(striping.time, "monotonic", return_value=100.0):
+      assembler.add("old", 0, 8, b"1234")
+    with mock.patch.object(striping.time, "monotonic", return_value=150.0):
+      assembler.add("new", 0, 8, b"1234")
+    with mock.patch.object(striping.time, "monotonic", return_value=170.0):
+      assembler.add("new", 4, 8, b"5678")
+    self.assertEqual(list(assembler.transfers), ["new"])
+    self.assertEqual(bytes(assembler.take("new")), b"12345678")
+
+
+class TestStripedTransfers(unittest.IsolatedAsyncioTestCase):
+  caps = DeviceCapabilities(model="test", chip="test", memory=1024, flops=DeviceFlops(fp32=1, fp16=2, int8=4))
+  shard = Shard("test", 0, 0, 2)
+
+  async def check_transport(self, server_class, peer_handle_class, port):
+    node = RecordingNode()
+    server = server_class(node, "localhost", port)
+    await server.start()
+    # both addresses reach the same server, which is all striping needs to be exercised
+    peer = peer_handle_class("node", f"localhost:{port}", "test", self.caps, tensor_compression="none")
+    peer.stripe_policy.min_bytes = 1024
+    peer.update_addresses([f"localhost:{port}", f"127.0.0.1:{port}", "127.0.0.1:1"])
+    try:
+      self.assertTrue(await peer.health_check())
+      tensors = {"large": np.random.rand(1, 64, 256).astype(np.float32), "small": np.ones((1, 1, 8), dtype=np.float32)}
+      for request_id, tensor in tensors.items():
+        await peer.send_tensor(self.shard, tensor, request_id=request_id)
+      # the unreachable address failed its chunk, the tensor went over the primary link instead and the address is skipped from then on
+      self.assertIn("127.0.0.1:1", peer.stripe_policy.failed_at)
+      await peer.send_tensor(self.shard, tensors["large"], request_id="striped")
+      self.assertEqual(set(peer.stripe_policy.rates), {f"localhost:{port}", f"127.0.0.1:{port}"})
+      self.assertEqual([request_id for request_id, *_ in node.received], ["large", "small", "striped"])
+      for request_id, tensor, _, _ in node.received:
+        np.testing.assert_array_equal(tensor, tensors["large" if request_id == "striped" else request_id])
+    finally:
+      await peer.disconnect()
+      await server.stop()
+
+  async def test_grpc(self):
+    await self.check_transport(GRPCServer, GRPCPeerHandle, 50074)
+
+  async def test_tcp(self):
+    await self.check_transport(TCPServer, TCPPeerHandle, 50075)
+
+
+if __name__ == "__main__":
+  unittest.main()
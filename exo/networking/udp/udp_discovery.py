@@ -73,6 +73,8 @@ class UDPDiscovery(Discovery):
     self.allowed_node_ids = allowed_node_ids
     self.allowed_interface_types = allowed_interface_types
     self.known_peers: Dict[str, Tuple[PeerHandle, float, float, int]] = {}
+    # peer_id -> address -> (priority, last_seen), the peer handle uses the best address and stripes large transfers across all of them
+    self.peer_addresses: Dict[str, Dict[str, Tuple[int, float]]] = {}
     self.broadcast_task = None
     self.listen_task = None
     self.cleanup_task = None
@@ -176,6 +178,7 @@ class UDPDiscovery(Discovery):
         return
 
       device_capabilities = DeviceCapabilities(**message["device_capabilities"])
+      self.peer_addresses.setdefault(peer_id, {})[f"{peer_host}:{peer_port}"] = (peer_prio, time.time())
 
       if peer_id not in self.known_peers or self.known_peers[peer_id][0].addr() != f"{peer_host}:{peer_port}":
         if peer_id in self.known_peers:
@@ -183,6 +186,7 @@ class UDPDiscovery(Discovery):
           if existing_peer_prio >= peer_prio:
             if DEBUG >= 1:
               print(f"Ignoring peer {peer_id} at {peer_host}:{peer_port} with priority {peer_prio} because we already know about a peer with higher or equal priority: {existing_peer_prio}")
+            self.update_peer_addresses(peer_id)
             return
         new_peer_handle = self.create_peer_handle(peer_id, f"{peer_host}:{peer_port}", f"{peer_interface_type} ({peer_interface_name})", device_capabilities)
         if not await new_peer_handle.health_check():
@@ -190,12 +194,24 @@ class UDPDiscovery(Discovery):
           return
         if DEBUG >= 1: print(f"Adding {peer_id=} at {peer_host}:{peer_port}. Replace existing peer_id: {peer_id in self.known_peers}")
         self.known_peers[peer_id] = (new_peer_handle, time.time(), time.time(), peer_prio)
+        self.update_peer_addresses(peer_id)
+        self.on_peers_changed.trigger_all()
       else:
         if not await self.known_peers[peer_id][0].health_check():
           if DEBUG >= 1: print(f"Peer {peer_id} at {peer_host}:{peer_port} is not healthy. Removing.")
           if peer_id in self.known_peers: del self.known_peers[peer_id]
+          self.peer_addresses.pop(peer_id, None)
+          self.on_peers_changed.trigger_all()
           return
         if peer_id in self.known_peers: self.known_peers[peer_id] = (self.known_peers[peer_id][0], self.known_peers[peer_id][1], time.time(), peer_prio)
+        self.update_peer_addresses(peer_id)
+
+  def update_peer_addresses(self, peer_id: str) -> None:
+    if peer_id not in self.known_peers: return
+    current_time = time.time()
+    addresses = {address: (prio, last_seen) for address, (prio, last_seen) in self.peer_addresses.get(peer_id, {}).items() if current_time - last_seen <= self.discovery_timeout}
+    self.peer_addresses[peer_id] = addresses
+    self.known_peers[peer_id][0].update_addresses(sorted(addresses, key=lambda address: addresses[address][0], reverse=True))
 
   async def task_listen_for_peers(self):
     await asyncio.get_event_loop().create_datagram_endpoint(lambda: ListenProtocol(self.on_listen_message), local_addr=("0.0.0.0", self.listen_port))
@@ -224,7 +240,9 @@ class UDPDiscovery(Discovery):
         for peer_id in peers_to_remove:
           if peer_id in self.known_peers:
             del self.known_peers[peer_id]
+            self.peer_addresses.pop(peer_id, None)
             if DEBUG_DISCOVERY >= 2: print(f"Removed peer {peer_id} due to inactivity or failed health check.")
+        if peers_to_remove: self.on_peers_changed.trigger_all()
       except Exception as e:
         print(f"Error in cleanup peers: {e}")
         print(traceback.format_exc())
@@ -0,0 +1,84 @@
+import asyncio
+import traceback
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from exo.inference.inference_engine import InferenceEngine
+from exo.inference.shard import Shard
+from exo import DEBUG
+
+
+@dataclass
+class PendingStep:
+  request_id: str
+  input_data: np.ndarray
+  inference_state: Optional[dict]
+  future: asyncio.Future
+
+
+class DecodeScheduler:
+  """Continuous batching of decode steps.
+
+  Steps submitted for the same shard while a batch is in flight are queued and run together as the next batch.
+  Only engines that implement infer_tensor_batch (tinygrad) run a batch as one stacked forward. Steps for other engines (MLX) would
+  gain nothing from waiting for one and run right away.
+  """
+  def __init__(self, max_batch_size: int = 16, max_wait: float = 0.0):
+    self.max_batch_size = max_batch_size
+    self.max_wait = max_wait
+    self.pending: Dict[Shard, List[PendingStep]] = {}
+    self.flush_tasks: Dict[Shard, asyncio.Task] = {}
+
+  async def submit(self, inference_engine: InferenceEngine, request_id: str, shard: Shard, input_data: np.ndarray, inference_state: Optional[dict] = None) -> Optional[Tuple[np.ndarray, Optional[dict]]]:
+    if not self.batches(inference_engine): return await inference_engine.infer_tensor(request_id, shard, input_data, inference_state)
+    # Resolves to None if the request is cancelled before its step runs
+    future = asyncio.get_running_loop().create_future()
+    self.pending.setdefault(shard, []).append(PendingStep(request_id, input_data, inference_state, future))
+    if shard not in self.flush_tasks:
+      self.flush_tasks[shard] = asyncio.create_task(self._flush(inference_engine, shard))
+    return await future
+
+  @staticmethod
+  def batches(inference_engine: InferenceEngine) -> bool:
+    return getattr(type(inference_engine), "infer_tensor_batch", None) is not InferenceEngine.infer_tensor_batch
+
+  def cancel(self, request_id: str) -> int:
+    cancelled = 0
+    for steps in self.pending.values():
+      for step in [step for step in steps if step.request_id == request_id]:
+        steps.remove(step)
+        if not step.future.done(): step.future.set_result(None)
+        cancelled += 1
+    return cancelled
+
+  def num_pending(self) -> int:
+    return sum(len(steps) for steps in self.pending.values())
+
+  async def _flush(self, inference_engine: InferenceEngine, shard: Shard) -> None:
+    try:
+      while self.pending.get(shard):
+        # Yield once so that steps arriving in the same event loop iteration join this batch
+        await asyncio.sleep(self.max_wait)
+        batch = self.pending[shard][:self.max_batch_size]
+        del self.pending[shard][:len(batch)]
+        if DEBUG >= 3: print(f"[DecodeScheduler] running batch of {len(batch)} for {shard}: {[step.request_id for step in batch]}")
+        await self._run_batch(inference_engine, shard, batch)
+    finally:
+      self.flush_tasks.pop(shard, None)
+      if not self.pending.get(shard): self.pending.pop(shard, None)
+
+  async def _run_batch(self, inference_engine: InferenceEngine, shard: Shard, batch: List[PendingStep]) -> None:
+    try:
+      results = await inference_engine.infer_tensor_batch([step.request_id for step in batch], shard, [step.input_data for step in batch], [step.inference_state for step in batch])
+      for step, result in zip(batch, results):
+        if not step.future.done(): step.future.set_result(result)
+    except Exception as e:
+      if len(batch) == 1:
+        if not batch[0].future.done(): batch[0].future.set_exception(e)
+        return
+      # Retry one by one so that a single bad request does not fail the whole batch
+      if DEBUG >= 2:
+        print(f"[DecodeScheduler] batch of {len(batch)} failed, retrying individually: {e}")
+        traceback.print_exc()
+      for step in batch:
+        await self._run_batch(inference_engine, shard, [step])
@@ -3,19 +3,32 @@ import json
 import asyncio
 import uuid
 import time
+import random
 import traceback
 from typing import List, Dict, Optional, Tuple, Union, Set
 from exo.networking import Discovery, PeerHandle, Server
+from exo.networking.peer_registry import PeerRegistry
+from exo.networking.link_prober import LinkProber
 from exo.inference.inference_engine import InferenceEngine, Shard
-from exo.topology.topology import Topology
+from exo.topology.topology import LinkStats, Topology
+from exo.topology.topology_sync import NodeRecord, TopologyState
 from exo.topology.device_capabilities import device_capabilities, UNKNOWN_DEVICE_CAPABILITIES
 from exo.topology.partitioning_strategy import Partition, PartitioningStrategy, map_partitions_to_shards
+from exo.topology.adaptive_partitioning_strategy import AdaptivePartitioningStrategy
+from exo.topology.calibration import calibrate
+from exo.topology.replicated_partitioning_strategy import ReplicatedPartitioningStrategy
+from exo.topology.ring_ordering import quantized_link_stats
 from exo import DEBUG
 from exo.helpers import AsyncCallbackSystem
 from exo.viz.topology_viz import TopologyViz
 from exo.download.download_progress import RepoProgressEvent
 from exo.inference.inference_engine import get_inference_engine, InferenceEngine
+from exo.inference.kv_cache_manager import KVCacheBudgetExceeded, KVCacheEvicted, KVCacheManager, kv_cache_budget_bytes
 from exo.download.shard_download import ShardDownloader
+from exo.orchestration.decode_scheduler import DecodeScheduler
+from exo.orchestration.partition_plan import PartitionPlan
+from exo.orchestration.replica_router import ReplicaRouter
+from exo.orchestration.speculative import SpeculativeProposer, accept_speculative_tokens
 
 class Node:
   def __init__(
@@ -29,6 +42,18 @@ class Node:
     max_generate_tokens: int = 1024,
     default_sample_temperature: float = 0.0,
     topology_viz: Optional[TopologyViz] = None,
+    max_decode_batch_size: int = 16,
+    observe_results: bool = False,
+    kv_cache_budget: Optional[int] = None,
+    prefill_chunk_size: Optional[int] = None,
+    speculator: Optional[SpeculativeProposer] = None,
+    gossip_fanout: int = 3,
+    link_probe_interval: float = 15.0,
+    rebalance_interval: float = 10.0,
+    min_profile_samples: int = 16,
+    calibrate: bool = False,
+    recalibrate: bool = False,
+    replica_load_interval: float = 1.0,
   ):
     self.id = _id
     self.inference_engine = inference_engine
@@ -36,8 +61,30 @@ class Node:
     self.discovery = discovery
     self.shard_downloader = shard_downloader
     self.partitioning_strategy = partitioning_strategy
-    self.peers: List[PeerHandle] = {}
+    self.peer_registry = PeerRegistry()
+    self._topology_lock = asyncio.Lock()
+    self._peers_changed = False
+    self._peers_changed_task: Optional[asyncio.Task] = None
     self.topology: Topology = Topology()
+    self.topology_epoch = 0
+    self.topology_state = TopologyState(_id)
+    self.gossip_fanout = gossip_fanout
+    # peer id -> the topology versions the peer reported in the last exchange
+    self.peer_topology_versions: Dict[str, Dict[str, int]] = {}
+    self.link_prober = LinkProber()
+    self.link_probe_interval = link_probe_interval
+    self.rebalance_interval = rebalance_interval
+    self.min_profile_samples = min_profile_samples
+    self.calibrate = calibrate
+    self.recalibrate = recalibrate
+    self.replica_router = ReplicaRouter()
+    self.replica_load_interval = replica_load_interval
+    # node id -> the LayerProfile the node last broadcast
+    self.layer_profiles: Dict[str, dict] = {}
+    # node id -> (whether the node was running requests, time.monotonic() of its report), see is_busy
+    self.node_activity: Dict[str, Tuple[bool, float]] = {}
+    self.last_inference_at = 0.0
+    self._partition_plan: Optional[PartitionPlan] = None
     self.device_capabilities = UNKNOWN_DEVICE_CAPABILITIES
     self.buffered_token_output: Dict[str, Tuple[List[int], bool]] = {}
     self.buffered_logits: Dict[str, List[np.ndarray]] = {}
@@ -51,18 +98,41 @@ class Node:
     self._on_token = AsyncCallbackSystem[str, Tuple[str, List[int], bool]]()
     self._on_opaque_status = AsyncCallbackSystem[str, Tuple[str, str]]()
     self._on_opaque_status.register("node_status").on_next(self.on_node_status)
+    self._on_topology_change = AsyncCallbackSystem[str, Tuple[Topology]]()
     self.node_download_progress: Dict[str, RepoProgressEvent] = {}
     self.topology_inference_engines_pool: List[List[str]] = []
     self.outstanding_requests = {}
+    self.decode_scheduler = DecodeScheduler(max_batch_size=max_decode_batch_size)
+    self.observe_results = observe_results
+    self.request_origins: Dict[str, str] = {}
+    self.result_subscribers: Set[str] = set()
+    self.cancelled_requests: Dict[str, float] = {}
+    self.kv_cache_budget = kv_cache_budget
+    self.prefill_chunk_size = prefill_chunk_size
+    self.speculator = speculator
+    # model id -> whether the inference engine can trim its KV caches, which speculation needs
+    self.trimmable_models: Dict[str, bool] = {}
+    # tokens in the KV cache of each request this node proposes speculative tokens for (first layer only)
+    self.speculative_histories: Dict[str, List[int]] = {}
 
   async def start(self, wait_for_peers: int = 0) -> None:
     self.device_capabilities = await device_capabilities()
+    if self.calibrate or self.recalibrate:
+      self.device_capabilities = await calibrate(self.device_capabilities, self.inference_engine.__class__.__name__, self.recalibrate)
+    self.configure_inference_engine()
     await self.server.start()
     await self.discovery.start()
     await self.update_peers(wait_for_peers)
-    await self.collect_topology(set())
+    await self.gossip_topology(everyone=True)
     if DEBUG >= 2: print(f"Collected topology: {self.topology}")
+    if self.observe_results: await self.broadcast_result_subscription()
+    if isinstance(self.discovery, Discovery): self.discovery.on_peers_changed.register(self.id).on_next(self.on_peers_changed)
     asyncio.create_task(self.periodic_topology_collection(2.0))
+    if self.link_probe_interval > 0: asyncio.create_task(self.periodic_link_probing(self.link_probe_interval))
+    if self.rebalance_interval > 0 and isinstance(self.partitioning_strategy, AdaptivePartitioningStrategy):
+      asyncio.create_task(self.periodic_rebalancing(self.rebalance_interval))
+    if self.replica_load_interval > 0 and isinstance(self.partitioning_strategy, ReplicatedPartitioningStrategy):
+      asyncio.create_task(self.periodic_replica_load_reporting(self.replica_load_interval))
 
   async def stop(self) -> None:
     await self.discovery.stop()
@@ -76,6 +146,18 @@ class Node:
         node_id = status_data.get("node_id")
         engines = status_data.get("engines", [])
         self.topology_inference_engines_pool.append(engines)
+      elif status_type == "result_subscription":
+        node_id = status_data.get("node_id")
+        if node_id != self.id:
+          if status_data.get("subscribe", True): self.result_subscribers.add(node_id)
+          else: self.result_subscribers.discard(node_id)
+      elif status_type == "layer_profile":
+        self.node_activity[status_data.get("node_id")] = (status_data.get("busy", True), time.monotonic())
+        if status_data.get("profile"): self.layer_profiles[status_data.get("node_id")] = status_data["profile"]
+      elif status_type == "replica_load":
+        self.replica_router.report(status_data.get("replica", 0), status_data.get("load", 0))
+      elif status_type == "rebalance":
+        self.apply_rebalance(status_data.get("partitions", []), status_data.get("version", 0))
       elif status_type == "node_status":
         if status_data.get("status", "").startswith("start_"):
           self.current_topology.active_node_id = status_data.get("node_id")
@@ -90,11 +172,28 @@ class Node:
         self.node_download_progress[status_data.get('node_id')] = download_progress
 
       if self.topology_viz:
-        self.topology_viz.update_visualization(self.topology, self.partitioning_strategy.partition(self.topology), self.id, self.node_download_progress)
+        self.topology_viz.update_visualization(self.topology, self.get_partition_plan().partitions, self.id, self.node_download_progress)
     except Exception as e:
       if DEBUG >= 1: print(f"Error on_node_status: {e}")
       if DEBUG >= 1: traceback.print_exc()
 
+  def configure_inference_engine(self):
+    self.inference_engine.prefill_chunk_size = self.prefill_chunk_size
+    self.trimmable_models.clear()
+    self.configure_kv_cache()
+
+  def configure_kv_cache(self):
+    # explicit budget in bytes if configured, otherwise a share of this device's memory
+    budget_bytes = self.kv_cache_budget if self.kv_cache_budget is not None else kv_cache_budget_bytes(self.device_capabilities.memory)
+    if self.speculator is not None:
+      # a draft model's caches come out of the same memory
+      draft_budget_bytes = int(budget_bytes*self.speculator.kv_cache_fraction)
+      self.speculator.configure_kv_cache(draft_budget_bytes)
+      budget_bytes -= draft_budget_bytes
+    if isinstance(self.inference_engine.kv_caches, KVCacheManager):
+      self.inference_engine.kv_caches.configure(budget_bytes=budget_bytes)
+      if DEBUG >= 1: print(f"KV cache budget: {budget_bytes} bytes")
+
   def get_supported_inference_engines(self):
     supported_engine_names = []
     if self.inference_engine.__class__.__name__ == 'MLXDynamicShardInferenceEngine':
@@ -110,6 +209,10 @@ class Node:
 
   def get_topology_inference_engines(self) -> List[List[str]]:
     return self.topology_inference_engines_pool
+
+  async def broadcast_result_subscription(self, subscribe: bool = True):
+    status_message = json.dumps({"type": "result_subscription", "node_id": self.id, "subscribe": subscribe})
+    await self.broadcast_opaque_status("", status_message)
   
   token_count = 0
   first_token_time = 0
@@ -119,21 +222,43 @@ class Node:
     result: np.ndarray,
     request_id: Optional[str] = None,
     inference_state: Optional[dict] = None,
+    speculative_tokens: Optional[List[int]] = None,
+    kv_trim: int = 0,
   ):
+    self.last_inference_at = time.time()
+    if request_id in self.cancelled_requests:
+      # cancelled while this step was running, drop the state it may have (re)created
+      await self.inference_engine.clear_request(request_id)
+      return None
     if shard.model_id != 'stable-diffusion-2-1-base':
       if request_id not in self.buffered_token_output:
         self.buffered_token_output[request_id] = ([], False)
       is_finished = len(self.buffered_token_output[request_id][0]) >= self.max_generate_tokens
       if shard.is_last_layer() and not is_finished:
-        token = await self.inference_engine.sample(result, temp=self.default_sample_temperature)
+        if speculative_tokens:
+          # the logits of the input token and every speculative token are sampled, then checked against the proposal
+          logits = result[:, -(len(speculative_tokens) + 1):]
+          sampled = [(await self.inference_engine.sample(logits[:, i:i + 1], temp=self.default_sample_temperature)).item() for i in range(logits.shape[1])]
+          tokens = accept_speculative_tokens(sampled, speculative_tokens)
+          if DEBUG >= 2: print(f"[{request_id}] accepted {len(tokens) - 1}/{len(speculative_tokens)} speculative tokens")
+        else:
+          tokens = [(await self.inference_engine.sample(result, temp=self.default_sample_temperature)).item()]
         await self.inference_engine.ensure_shard(shard)
-        self.buffered_token_output[request_id][0].append(token.item())
-        is_finished = token.item() == self.inference_engine.tokenizer.eos_token_id or is_finished or len(self.buffered_token_output[request_id][0]) >= self.max_generate_tokens
+        intermediate_result = []
+        for token in tokens:
+          self.buffered_token_output[request_id][0].append(token)
+          intermediate_result.append(token)
+          is_finished = token == self.inference_engine.tokenizer.eos_token_id or len(self.buffered_token_output[request_id][0]) >= self.max_generate_tokens
+          if is_finished: break
         if DEBUG >= 2: print(f"[{request_id}] result size: {result.size}, is finished: {is_finished}, buffered tokens: {len(self.buffered_token_output[request_id][0])}")
-        forward = token.reshape(1, -1)
-        intermediate_result = [self.buffered_token_output[request_id][0][-1]]
+        forward = np.array([[intermediate_result[-1]]])
+        if speculative_tokens and len(tokens) - 1 < len(speculative_tokens):
+          # rejected speculative tokens are still in every shard's KV cache, they are dropped as the next token goes around the ring
+          inference_state = {**(inference_state or {}), "kv_trim": len(speculative_tokens) - (len(tokens) - 1)}
       else:
         forward = result
+        if not shard.is_last_layer() and (speculative_tokens or kv_trim):
+          inference_state = {**(inference_state or {}), **({"speculative_tokens": speculative_tokens} if speculative_tokens else {}), **({"kv_trim": kv_trim} if kv_trim else {})}
     else:
       await self.inference_engine.ensure_shard(shard)
       is_finished = inference_state.get("is_finished", False)
@@ -141,12 +266,15 @@ class Node:
       forward = result
     if shard.is_last_layer():
       self.trigger_on_token_callbacks(request_id, intermediate_result, is_finished)
-      asyncio.create_task(self.broadcast_result(request_id, intermediate_result, is_finished))
+      self.send_result_to_listeners(request_id, intermediate_result, is_finished)
 
     if is_finished:
       if shard.model_id != 'stable-diffusion-2-1-base':
         self.buffered_token_output[request_id] = (self.buffered_token_output[request_id][0], True)
       self.outstanding_requests.pop(request_id)
+      self.request_origins.pop(request_id, None)
+      self.clear_speculative_history(request_id)
+      self.inference_engine.finish_request(request_id)
     else:
       self.outstanding_requests[request_id] = "waiting"
       asyncio.create_task(self.forward_tensor(shard, forward, request_id, self.get_partition_index(offset = 1), inference_state))
@@ -160,6 +288,7 @@ class Node:
     prompt: str,
     request_id: Optional[str] = None,
     inference_state: Optional[dict] = {},
+    origin_node_id: Optional[str] = None,
   ) -> Optional[np.ndarray]:
     shard = self.get_current_shard(base_shard)
     start_time = time.perf_counter_ns()
@@ -178,7 +307,7 @@ class Node:
       )
     )
     start_time = time.perf_counter_ns()
-    resp = await self._process_prompt(base_shard, prompt, request_id, inference_state)
+    resp = await self._process_prompt(base_shard, prompt, request_id, inference_state, origin_node_id)
     end_time = time.perf_counter_ns()
     elapsed_time_ns = end_time - start_time
     asyncio.create_task(
@@ -198,20 +327,39 @@ class Node:
     )
     if DEBUG >= 2: print(f"[{request_id}] process prompt: {base_shard=} {shard=} {prompt=} {elapsed_time_ns=}")
 
-  async def _process_prompt(self, base_shard: Shard, prompt: str, request_id: Optional[str] = None, inference_state: Optional[dict] = None) -> Optional[np.ndarray]:
+  async def _process_prompt(self, base_shard: Shard, prompt: str, request_id: Optional[str] = None, inference_state: Optional[dict] = None, origin_node_id: Optional[str] = None) -> Optional[np.ndarray]:
     if request_id is None:
       request_id = str(uuid.uuid4())
+    if request_id in self.cancelled_requests: return None
+    self.set_request_origin(request_id, origin_node_id or self.id)
     shard = self.get_current_shard(base_shard)
     if DEBUG >= 2: print(f"[{request_id}] process prompt: {base_shard=} {shard=} {prompt=}")
 
-    if not shard.is_first_layer():
+    plan = self.get_partition_plan()
+    replica = plan.replica
+    if origin_node_id is None and len(plan.replicas) > 1:
+      # a new request, prompts forwarded by other nodes already run on the replica they were sent to
+      replica = self.replica_router.choose(plan.replicas, plan.replica)
+      self.replica_router.dispatched(request_id, replica)
+      if DEBUG >= 2: print(f"[{request_id}] routed to replica {replica}: {[(r, self.replica_router.depth(r)) for r in plan.replicas]}")
+
+    if replica != plan.replica or not shard.is_first_layer():
       if DEBUG >= 2: print(f"[{request_id}] forwarding to next shard: {base_shard=} {shard=} {prompt=}")
       self.outstanding_requests[request_id] = "waiting"
-      resp = await self.forward_prompt(shard, prompt, request_id, 0, inference_state)
+      resp = await self.forward_prompt(shard, prompt, request_id, 0, inference_state, None if replica == plan.replica else replica)
       return None
     else:
       self.outstanding_requests[request_id] = "processing"
-      result, inference_state = await self.inference_engine.infer_prompt(request_id, shard, prompt, inference_state)
+      try:
+        if await self.can_speculate(shard):
+          tokens = await self.inference_engine.encode(shard, prompt)
+          self.set_speculative_history(request_id, tokens.tolist())
+          result, inference_state = await self.inference_engine.infer_tensor(request_id, shard, tokens.reshape(1, -1), inference_state)
+        else:
+          result, inference_state = await self.inference_engine.infer_prompt(request_id, shard, prompt, inference_state)
+      except (KVCacheBudgetExceeded, KVCacheEvicted) as e:
+        await self.end_failed_request(request_id, e)
+        return None
       ret = await self.process_inference_result(shard, result, request_id, inference_state)
       return result
 
@@ -358,8 +506,10 @@ class Node:
     tensor: np.ndarray,
     request_id: Optional[str] = None,
     inference_state: Optional[dict] = None,
+    origin_node_id: Optional[str] = None,
   ) -> Optional[np.ndarray]:
     shard = self.get_current_shard(base_shard)
+    if request_id is not None and origin_node_id is not None: self.set_request_origin(request_id, origin_node_id)
     start_time = time.perf_counter_ns()
     resp = await self._process_tensor(shard, tensor, request_id, inference_state)
     end_time = time.perf_counter_ns()
@@ -375,15 +525,31 @@ class Node:
   ) -> Optional[np.ndarray]:
     if request_id is None:
       request_id = str(uuid.uuid4())
+    if request_id in self.cancelled_requests: return None
     shard = self.get_current_shard(base_shard)
 
     try:
       self.outstanding_requests[request_id] = "processing"
-      result, inference_state = await self.inference_engine.infer_tensor(request_id, shard, tensor, inference_state)
-      ret = await self.process_inference_result(shard, result, request_id, inference_state) 
+      speculative_tokens, kv_trim = None, 0
+      if inference_state and ("speculative_tokens" in inference_state or "kv_trim" in inference_state):
+        inference_state = dict(inference_state)
+        speculative_tokens = inference_state.pop("speculative_tokens", None)
+        kv_trim = inference_state.pop("kv_trim", 0)
+        if kv_trim: await self.inference_engine.trim_cache(request_id, kv_trim)
+      if shard.is_first_layer() and request_id in self.speculative_histories:
+        tensor, speculative_tokens = await self.propose_speculative_tokens(request_id, shard, tensor, kv_trim)
+      if shard.model_id != 'stable-diffusion-2-1-base' and tensor.ndim >= 2 and tensor.shape[1] == 1:
+        step_result = await self.decode_scheduler.submit(self.inference_engine, request_id, shard, tensor, inference_state)
+        if step_result is None: return None
+        result, inference_state = step_result
+      else:
+        result, inference_state = await self.inference_engine.infer_tensor(request_id, shard, tensor, inference_state)
+      ret = await self.process_inference_result(shard, result, request_id, inference_state, speculative_tokens, kv_trim)
       return ret
+    except (KVCacheBudgetExceeded, KVCacheEvicted) as e:
+      await self.end_failed_request(request_id, e)
     except Exception as e:
-      self.outstanding_requests.pop(request_id)
+      self.outstanding_requests.pop(request_id, None)
       print(f"Error processing tensor for shard {shard}: {e}")
       traceback.print_exc()
   
@@ -398,10 +564,11 @@ class Node:
     target_index: int,
   ) -> None:
     if DEBUG >= 1: print(f"target partition index: {target_index}")
-    target_id = self.partitioning_strategy.partition(self.topology)[target_index].node_id
-    target_shard = self.get_current_shard(base_shard, target_index)
+    plan = self.get_partition_plan()
+    target_id = plan.node_id_at(target_index)
+    target_shard = plan.shard_at(base_shard, target_index)
     if DEBUG >= 2: print(f"computed target from: {base_shard} {target_index}, {self.topology}. target shard: {target_shard}")
-    target_peer = next((p for p in self.peers if p.id() == target_id), None)
+    target_peer = plan.peer(target_id)
     if not target_peer:
       raise ValueError(f"peer for {target_index} not found")
     if DEBUG >= 1: print(f"sending example to {target_peer.id()}: {step} => {target} ({length})")
@@ -415,19 +582,21 @@ class Node:
     request_id: str,
     target_index: int,
     inference_state: Optional[dict] = None,
+    replica: Optional[int] = None,
   ) -> None:
-    if DEBUG >= 1: print(f"target partition index: {target_index}")
-    target_id = self.partitioning_strategy.partition(self.topology)[target_index].node_id
-    next_shard = self.get_current_shard(base_shard, target_index)
+    if DEBUG >= 1: print(f"target partition index: {target_index} {replica=}")
+    plan = self.get_partition_plan()
+    target_id = plan.node_id_at(target_index, replica)
+    next_shard = plan.shard_at(base_shard, target_index, replica)
     if DEBUG >= 2: print(f"Computed target from: {base_shard} {target_index}, {self.topology}. next shard: {next_shard}")
     if target_id == self.id:
       await self.process_prompt(next_shard, prompt, request_id, inference_state)
     else:
-      target_peer = next((p for p in self.peers if p.id() == target_id), None)
+      target_peer = plan.peer(target_id)
       if not target_peer:
         raise ValueError(f"Peer for {target_index} not found")
       if DEBUG >= 1: print(f"Sending prompt to {target_peer.id()}: {prompt}")
-      await target_peer.send_prompt(next_shard, prompt, request_id=request_id, inference_state=inference_state)
+      await target_peer.send_prompt(next_shard, prompt, request_id=request_id, inference_state=inference_state, origin_node_id=self.request_origins.get(request_id))
   
   async def forward_tensor(
     self,
@@ -438,85 +607,38 @@ class Node:
     inference_state: Optional[dict] = None,
   ) -> None:
     if DEBUG >= 1: print(f"target partition index: {target_index}")
-    target_id = self.partitioning_strategy.partition(self.topology)[target_index].node_id
-    next_shard = self.get_current_shard(base_shard, target_index)
+    plan = self.get_partition_plan()
+    target_id = plan.node_id_at(target_index)
+    next_shard = plan.shard_at(base_shard, target_index)
     if DEBUG >= 2: print(f"Computed target from: {base_shard} {target_index}, {self.topology}. target shard: {next_shard}")
     if target_id == self.id:
       await self.process_tensor(next_shard, tensor, request_id, inference_state)
     else:
-      target_peer = next((p for p in self.peers if p.id() == target_id), None)
+      target_peer = plan.peer(target_id)
       if not target_peer:
         raise ValueError(f"Peer for {target_index} not found")
       if DEBUG >= 1: print(f"Sending tensor to {target_peer.id()}: {tensor}")
-      await target_peer.send_tensor(next_shard, tensor, request_id=request_id, inference_state=inference_state)
+      await target_peer.send_tensor(next_shard, tensor, request_id=request_id, inference_state=inference_state, origin_node_id=self.request_origins.get(request_id))
 
   def get_partition_index(self, offset: int = 0):
     if not self.partitioning_strategy:
       if DEBUG >= 1: print("No partitioning strategy found. Skipping forward.")
       return None
-    partitions = self.partitioning_strategy.partition(self.topology)
-    current_partition_index = next((i for i, p in enumerate(partitions) if p.node_id == self.id), None)
-    if current_partition_index is None:
-      raise ValueError(f"No current partition found for node: {self.id}")
-    return (current_partition_index + offset) % len(partitions)
+    return self.get_partition_plan().partition_index(offset)
 
   def get_current_shard(self, base_shard: Shard, index: Optional[int] = None) -> Shard:
     if index is None:
       index = self.get_partition_index()
-    partitions = self.partitioning_strategy.partition(self.topology)
-    shards = map_partitions_to_shards(partitions, base_shard.n_layers, base_shard.model_id)
-    return shards[index]
-
-  async def update_peers(self, wait_for_peers: int = 0) -> bool:
-    next_peers = await self.discovery.discover_peers(wait_for_peers)
-    current_peer_ids = {peer.id() for peer in self.peers}
-    next_peer_ids = {peer.id() for peer in next_peers}
-    peers_added = [peer for peer in next_peers if peer.id() not in current_peer_ids]
-    peers_removed = [peer for peer in self.peers if peer.id() not in next_peer_ids]
-    peers_updated = [peer for peer in next_peers if peer.id() in current_peer_ids and any(p.addr() != peer.addr() for p in self.peers if p.id() == peer.id())]
-    peers_unchanged = [peer for peer in next_peers if peer.id() in current_peer_ids and all(p.addr() == peer.addr() for p in self.peers if p.id() == peer.id())]
-    peers_to_disconnect = [peer for peer in peers_removed if await peer.is_connected()]
-    peers_to_connect = [peer for peer in peers_added + peers_updated + peers_unchanged if not await peer.is_connected()]
-
-    def _pretty(peers: List[PeerHandle]) -> List[str]:
-      return [f"{peer.id()}@{peer.addr()}" for peer in peers]
-
-    if DEBUG >= 2:
-      print(f"update_peers: added={peers_added} removed={peers_removed} updated={peers_updated} unchanged={peers_unchanged} to_disconnect={peers_to_disconnect} to_connect={peers_to_connect}")
-
-    async def disconnect_with_timeout(peer, timeout=5):
-      try:
-        await asyncio.wait_for(peer.disconnect(), timeout)
-        return True
-      except Exception as e:
-        print(f"Error disconnecting peer {peer.id()}@{peer.addr()}: {e}")
-        traceback.print_exc()
-        return False
-
-    async def connect_with_timeout(peer, timeout=5):
-      try:
-        await asyncio.wait_for(peer.connect(), timeout)
-        return True
-      except Exception as e:
-        print(f"Error connecting peer {peer.id()}@{peer.addr()}: {e}")
-        traceback.print_exc()
-        return False
+    return self.get_partition_plan().shard_at(base_shard, index)
 
-    disconnect_results = await asyncio.gather(*(disconnect_with_timeout(peer) for peer in peers_to_disconnect), return_exceptions=True)
-    connect_results = await asyncio.gather(*(connect_with_timeout(peer) for peer in peers_to_connect), return_exceptions=True)
+  def get_partition_plan(self) -> PartitionPlan:
+    plan = self._partition_plan
+    if plan is None or not plan.is_valid_for(self.topology_epoch, self.topology, self.partitioning_strategy, self.peers):
+      plan = self._partition_plan = PartitionPlan(self.id, self.topology_epoch, self.topology, self.partitioning_strategy, self.peers)
+    return plan
 
-    successful_disconnects = [peer for peer, result in zip(peers_to_disconnect, disconnect_results) if result is True]
-    failed_disconnects = [peer for peer, result in zip(peers_to_disconnect, disconnect_results) if result is False]
-    successful_connects = [peer for peer, result in zip(peers_to_connect, connect_results) if result is True]
-    failed_connects = [peer for peer, result in zip(peers_to_connect, connect_results) if result is False]
-    if DEBUG >= 1:
-      if successful_disconnects: print(f"Successfully disconnected peers: {_pretty(successful_disconnects)}")
-      if failed_disconnects: print(f"Failed to disconnect peers: {_pretty(failed_disconnects)}")
-      if successful_connects: print(f"Successfully connected peers: {_pretty(successful_connects)}")
-      if failed_connects: print(f"Failed to connect peers: {_pretty(failed_connects)}")
-
-    self.peers = next_peers
-    return len(peers_added) > 0 or len(peers_removed) > 0 or len(peers_updated) > 0
+  async def update_peers(self, wait_for_peers: int = 0) -> bool:
+    return await self.peer_registry.update(await self.discovery.discover_peers(wait_for_peers))
 
   async def select_best_inference_engine(self):
     if self.inference_engine.__class__.__name__ == 'DummyInferenceEngine': return
@@ -524,59 +646,197 @@ class Node:
     await self.broadcast_supported_engines(supported_engines)
     if len(self.get_topology_inference_engines()):
       self.inference_engine = get_inference_engine(supported_engines[0], self.shard_downloader)
+      self.configure_inference_engine()
 
   async def periodic_topology_collection(self, interval: int):
     while True:
       await asyncio.sleep(interval)
+      await self.refresh_topology()
+
+  async def periodic_link_probing(self, interval: float):
+    while True:
       try:
-        did_peers_change = await self.update_peers()
-        if DEBUG >= 2: print(f"{did_peers_change=}")
-        await self.collect_topology(set())
-        if did_peers_change:
-          await self.select_best_inference_engine()
+        # the stats are part of this node's record, they reach the other nodes with the next gossip rounds
+        if await self.link_prober.probe_all(self.peers) and DEBUG >= 2: print(f"Link stats changed: {self.link_prober.published}")
       except Exception as e:
-        print(f"Error collecting topology: {e}")
+        print(f"Error probing links: {e}")
         traceback.print_exc()
+      await asyncio.sleep(interval)
 
-  async def collect_topology(self, visited: set[str], max_depth: int = 4) -> Topology:
-    next_topology = Topology()
-    next_topology.update_node(self.id, self.device_capabilities)
-
-    if DEBUG >= 2: print(f"Collecting topology {max_depth=} {visited=}")
-
-    prev_visited = visited.copy()
-    visited.add(self.id)
-    visited.update(p.id() for p in self.peers)
-
-    for peer in self.peers:
-      next_topology.update_node(peer.id(), peer.device_capabilities())
-      next_topology.add_edge(self.id, peer.id(), peer.description())
+  def agreed_link_costs(self) -> Dict[Tuple[str, str], LinkStats]:
+    """On the node with the smallest id, the quantized (see quantized_link_stats) measured link stats of its topology, which go into
+    its record as the agreed ones. Partitioning only uses the agreed stats, so all nodes order the ring and split the layers alike no
+    matter how far the measured stats have gossiped. The record is versioned and gossiped like any other, so nodes that join or
+    restart later get the agreed stats too, and a new node with a smaller id takes over once its record reached everyone."""
+    if min(self.topology.nodes, default=self.id) != self.id: return {}
+    return {(conn.from_id, conn.to_id): quantized_link_stats(conn.stats) for conns in self.topology.peer_graph.values() for conn in conns if conn.stats is not None}
 
-      if peer.id() in prev_visited:
-        continue
+  async def periodic_replica_load_reporting(self, interval: float):
+    last_report = None
+    while True:
+      await asyncio.sleep(interval)
+      try:
+        last_report = await self.report_replica_load(last_report)
+      except Exception as e:
+        print(f"Error reporting replica load: {e}")
+        traceback.print_exc()
 
-      if max_depth <= 0:
-        if DEBUG >= 2: print("Max depth reached. Skipping...")
-        continue
+  async def report_replica_load(self, last_report: Optional[Tuple[int, int, float]] = None) -> Optional[Tuple[int, int, float]]:
+    """On the last node of a replica, broadcasts how many requests the replica is running when that changed or the last report is
+    about to go stale (see ReplicaRouter). Returns what was last reported."""
+    plan = self.get_partition_plan()
+    if len(plan.replicas) < 2 or plan.index is None or plan.index != len(plan.partitions) - 1: return last_report
+    # only the last node sees every request of its replica finish, the others keep forwarded ones in outstanding_requests
+    load = len(self.outstanding_requests)
+    if last_report is not None and last_report[:2] == (plan.replica, load) and time.monotonic() - last_report[2] < self.replica_router.report_ttl/2:
+      return last_report
+    await self.broadcast_opaque_status("", json.dumps({"type": "replica_load", "node_id": self.id, "replica": plan.replica, "load": load}))
+    return plan.replica, load, time.monotonic()
+
+  async def periodic_rebalancing(self, interval: float):
+    while True:
+      await asyncio.sleep(interval)
+      try:
+        await self.rebalance()
+      except Exception as e:
+        print(f"Error rebalancing partitions: {e}")
+        traceback.print_exc()
 
+  def is_busy(self) -> bool:
+    """Whether this node is running a request: processing a step of one, holding decode steps or having finished one in the last
+    rebalance_interval, as tokens spend some time travelling the ring between steps. Requests it only forwarded don't count."""
+    if "processing" in self.outstanding_requests.values() or self.decode_scheduler.num_pending(): return True
+    return time.time() - self.last_inference_at < self.rebalance_interval
+
+  async def rebalance(self) -> None:
+    """Shares whether this node is busy and its layer profile, and on the leader (the node of the first partition) moves the layer
+    boundaries when the measured stages are imbalanced. The leader only does so while every node of the ring reported being idle in
+    the last two intervals, a request's KV caches stay with the layers it started on."""
+    profile = self.inference_engine.layer_profile
+    status = {"type": "layer_profile", "node_id": self.id, "busy": self.is_busy()}
+    if profile is not None and profile.samples: status["profile"] = profile.to_dict()
+    await self.broadcast_opaque_status("", json.dumps(status))
+    strategy = self.partitioning_strategy
+    if not isinstance(strategy, AdaptivePartitioningStrategy): return
+    partitions = self.get_partition_plan().partitions
+    if not partitions or partitions[0].node_id != self.id: return
+    reports = [self.node_activity.get(p.node_id) for p in partitions]
+    if any(report is None or report[0] or time.monotonic() - report[1] > 2*self.rebalance_interval for report in reports): return
+    seconds_per_layer = {
+      node_id: profile["seconds_per_layer"] for node_id, profile in self.layer_profiles.items() if profile.get("samples", 0) >= self.min_profile_samples
+    }
+    proposal = strategy.propose(self.topology, seconds_per_layer)
+    if proposal is None: return
+    if DEBUG >= 1: print(f"Rebalancing partitions {partitions} -> {proposal} for seconds per layer {seconds_per_layer}")
+    await self.broadcast_opaque_status("", json.dumps({"type": "rebalance", "version": strategy.version + 1, "partitions": [[p.node_id, p.start, p.end] for p in proposal]}))
+
+  def apply_rebalance(self, partitions: List[list], version: int) -> None:
+    if not isinstance(self.partitioning_strategy, AdaptivePartitioningStrategy): return
+    if self.partitioning_strategy.apply([Partition(node_id, start, end) for node_id, start, end in partitions], version):
+      # a new epoch invalidates the cached partition plan
+      self.topology_epoch += 1
+      if DEBUG >= 2: print(f"Applied rebalanced partitions version {version}: {partitions}")
+
+  def on_peers_changed(self) -> None:
+    # discovery saw a peer join, leave or move, the topology is refreshed now rather than at the next periodic collection
+    self._peers_changed = True
+    if self._peers_changed_task is None or self._peers_changed_task.done():
+      self._peers_changed_task = asyncio.create_task(self.refresh_topology_while_peers_change())
+
+  async def refresh_topology_while_peers_change(self) -> None:
+    while self._peers_changed:
+      self._peers_changed = False
+      await self.refresh_topology()
+
+  async def refresh_topology(self) -> None:
+    async with self._topology_lock:
       try:
-        other_topology = await asyncio.wait_for(peer.collect_topology(visited, max_depth=max_depth - 1), timeout=5.0)
-        if DEBUG >= 2: print(f"Collected topology from: {peer.id()}: {other_topology}")
-        next_topology.merge(peer.id(), other_topology)
+        did_peers_change = await self.update_peers()
+        if DEBUG >= 2: print(f"{did_peers_change=}")
+        await self.gossip_topology()
+        if did_peers_change:
+          await self.select_best_inference_engine()
+          # new peers need to learn about the subscription too
+          if self.observe_results: await self.broadcast_result_subscription()
       except Exception as e:
-        print(f"Error collecting topology from {peer.id()}: {e}")
+        print(f"Error collecting topology: {e}")
         traceback.print_exc()
 
-    next_topology.active_node_id = self.topology.active_node_id
-    self.topology = next_topology
-    if self.topology_viz:
-      self.topology_viz.update_visualization(self.topology, self.partitioning_strategy.partition(self.topology), self.id)
+  async def gossip_topology(self, everyone: bool = False) -> Topology:
+    """Exchanges topology deltas with peers in parallel: every peer when this node's own record changed (or when asked to), otherwise
+    gossip_fanout random peers, through which changes elsewhere reach every node in a few rounds."""
+    edges = {peer.id(): peer.description() for peer in self.peers}
+    agreed_link_stats = self.agreed_link_costs()
+    record = self.topology_state.records.get(self.id)
+    # new link stats alone spread through the regular rounds, a changed node, set of peers or agreed stats is pushed to everyone
+    if record is None or record.capabilities != self.device_capabilities or record.edges != edges or record.agreed_link_stats != agreed_link_stats: everyone = True
+    self.topology_state.update_local(self.device_capabilities, edges, self.link_prober.published, agreed_link_stats)
+    self.peer_topology_versions = {peer_id: versions for peer_id, versions in self.peer_topology_versions.items() if peer_id in self.peer_registry}
+    peers = self.peers if everyone or len(self.peers) <= self.gossip_fanout else random.sample(self.peers, self.gossip_fanout)
+    await asyncio.gather(*(self.sync_topology_with_peer(peer) for peer in peers))
+    return self.apply_topology_state()
+
+  async def sync_topology_with_peer(self, peer: PeerHandle) -> None:
+    try:
+      # the records this peer is missing, as far as its versions from the last exchange tell
+      records = self.topology_state.delta(self.peer_topology_versions.get(peer.id(), {}))
+      versions, records = await peer.sync_topology(self.topology_state.digest(), records)
+      self.peer_topology_versions[peer.id()] = versions
+      self.topology_state.merge(records)
+    except NotImplementedError:
+      await self.collect_legacy_topology(peer)
+    except Exception as e:
+      print(f"Error syncing topology with {peer.id()}: {e}")
+      if DEBUG >= 2: traceback.print_exc()
+
+  async def collect_legacy_topology(self, peer: PeerHandle) -> None:
+    # a peer running an older version only answers CollectTopology, its own node and edges become its record
+    try:
+      topology = await asyncio.wait_for(peer.collect_topology(set(), max_depth=0), timeout=5.0)
+    except Exception as e:
+      print(f"Error collecting topology from {peer.id()}: {e}")
+      return
+    capabilities = topology.nodes.get(peer.id(), peer.device_capabilities())
+    edges = {conn.to_id: conn.description for conn in topology.peer_graph.get(peer.id(), ())}
+    current = self.topology_state.records.get(peer.id())
+    if current is None or current.capabilities != capabilities or current.edges != edges:
+      self.topology_state.merge({peer.id(): NodeRecord(time.time_ns(), capabilities, edges)})
+
+  async def sync_topology(self, versions: Dict[str, int], records: Dict[str, NodeRecord]) -> Tuple[Dict[str, int], Dict[str, NodeRecord]]:
+    if self.topology_state.merge(records): self.apply_topology_state()
+    return self.topology_state.digest(), self.topology_state.delta(versions)
+
+  def apply_topology_state(self) -> Topology:
+    next_topology = self.topology_state.topology()
+    # Keep the current topology object when nothing changed so the cached partition plan stays valid
+    if not next_topology.has_same_graph(self.topology) or next_topology.agreed_link_stats != self.topology.agreed_link_stats:
+      next_topology.active_node_id = self.topology.active_node_id
+      self.topology = next_topology
+      self.topology_epoch += 1
+      if DEBUG >= 2: print(f"Topology changed, epoch={self.topology_epoch}")
+      if self.topology_viz:
+        self.topology_viz.update_visualization(self.topology, self.get_partition_plan().partitions, self.id)
+      self._on_topology_change.trigger_all(self.topology)
+    else:
+      self.topology.update_link_stats(next_topology)
     return self.topology
 
+  @property
+  def peers(self) -> List[PeerHandle]:
+    return self.peer_registry.peer_list
+
+  @peers.setter
+  def peers(self, peers: List[PeerHandle]) -> None:
+    self.peer_registry.replace(peers)
+
   @property
   def on_token(self) -> AsyncCallbackSystem[str, Tuple[str, List[int], bool]]:
     return self._on_token
 
+  @property
+  def on_topology_change(self) -> AsyncCallbackSystem[str, Tuple[Topology]]:
+    return self._on_topology_change
+
   @property
   def on_opaque_status(self) -> AsyncCallbackSystem[str, Tuple[str, str]]:
     return self._on_opaque_status
@@ -584,9 +844,97 @@ class Node:
   def trigger_on_token_callbacks(self, request_id: str, tokens: List[int], is_finished: bool) -> None:
     if DEBUG >= 2: print(f"Triggering all on_token callbacks with {request_id=} {tokens=} {is_finished=}")
     self.on_token.trigger_all(request_id, tokens, is_finished)
+    if is_finished: self.replica_router.finished(request_id)
   
+  async def end_failed_request(self, request_id: str, error: Exception) -> None:
+    """Ends a request this node can't run, e.g. because its KV cache doesn't fit or was evicted: the origin gets it as finished with
+    the tokens so far, rather than waiting for tokens that never come, and the request's state here is dropped."""
+    print(f"[{request_id}] request failed: {error}")
+    self.trigger_on_token_callbacks(request_id, [], True)
+    await self.send_result_to_listeners(request_id, [], True)
+    await self.cancel_request(request_id, broadcast=False)
+
+  async def cancel_request(self, request_id: str, broadcast: bool = True, max_cancelled: int = 4096) -> None:
+    if DEBUG >= 2: print(f"[{request_id}] cancelling request {broadcast=}")
+    if request_id not in self.cancelled_requests and len(self.cancelled_requests) >= max_cancelled:
+      self.cancelled_requests.pop(next(iter(self.cancelled_requests)))
+    self.cancelled_requests[request_id] = time.time()
+    self.decode_scheduler.cancel(request_id)
+    self.replica_router.finished(request_id)
+    for buffer in (self.buffered_token_output, self.buffered_logits, self.buffered_inputs, self.buffered_partials, self.outstanding_requests, self.request_origins):
+      buffer.pop(request_id, None)
+    self.clear_speculative_history(request_id)
+    await self.inference_engine.clear_request(request_id)
+    if not broadcast: return
+
+    async def cancel_on_peer(peer):
+      try:
+        await asyncio.wait_for(peer.cancel_request(request_id), timeout=15.0)
+      except asyncio.TimeoutError:
+        print(f"Timeout cancelling request on {peer.id()}")
+      except Exception as e:
+        print(f"Error cancelling request on {peer.id()}: {e}")
+        traceback.print_exc()
+
+    await asyncio.gather(*[cancel_on_peer(peer) for peer in self.peers], return_exceptions=True)
+
+  async def can_speculate(self, shard: Shard) -> bool:
+    if self.speculator is None or shard.model_id == 'stable-diffusion-2-1-base': return False
+    if shard.model_id not in self.trimmable_models:
+      # rejected speculative tokens are trimmed from this engine's KV cache
+      await self.inference_engine.ensure_shard(shard)
+      self.trimmable_models[shard.model_id] = await self.inference_engine.can_trim_cache()
+      if DEBUG >= 1 and not self.trimmable_models[shard.model_id]: print(f"KV cache of {shard.model_id} can't be trimmed, not speculating")
+    return self.trimmable_models[shard.model_id] and await self.speculator.is_compatible(shard, self.inference_engine.tokenizer)
+
+  def set_speculative_history(self, request_id: str, tokens: List[int], max_requests: int = 4096) -> None:
+    if request_id not in self.speculative_histories and len(self.speculative_histories) >= max_requests:
+      # the first-layer node doesn't see requests on other nodes finish, drop the oldest history instead
+      self.clear_speculative_history(next(iter(self.speculative_histories)))
+    self.speculative_histories[request_id] = tokens
+
+  def clear_speculative_history(self, request_id: str) -> None:
+    if self.speculative_histories.pop(request_id, None) is not None and self.speculator is not None:
+      asyncio.create_task(self.speculator.clear(request_id))
+
+  async def propose_speculative_tokens(self, request_id: str, shard: Shard, tensor: np.ndarray, kv_trim: int = 0) -> Tuple[np.ndarray, Optional[List[int]]]:
+    history = self.speculative_histories[request_id]
+    # speculative tokens the last layer rejected were just trimmed from the KV cache
+    if kv_trim: del history[-kv_trim:]
+    history.extend(int(token) for token in tensor.reshape(-1))
+    try:
+      proposal = await self.speculator.propose(request_id, shard, history)
+    except Exception as e:
+      if DEBUG >= 1: print(f"[{request_id}] error proposing speculative tokens: {e}")
+      if DEBUG >= 2: traceback.print_exc()
+      proposal = []
+    if not proposal: return tensor, None
+    history.extend(proposal)
+    return np.concatenate([tensor.reshape(1, -1), np.array([proposal], dtype=tensor.dtype)], axis=1), proposal
+
+  def set_request_origin(self, request_id: str, origin_node_id: str, max_requests: int = 4096) -> None:
+    if request_id not in self.request_origins and len(self.request_origins) >= max_requests:
+      # intermediate nodes never see a request finish, drop the oldest entry instead
+      self.request_origins.pop(next(iter(self.request_origins)))
+    self.request_origins[request_id] = origin_node_id
+
+  def send_result_to_listeners(self, request_id: str, result: List[int], is_finished: bool) -> asyncio.Task:
+    # Targets are resolved synchronously since the request's origin is dropped as soon as it finishes
+    origin_node_id = self.request_origins.get(request_id)
+    if origin_node_id is None:
+      # origin unknown (e.g. request from a node that does not send it), fall back to broadcasting
+      return asyncio.create_task(self.broadcast_result(request_id, result, is_finished))
+    target_ids = ({origin_node_id} | self.result_subscribers) - {self.id}
+    plan = self.get_partition_plan()
+    peers = [peer for peer in (plan.peer(target_id) for target_id in target_ids) if peer is not None]
+    if DEBUG >= 2: print(f"Sending result to {[peer.id() for peer in peers]}: {request_id=} {result=} {is_finished=}")
+    return asyncio.create_task(self.send_result_to_peers(peers, request_id, result, is_finished))
+
   async def broadcast_result(self, request_id: str, result: List[int], is_finished: bool) -> None:
     if DEBUG >= 2: print(f"Broadcasting result: {request_id=} {result=} {is_finished=}")
+    await self.send_result_to_peers(self.peers, request_id, result, is_finished)
+
+  async def send_result_to_peers(self, peers: List[PeerHandle], request_id: str, result: List[int], is_finished: bool) -> None:
     async def send_result_to_peer(peer):
       try:
         await asyncio.wait_for(peer.send_result(request_id, result, is_finished), timeout=15.0)
@@ -596,7 +944,7 @@ class Node:
         print(f"Error broadcasting result to {peer.id()}: {e}")
         traceback.print_exc()
 
-    await asyncio.gather(*[send_result_to_peer(peer) for peer in self.peers], return_exceptions=True)
+    await asyncio.gather(*[send_result_to_peer(peer) for peer in peers], return_exceptions=True)
 
   async def broadcast_opaque_status(self, request_id: str, status: str) -> None:
     if DEBUG >= 8: print(f"Broadcasting opaque status: {request_id=} {status=}")
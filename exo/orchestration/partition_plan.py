@@ -0,0 +1,51 @@
+from typing import Dict, List, Optional, Tuple
+from exo.inference.shard import Shard
+from exo.networking import PeerHandle
+from exo.topology.topology import Topology
+from exo.topology.partitioning_strategy import Partition, PartitioningStrategy, map_partitions_to_shards
+
+
+class PartitionPlan:
+  """Partitions of one topology epoch for a node, with the lookups needed on every token precomputed.
+
+  A plan is only valid for the topology, strategy and peer list it was built from, see is_valid_for. When the strategy replicates
+  the model, partitions are this node's replica's ring and replicas holds every ring.
+  """
+  def __init__(self, node_id: str, epoch: int, topology: Topology, partitioning_strategy: PartitioningStrategy, peers: List[PeerHandle]):
+    self.node_id = node_id
+    self.epoch = epoch
+    self.topology = topology
+    self.partitioning_strategy = partitioning_strategy
+    self.peers = peers
+    self.replicas: Dict[int, List[Partition]] = {}
+    for p in partitioning_strategy.partition(topology):
+      self.replicas.setdefault(p.replica, []).append(p)
+    self.replica: Optional[int] = next((r for r, partitions in self.replicas.items() if any(p.node_id == node_id for p in partitions)), None)
+    self.partitions: List[Partition] = self.replicas.get(self.replica if self.replica is not None else 0, [])
+    self.index: Optional[int] = next((i for i, p in enumerate(self.partitions) if p.node_id == node_id), None)
+    self.peers_by_id: Dict[str, PeerHandle] = {peer.id(): peer for peer in peers}
+    self._shards: Dict[Tuple[str, int, Optional[int]], List[Shard]] = {}
+
+  def is_valid_for(self, epoch: int, topology: Topology, partitioning_strategy: PartitioningStrategy, peers: List[PeerHandle]) -> bool:
+    return self.epoch == epoch and self.topology is topology and self.partitioning_strategy is partitioning_strategy and self.peers is peers
+
+  def partition_index(self, offset: int = 0) -> int:
+    if self.index is None:
+      raise ValueError(f"No current partition found for node: {self.node_id}")
+    return (self.index + offset) % len(self.partitions)
+
+  def node_id_at(self, index: int, replica: Optional[int] = None) -> str:
+    return (self.partitions if replica is None else self.replicas[replica])[index].node_id
+
+  def shards(self, base_shard: Shard, replica: Optional[int] = None) -> List[Shard]:
+    partitions = self.partitions if replica is None else self.replicas[replica]
+    key = (base_shard.model_id, base_shard.n_layers, replica)
+    if key not in self._shards:
+      self._shards[key] = map_partitions_to_shards(partitions, base_shard.n_layers, base_shard.model_id)
+    return self._shards[key]
+
+  def shard_at(self, base_shard: Shard, index: int, replica: Optional[int] = None) -> Shard:
+    return self.shards(base_shard, replica)[index]
+
+  def peer(self, node_id: str) -> Optional[PeerHandle]:
+    return self.peers_by_id.get(node_id)
@@ -0,0 +1,37 @@
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class ReplicaRouter:
+  """Picks the replica pipeline a new request runs on: the one with the fewest requests queued.
+
+  The last node of each replica sees every request of its replica through to the end and broadcasts how many it has (see
+  Node.report_replica_load). Reports are only seconds fresh, so requests this node dispatched and hasn't seen finish count too.
+  Among equally loaded replicas this node's own is preferred, it saves a hop.
+  """
+  def __init__(self, report_ttl: float = 10.0, max_requests: int = 4096):
+    self.report_ttl = report_ttl
+    self.max_requests = max_requests
+    # request id -> replica, for requests dispatched from this node
+    self.in_flight: Dict[str, int] = {}
+    # replica -> (queued requests, monotonic time of the report)
+    self.reported: Dict[int, Tuple[int, float]] = {}
+
+  def depth(self, replica: int) -> int:
+    local = sum(1 for r in self.in_flight.values() if r == replica)
+    depth, reported_at = self.reported.get(replica, (0, 0.0))
+    return max(local, depth) if time.monotonic() - reported_at <= self.report_ttl else local
+
+  def choose(self, replicas: Iterable[int], preferred: Optional[int] = None) -> int:
+    return min(replicas, key=lambda replica: (self.depth(replica), replica != preferred, replica))
+
+  def dispatched(self, request_id: str, replica: int) -> None:
+    if request_id not in self.in_flight and len(self.in_flight) >= self.max_requests:
+      self.in_flight.pop(next(iter(self.in_flight)))
+    self.in_flight[request_id] = replica
+
+  def finished(self, request_id: str) -> None:
+    self.in_flight.pop(request_id, None)
+
+  def report(self, replica: int, depth: int) -> None:
+    self.reported[replica] = (depth, time.monotonic())
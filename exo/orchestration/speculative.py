@@ -0,0 +1,117 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List
+import numpy as np
+from exo.inference.inference_engine import InferenceEngine
+from exo.inference.kv_cache_manager import KVCacheManager
+from exo.inference.shard import Shard
+from exo import DEBUG
+
+
+class SpeculativeProposer(ABC):
+  """Proposes tokens that are likely to follow a request's tokens so far.
+
+  The first-layer node appends the proposal to the next input and the ring runs all of it in one forward pass. The last-layer node
+  keeps the proposed tokens for as long as they match what the model samples, so every round trip yields one or more tokens.
+  """
+  # share of the node's KV cache budget the proposer's own caches take
+  kv_cache_fraction = 0.0
+
+  def __init__(self, num_speculative_tokens: int = 4):
+    self.num_speculative_tokens = num_speculative_tokens
+
+  def configure_kv_cache(self, budget_bytes: int) -> None:
+    pass
+
+  async def is_compatible(self, shard: Shard, tokenizer) -> bool:
+    return True
+
+  @abstractmethod
+  async def propose(self, request_id: str, shard: Shard, tokens: List[int]) -> List[int]:
+    pass
+
+  async def clear(self, request_id: str) -> None:
+    pass
+
+
+class DraftModelProposer(SpeculativeProposer):
+  """Runs a small model with the same tokenizer as the served model greedily for num_speculative_tokens steps."""
+  kv_cache_fraction = 0.1
+
+  def __init__(self, engine: InferenceEngine, draft_shard: Shard, num_speculative_tokens: int = 4):
+    super().__init__(num_speculative_tokens)
+    self.engine = engine
+    self.draft_shard = draft_shard
+    # number of tokens of each request already in the draft model's KV cache
+    self.processed: Dict[str, int] = {}
+    self._compatible: Dict[str, bool] = {}
+
+  def configure_kv_cache(self, budget_bytes: int) -> None:
+    if isinstance(self.engine.kv_caches, KVCacheManager): self.engine.kv_caches.configure(budget_bytes=budget_bytes)
+
+  async def is_compatible(self, shard: Shard, tokenizer) -> bool:
+    if shard.model_id == self.draft_shard.model_id: return False
+    if shard.model_id not in self._compatible:
+      await self.engine.ensure_shard(self.draft_shard)
+      # every proposal is rolled back out of the draft cache, which only works when it can be trimmed
+      if not await self.engine.can_trim_cache():
+        if DEBUG >= 1: print(f"KV cache of draft model {self.draft_shard.model_id} can't be trimmed, not speculating")
+        self._compatible[shard.model_id] = False
+        return False
+      vocab_size = getattr(tokenizer, "vocab_size", None)
+      self._compatible[shard.model_id] = vocab_size is not None and vocab_size == getattr(self.engine.tokenizer, "vocab_size", None)
+      if DEBUG >= 1 and not self._compatible[shard.model_id]: print(f"Draft model {self.draft_shard.model_id} doesn't share a tokenizer with {shard.model_id}, not speculating")
+    return self._compatible[shard.model_id]
+
+  async def propose(self, request_id: str, shard: Shard, tokens: List[int]) -> List[int]:
+    processed = self.processed.get(request_id, 0)
+    if self.engine.kv_caches is not None and request_id not in self.engine.kv_caches: processed = 0
+    if processed > len(tokens):
+      await self.engine.trim_cache(request_id, processed - len(tokens))
+      processed = len(tokens)
+
+    x = np.array([tokens[processed:]])
+    proposal = []
+    for _ in range(self.num_speculative_tokens):
+      logits, _ = await self.engine.infer_tensor(request_id, self.draft_shard, x)
+      proposal.append(int(np.argmax(logits[0, -1])))
+      x = np.array([[proposal[-1]]])
+    # the last proposed token was never fed, roll the others back so the draft cache only holds tokens the ring has kept
+    await self.engine.trim_cache(request_id, len(proposal) - 1)
+    self.processed[request_id] = len(tokens)
+    return proposal
+
+  async def clear(self, request_id: str) -> None:
+    self.processed.pop(request_id, None)
+    await self.engine.clear_request(request_id)
+
+
+class PromptLookupProposer(SpeculativeProposer):
+  """Proposes the tokens that followed the latest earlier occurrence of the sequence's last n-gram, in the prompt or the output so far.
+
+  Needs no extra weights, and works well when the output copies spans of the input (code edits, summaries, extraction).
+  """
+  def __init__(self, num_speculative_tokens: int = 4, max_ngram: int = 3, min_ngram: int = 1):
+    super().__init__(num_speculative_tokens)
+    self.max_ngram = max_ngram
+    self.min_ngram = min_ngram
+
+  async def propose(self, request_id: str, shard: Shard, tokens: List[int]) -> List[int]:
+    sequence = np.asarray(tokens)
+    for n in range(min(self.max_ngram, len(sequence) - 1), self.min_ngram - 1, -1):
+      # windows start before the suffix itself so a match always has at least one token after it
+      windows = np.lib.stride_tricks.sliding_window_view(sequence[:-1], n)
+      matches = np.flatnonzero((windows == sequence[-n:]).all(axis=1))
+      if len(matches) == 0: continue
+      start = matches[-1] + n
+      return sequence[start:start + self.num_speculative_tokens].tolist()
+    return []
+
+
+def accept_speculative_tokens(sampled: List[int], speculative_tokens: List[int]) -> List[int]:
+  # sampled[i] is what the model picked after the i-th input token: draft tokens are kept while they agree with it, and the first
+  # disagreement (or the token after the last draft) is the model's own next token
+  accepted = []
+  for i, token in enumerate(sampled):
+    accepted.append(token)
+    if i >= len(speculative_tokens) or token != speculative_tokens[i]: break
+  return accepted
@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+import numpy as np
+from exo.inference.dummy_inference_engine import DummyInferenceEngine
+from exo.inference.shard import Shard
+from exo.orchestration.decode_scheduler import DecodeScheduler
+
+
+class FakeBatchEngine:
+  def __init__(self, fail_on: str = None):
+    self.batch_calls = []
+    self.fail_on = fail_on
+
+  async def infer_tensor_batch(self, request_ids, shard, input_datas, inference_states):
+    self.batch_calls.append(list(request_ids))
+    await asyncio.sleep(0.01)
+    if self.fail_on in request_ids: raise ValueError(f"bad request {self.fail_on}")
+    return [(x + 1, state) for x, state in zip(input_datas, inference_states)]
+
+
+class TestDecodeScheduler(unittest.IsolatedAsyncioTestCase):
+  def setUp(self):
+    self.shard = Shard("test-model", 0, 1, 2)
+
+  async def test_concurrent_steps_share_a_batch(self):
+    engine = FakeBatchEngine()
+    scheduler = DecodeScheduler(max_batch_size=8)
+    results = await asyncio.gather(*[scheduler.submit(engine, f"req{i}", self.shard, np.array([[i]]), {"i": i}) for i in range(5)])
+
+    self.assertEqual(engine.batch_calls, [[f"req{i}" for i in range(5)]])
+    for i, (output, state) in enumerate(results):
+      np.testing.assert_array_equal(output, np.array([[i + 1]]))
+      self.assertEqual(state, {"i": i})
+    self.assertEqual(scheduler.num_pending(), 0)
+    self.assertEqual(scheduler.flush_tasks, {})
+
+  async def test_engines_without_batching_run_steps_directly(self):
+    engine = DummyInferenceEngine()
+    scheduler = DecodeScheduler(max_batch_size=8, max_wait=10.0)
+    results = await asyncio.gather(*[scheduler.submit(engine, f"req{i}", Shard("test-model", 0, 1, 2), np.array([[i]])) for i in range(3)])
+    for i, (output, _) in enumerate(results):
+      np.testing.assert_array_equal(output, np.array([[i + 1]]))
+    self.assertEqual(scheduler.flush_tasks, {})
+
+  async def test_max_batch_size(self):
+    engine = FakeBatchEngine()
+    scheduler = DecodeScheduler(max_batch_size=2)
+    await asyncio.gather(*[scheduler.submit(engine, f"req{i}", self.shard, np.array([[i]])) for i in range(5)])
+
+    self.assertEqual([len(batch) for batch in engine.batch_calls], [2, 2, 1])
+
+  async def test_failed_batch_is_retried_individually(self):
+    engine = FakeBatchEngine(fail_on="req1")
+    scheduler = DecodeScheduler()
+    results = await asyncio.gather(*[scheduler.submit(engine, f"req{i}", self.shard, np.array([[i]])) for i in range(3)], return_exceptions=True)
+
+    self.assertIsInstance(results[1], ValueError)
+    np.testing.assert_array_equal(results[0][0], np.array([[1]]))
+    np.testing.assert_array_equal(results[2][0], np.array([[3]]))
+    self.assertEqual(engine.batch_calls[1:], [["req0"], ["req1"], ["req2"]])
+
+  async def test_cancel_pending_step(self):
+    engine = FakeBatchEngine()
+    scheduler = DecodeScheduler(max_batch_size=1)
+    tasks = [asyncio.create_task(scheduler.submit(engine, f"req{i}", self.shard, np.array([[i]]))) for i in range(3)]
+    await asyncio.sleep(0)
+    self.assertEqual(scheduler.cancel("req2"), 1)
+    results = await asyncio.gather(*tasks)
+
+    self.assertIsNone(results[2])
+    self.assertEqual(engine.batch_calls, [["req0"], ["req1"]])
+
+
+if __name__ == "__main__":
+  unittest.main()
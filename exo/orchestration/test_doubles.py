@@ -0,0 +1,47 @@
+import json
+
+
+class LocalPeer:
+  """Calls another node in the same process directly, counting the topology records each exchange carried."""
+  def __init__(self, node):
+    self.node = node
+    self.records_sent = []
+
+  def id(self):
+    return self.node.id
+
+  def description(self):
+    return "local"
+
+  def device_capabilities(self):
+    return self.node.device_capabilities
+
+  async def sync_topology(self, versions, records):
+    versions, response = await self.node.sync_topology(versions, records)
+    self.records_sent.append(len(records) + len(response))
+    return versions, response
+
+  async def send_opaque_status(self, request_id, status):
+    self.node.on_opaque_status.trigger_all(request_id, status)
+
+
+class RecordingPeer:
+  """A peer that only records the prompts, results and statuses sent to it."""
+  def __init__(self, node_id: str):
+    self.node_id = node_id
+    self.prompts = []
+    self.results = []
+    self.statuses = []
+
+  def id(self):
+    return self.node_id
+
+  async def send_prompt(self, shard, prompt, request_id=None, inference_state=None, origin_node_id=None):
+    self.prompts.append((shard, request_id, origin_node_id))
+
+  async def send_result(self, request_id, result, is_finished):
+    self.results.append((request_id, result, is_finished))
+
+  async def send_opaque_status(self, request_id, status):
+    self.statuses.append(json.loads(status))
+
@@ -6,6 +6,12 @@ import pytest
 from .node import Node
 from exo.networking.peer_handle import PeerHandle
 from exo.download.shard_download import NoopShardDownloader
+from exo.inference.dummy_inference_engine import DummyInferenceEngine
+from exo.inference.kv_cache_manager import KVCacheBudgetExceeded, KVCacheEvicted
+from exo.inference.shard import Shard
+from exo.orchestration.test_doubles import RecordingPeer
+from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
+from exo.topology.ring_memory_weighted_partitioning_strategy import RingMemoryWeightedPartitioningStrategy
 
 class TestNode(unittest.IsolatedAsyncioTestCase):
   def setUp(self):
@@ -64,3 +70,39 @@ class TestNode(unittest.IsolatedAsyncioTestCase):
     caps = await node.get_device_capabilities()
     assert caps is not None
     assert caps.model != ""
+
+
+class FailingEngine(DummyInferenceEngine):
+  def __init__(self, error):
+    super().__init__()
+    self.error = error
+
+  async def infer_tensor(self, request_id, shard, input_data, inference_state=None):
+    raise self.error
+
+
+class TestNodeKVCacheErrors(unittest.IsolatedAsyncioTestCase):
+  def make_node(self, error):
+    node = Node("a", None, FailingEngine(error), None, NoopShardDownloader(), RingMemoryWeightedPartitioningStrategy())
+    for node_id, memory in {"a": 2000, "b": 1000}.items():
+      node.topology.update_node(node_id, DeviceCapabilities(model="test", chip="test", memory=memory, flops=DeviceFlops(fp32=0, fp16=0, int8=0)))
+    node.peers = [RecordingPeer("b")]
+    tokens = []
+    node.on_token.register("test").on_next(lambda request_id, result, is_finished: tokens.append((request_id, result, is_finished)))
+    return node, tokens
+
+  async def test_over_budget_request_finishes_at_its_origin(self):
+    node, tokens = self.make_node(KVCacheBudgetExceeded("over budget"))
+    shard = Shard("dummy", 0, 0, 8)
+    await node.process_tensor(shard, np.array([[1]]), "request", origin_node_id="b")
+    self.assertEqual(node.peers[0].results, [("request", [], True)])
+    self.assertEqual(tokens, [("request", [], True)])
+    self.assertNotIn("request", node.outstanding_requests)
+    self.assertNotIn("request", node.request_origins)
+
+  async def test_evicted_prompt_finishes_locally(self):
+    node, tokens = self.make_node(KVCacheEvicted("evicted"))
+    await node._process_prompt(Shard("dummy", 0, 0, 8), "hello", "request")
+    self.assertEqual(tokens, [("request", [], True)])
+    self.assertEqual(node.peers[0].results, [])
+    self.assertEqual(node.outstanding_requests, {})
@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import Mock
+from exo.inference.shard import Shard
+from exo.networking.peer_handle import PeerHandle
+from exo.orchestration.partition_plan import PartitionPlan
+from exo.topology.ring_memory_weighted_partitioning_strategy import RingMemoryWeightedPartitioningStrategy
+from exo.topology.test_doubles import make_topology
+
+
+def make_peer(peer_id):
+  peer = Mock(spec=PeerHandle)
+  peer.id.return_value = peer_id
+  return peer
+
+
+class TestPartitionPlan(unittest.TestCase):
+  def setUp(self):
+    self.topology = make_topology({"node1": 3000, "node2": 1000, "node3": 6000})
+    self.strategy = RingMemoryWeightedPartitioningStrategy()
+    self.peers = [make_peer("node1"), make_peer("node2")]
+    self.plan = PartitionPlan("node1", 1, self.topology, self.strategy, self.peers)
+
+  def test_lookups(self):
+    # sorted by memory: node3, node1, node2
+    self.assertEqual(self.plan.partition_index(), 1)
+    self.assertEqual(self.plan.partition_index(offset=1), 2)
+    self.assertEqual(self.plan.partition_index(offset=2), 0)
+    self.assertEqual(self.plan.node_id_at(2), "node2")
+    self.assertIs(self.plan.peer("node2"), self.peers[1])
+    self.assertIsNone(self.plan.peer("node3"))
+
+  def test_shards_are_cached_per_model(self):
+    base_shard = Shard("model", 0, 0, 10)
+    shards = self.plan.shards(base_shard)
+    self.assertEqual(shards, [Shard("model", 0, 5, 10), Shard("model", 6, 8, 10), Shard("model", 9, 9, 10)])
+    self.assertIs(self.plan.shards(Shard("model", 6, 8, 10)), shards)
+    self.assertEqual(self.plan.shard_at(base_shard, 1), Shard("model", 6, 8, 10))
+    self.assertEqual(self.plan.shard_at(Shard("other", 0, 0, 20), 0), Shard("other", 0, 11, 20))
+
+  def test_validity(self):
+    self.assertTrue(self.plan.is_valid_for(1, self.topology, self.strategy, self.peers))
+    self.assertFalse(self.plan.is_valid_for(2, self.topology, self.strategy, self.peers))
+    self.assertFalse(self.plan.is_valid_for(1, make_topology({"node1": 3000}), self.strategy, self.peers))
+    self.assertFalse(self.plan.is_valid_for(1, self.topology, self.strategy, list(self.peers)))
+
+  def test_missing_node(self):
+    plan = PartitionPlan("node4", 1, self.topology, self.strategy, self.peers)
+    with self.assertRaises(ValueError):
+      plan.partition_index()
+
+
+class TestTopologyHasSameGraph(unittest.TestCase):
+  def test_has_same_graph(self):
+    a = make_topology({"node1": 3000, "node2": 1000})
+    b = make_topology({"node1": 3000, "node2": 1000})
+    a.add_edge("node1", "node2", "Ethernet")
+    b.add_edge("node1", "node2", "Ethernet")
+    b.active_node_id = "node2"
+    self.assertTrue(a.has_same_graph(b))
+
+    b.peer_graph["node1"] = set()
+    b.add_edge("node1", "node2", "WiFi")
+    self.assertFalse(a.has_same_graph(b))
+    self.assertFalse(a.has_same_graph(make_topology({"node1": 3000, "node2": 2000})))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,55 @@
+import time
+import unittest
+from exo.download.shard_download import NoopShardDownloader
+from exo.inference.dummy_inference_engine import DummyInferenceEngine
+from exo.inference.shard import Shard
+from exo.orchestration.node import Node
+from exo.orchestration.test_doubles import LocalPeer
+from exo.topology.adaptive_partitioning_strategy import AdaptivePartitioningStrategy
+from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
+from exo.topology.partitioning_strategy import Partition
+from exo.topology.ring_memory_weighted_partitioning_strategy import RingMemoryWeightedPartitioningStrategy
+
+
+class TestRebalancing(unittest.IsolatedAsyncioTestCase):
+  async def test_leader_rebalances_from_shared_profiles(self):
+    nodes = [Node(f"node{i}", None, DummyInferenceEngine(), None, NoopShardDownloader(), AdaptivePartitioningStrategy(RingMemoryWeightedPartitioningStrategy())) for i in range(2)]
+    for node in nodes:
+      for other in nodes:
+        other.topology.update_node(node.id, DeviceCapabilities(model="test", chip="test", memory=16000, flops=DeviceFlops(fp32=0, fp16=0, int8=0)))
+    nodes[0].peers, nodes[1].peers = [LocalPeer(nodes[1])], [LocalPeer(nodes[0])]
+    leader, follower = (nodes[1], nodes[0]) if nodes[0].get_partition_plan().partitions[0].node_id == "node1" else nodes
+    # the leader's layers run three times slower
+    for node, elapsed in [(leader, 0.03), (follower, 0.01)]:
+      for _ in range(node.min_profile_samples):
+        node.inference_engine.layer_profile.record(Shard("test", 0, 9, 20), elapsed)
+
+    # the follower shares its profile but never decides
+    await follower.rebalance()
+    self.assertEqual(leader.partitioning_strategy.version, 0)
+    # the leader holds off while it is generating, requests it forwarded stay in outstanding_requests and don't count
+    leader.outstanding_requests["request"] = "waiting"
+    leader.last_inference_at = time.time()
+    await leader.rebalance()
+    self.assertEqual(leader.partitioning_strategy.version, 0)
+    leader.last_inference_at = 0.0
+    # and while any other node of the ring is
+    follower.outstanding_requests["request"] = "processing"
+    await follower.rebalance()
+    await leader.rebalance()
+    self.assertEqual(leader.partitioning_strategy.version, 0)
+    follower.outstanding_requests["request"] = "waiting"
+    await follower.rebalance()
+
+    epochs = [node.topology_epoch for node in nodes]
+    await leader.rebalance()
+    for node, epoch in zip(nodes, epochs):
+      self.assertEqual(node.partitioning_strategy.version, 1)
+      self.assertEqual(node.topology_epoch, epoch + 1)
+      self.assertEqual(node.get_partition_plan().partitions, [Partition(leader.id, 0.0, 0.25), Partition(follower.id, 0.25, 1.0)])
+    base = Shard("test", 0, 19, 20)
+    self.assertEqual(leader.get_current_shard(base), Shard("test", 0, 4, 20))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from unittest import mock
+from exo.download.shard_download import NoopShardDownloader
+from exo.inference.dummy_inference_engine import DummyInferenceEngine
+from exo.inference.shard import Shard
+from exo.networking.grpc import node_service_pb2
+from exo.networking.grpc.grpc_server import GRPCServer
+from exo.orchestration import replica_router
+from exo.orchestration.node import Node
+from exo.orchestration.replica_router import ReplicaRouter
+from exo.orchestration.test_doubles import RecordingPeer
+from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
+from exo.topology.replicated_partitioning_strategy import ReplicatedPartitioningStrategy
+from exo.topology.ring_memory_weighted_partitioning_strategy import RingMemoryWeightedPartitioningStrategy
+
+
+class TestReplicaRouter(unittest.IsolatedAsyncioTestCase):
+  def test_least_loaded_replica(self):
+    router = ReplicaRouter(report_ttl=10.0)
+    self.assertEqual(router.choose([0, 1], preferred=1), 1)
+    router.dispatched("r1", 1)
+    self.assertEqual(router.choose([0, 1], preferred=1), 0)
+    router.report(0, 3)
+    self.assertEqual(router.choose([0, 1], preferred=1), 1)
+    router.finished("r1")
+    self.assertEqual(router.depth(1), 0)
+
+  def test_stale_reports_are_ignored(self):
+    router = ReplicaRouter(report_ttl=10.0)
+    with mock.patch.object(replica_router.time, "monotonic", return_value=100.0):
+      router.report(0, 5)
+    with mock.patch.object(replica_router.time, "monotonic", return_value=105.0):
+      self.assertEqual(router.depth(0), 5)
+    with mock.patch.object(replica_router.time, "monotonic", return_value=111.0):
+      self.assertEqual(router.depth(0), 0)
+
+  def test_bounded_in_flight(self):
+    router = ReplicaRouter(max_requests=2)
+    for i in range(3):
+      router.dispatched(f"r{i}", 0)
+    self.assertEqual(list(router.in_flight), ["r1", "r2"])
+
+  async def test_node_routes_new_requests(self):
+    strategy = ReplicatedPartitioningStrategy(RingMemoryWeightedPartitioningStrategy())
+    node = Node("a", None, DummyInferenceEngine(), None, NoopShardDownloader(), strategy)
+    for node_id, memory in {"a": 4000, "b": 3000, "c": 2000, "d": 1000}.items():
+      node.topology.update_node(node_id, DeviceCapabilities(model="test", chip="test", memory=memory, flops=DeviceFlops(fp32=0, fp16=0, int8=0)))
+    peers = {node_id: RecordingPeer(node_id) for node_id in "bcd"}
+    node.peers = list(peers.values())
+    plan = node.get_partition_plan()
+    self.assertEqual([[p.node_id for p in plan.replicas[r]] for r in (0, 1)], [["a", "d"], ["b", "c"]])
+
+    # replica 0 is busier, the request goes to the head of replica 1 and comes back to this node
+    node.replica_router.report(0, 2)
+    base = Shard("dummy", 0, 0, 8)
+    await node._process_prompt(base, "hello", "request")
+    self.assertEqual(peers["b"].prompts, [(plan.shard_at(base, 0, replica=1), "request", "a")])
+    self.assertEqual(node.replica_router.in_flight, {"request": 1})
+    # the last node of replica 1 sends the final result back over grpc
+    await GRPCServer(node, "localhost", 0).SendResult(node_service_pb2.SendResultRequest(request_id="request", result=[1], is_finished=True), None)
+    self.assertEqual(node.replica_router.in_flight, {})
+
+    # prompts forwarded from another node stay on this replica
+    node.replica_router.report(0, 0)
+    node.replica_router.report(1, 5)
+    await node._process_prompt(base, "hello", "forwarded", origin_node_id="c")
+    self.assertEqual(node.replica_router.in_flight, {})
+    self.assertEqual(len(peers["b"].prompts), 1)
+
+  async def test_last_node_reports_load(self):
+    strategy = ReplicatedPartitioningStrategy(RingMemoryWeightedPartitioningStrategy())
+    node = Node("d", None, DummyInferenceEngine(), None, NoopShardDownloader(), strategy)
+    for node_id, memory in {"a": 4000, "b": 3000, "c": 2000, "d": 1000}.items():
+      node.topology.update_node(node_id, DeviceCapabilities(model="test", chip="test", memory=memory, flops=DeviceFlops(fp32=0, fp16=0, int8=0)))
+    peer = RecordingPeer("a")
+    node.peers = [peer]
+    node.outstanding_requests["request"] = "processing"
+    report = await node.report_replica_load()
+    self.assertEqual(peer.statuses, [{"type": "replica_load", "node_id": "d", "replica": 0, "load": 1}])
+    # unchanged load isn't broadcast again until the report is about to go stale
+    self.assertEqual(await node.report_replica_load(report), report)
+    self.assertEqual(len(peer.statuses), 1)
+    self.assertEqual(node.replica_router.depth(0), 1)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import numpy as np
+from exo.download.shard_download import NoopShardDownloader
+from exo.inference.dummy_inference_engine import DummyInferenceEngine
+from exo.inference.kv_cache_manager import KVCacheManager
+from exo.inference.shard import Shard
+from exo.inference.tokenizers import DummyTokenizer
+from exo.orchestration.node import Node
+from exo.orchestration.speculative import DraftModelProposer, PromptLookupProposer, accept_speculative_tokens
+from exo.topology.ring_memory_weighted_partitioning_strategy import RingMemoryWeightedPartitioningStrategy
+
+
+class CountingEngine:
+  """Predicts token + 1 and keeps the number of tokens in each request's cache."""
+  def __init__(self, vocab_size: int = 32, trimmable: bool = True):
+    self.vocab_size = vocab_size
+    self.trimmable = trimmable
+    self.tokenizer = DummyTokenizer()
+    self.kv_caches = {}
+    self.calls = []
+
+  async def ensure_shard(self, shard):
+    pass
+
+  async def can_trim_cache(self):
+    return self.trimmable
+
+  async def infer_tensor(self, request_id, shard, input_data, inference_state=None):
+    self.calls.append(input_data.tolist())
+    self.kv_caches[request_id] = self.kv_caches.get(request_id, 0) + input_data.shape[1]
+    logits = np.zeros((1, input_data.shape[1], self.vocab_size))
+    for i, token in enumerate(input_data[0]): logits[0, i, (token + 1) % self.vocab_size] = 1
+    return logits, None
+
+  async def trim_cache(self, request_id, n):
+    self.kv_caches[request_id] -= n
+
+  async def clear_request(self, request_id):
+    self.kv_caches.pop(request_id, None)
+
+
+class TestSpeculative(unittest.IsolatedAsyncioTestCase):
+  def test_accept_longest_matching_prefix(self):
+    self.assertEqual(accept_speculative_tokens([5, 6, 9, 1], [5, 6, 7]), [5, 6, 9])
+    self.assertEqual(accept_speculative_tokens([5, 6, 7, 8], [5, 6, 7]), [5, 6, 7, 8])
+    self.assertEqual(accept_speculative_tokens([4, 6, 7, 8], [5, 6, 7]), [4])
+    self.assertEqual(accept_speculative_tokens([3], []), [3])
+
+  async def test_draft_model_proposals(self):
+    engine = CountingEngine()
+    proposer = DraftModelProposer(engine, Shard("draft", 0, 0, 1), num_speculative_tokens=3)
+    self.assertEqual(await proposer.propose("req", Shard("target", 0, 0, 1), [1, 2, 3]), [4, 5, 6])
+    # the draft cache only keeps the tokens the ring has seen, not its own unverified proposals
+    self.assertEqual(engine.kv_caches["req"], 3)
+
+    # two of the proposals were accepted and the ring sampled 10 after them: only the new tokens are fed
+    self.assertEqual(await proposer.propose("req", Shard("target", 0, 0, 1), [1, 2, 3, 4, 5, 10]), [11, 12, 13])
+    self.assertEqual(engine.calls[3], [[4, 5, 10]])
+    self.assertEqual(engine.kv_caches["req"], 6)
+
+    await proposer.clear("req")
+    self.assertNotIn("req", engine.kv_caches)
+    self.assertNotIn("req", proposer.processed)
+
+  async def test_untrimmable_draft_cache_disables_speculation(self):
+    target = Shard("target", 0, 0, 1)
+    self.assertTrue(await DraftModelProposer(CountingEngine(), Shard("draft", 0, 0, 1)).is_compatible(target, DummyTokenizer()))
+    self.assertFalse(await DraftModelProposer(CountingEngine(trimmable=False), Shard("draft", 0, 0, 1)).is_compatible(target, DummyTokenizer()))
+
+  def test_draft_model_gets_a_share_of_the_kv_cache_budget(self):
+    draft_engine, engine = DummyInferenceEngine(), DummyInferenceEngine()
+    draft_engine.kv_caches, engine.kv_caches = KVCacheManager(), KVCacheManager()
+    speculator = DraftModelProposer(draft_engine, Shard("draft", 0, 0, 1))
+    node = Node("a", None, engine, None, NoopShardDownloader(), RingMemoryWeightedPartitioningStrategy(), kv_cache_budget=1000, speculator=speculator)
+    node.configure_kv_cache()
+    self.assertEqual((engine.kv_caches.budget_bytes, draft_engine.kv_caches.budget_bytes), (900, 100))
+
+  async def test_prompt_lookup(self):
+    proposer = PromptLookupProposer(num_speculative_tokens=3)
+    shard = Shard("target", 0, 0, 1)
+    # the latest occurrence of the longest matching suffix wins
+    self.assertEqual(await proposer.propose("req", shard, [1, 2, 3, 4, 1, 2, 3, 5, 0, 9, 2, 3, 1, 2, 3]), [5, 0, 9])
+    self.assertEqual(await proposer.propose("req", shard, [1, 2, 3, 4, 5, 6, 3]), [4, 5, 6])
+    self.assertEqual(await proposer.propose("req", shard, [1, 2, 3, 4]), [])
+    self.assertEqual(await proposer.propose("req", shard, [5]), [])
+
+
+if __name__ == "__main__":
+  unittest.main()
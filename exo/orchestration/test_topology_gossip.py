@@ -0,0 +1,121 @@
+import unittest
+from exo.download.shard_download import NoopShardDownloader
+from exo.inference.dummy_inference_engine import DummyInferenceEngine
+from exo.orchestration.node import Node
+from exo.orchestration.test_doubles import LocalPeer
+from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
+from exo.topology.ring_memory_weighted_partitioning_strategy import RingMemoryWeightedPartitioningStrategy
+from exo.topology.ring_ordering import quantized_link_stats
+from exo.topology.topology import LinkStats
+
+
+def make_nodes(n):
+  nodes = [Node(f"node{i}", None, DummyInferenceEngine(), None, NoopShardDownloader(), RingMemoryWeightedPartitioningStrategy()) for i in range(n)]
+  for i, node in enumerate(nodes):
+    node.device_capabilities = DeviceCapabilities(model="test", chip="test", memory=1000*(i + 1), flops=DeviceFlops(fp32=0, fp16=0, int8=0))
+  return nodes
+
+
+class TestTopologyGossip(unittest.IsolatedAsyncioTestCase):
+  async def test_line_converges_and_goes_quiet(self):
+    nodes = make_nodes(8)
+    for i, node in enumerate(nodes):
+      node.peers = [LocalPeer(nodes[j]) for j in (i - 1, i + 1) if 0 <= j < len(nodes)]
+    for _ in range(len(nodes)):
+      for node in nodes:
+        await node.gossip_topology()
+    for node in nodes:
+      self.assertEqual(set(node.topology.nodes), {n.id for n in nodes})
+      self.assertEqual(node.topology.nodes["node3"].memory, 4000)
+
+    # once converged, exchanges carry versions only
+    for node in nodes:
+      for peer in node.peers: peer.records_sent.clear()
+      await node.gossip_topology()
+    self.assertTrue(all(sent == [0] for node in nodes for sent in (peer.records_sent for peer in node.peers)))
+
+    # the last node leaves, its neighbour's new record takes it out of everyone's topology
+    epochs = [node.topology_epoch for node in nodes]
+    nodes[6].peers = [LocalPeer(nodes[5])]
+    for _ in range(len(nodes)):
+      for node in nodes[:7]:
+        await node.gossip_topology()
+    for node, epoch in zip(nodes[:7], epochs):
+      self.assertNotIn("node7", node.topology.nodes)
+      self.assertGreater(node.topology_epoch, epoch)
+
+  async def test_fanout_bounds_exchanges(self):
+    nodes = make_nodes(12)
+    for node in nodes:
+      node.peers = [LocalPeer(other) for other in nodes if other is not node]
+    changes = []
+    nodes[0].on_topology_change.register("test").on_next(lambda topology: changes.append(len(topology.nodes)))
+    # first round: every node's own record is new, so it is pushed to every peer
+    for node in nodes:
+      await node.gossip_topology()
+    for node in nodes:
+      for peer in node.peers: peer.records_sent.clear()
+      await node.gossip_topology()
+    self.assertEqual(sum(len(peer.records_sent) for node in nodes for peer in node.peers), 12*nodes[0].gossip_fanout)
+    self.assertTrue(all(len(node.topology.nodes) == 12 for node in nodes))
+    self.assertEqual(changes[-1], 12)
+
+  async def test_link_costs_are_published_by_one_node(self):
+    nodes = make_nodes(3)
+    for node in nodes:
+      node.peers = [LocalPeer(other) for other in nodes if other is not node]
+      await node.gossip_topology()
+    # only node2 has measured a link so far, it isn't the one to publish it
+    nodes[2].link_prober.published = {"node0": LinkStats(rtt=0.01, rtt_p90=0.01, bandwidth=1e8)}
+    await nodes[2].gossip_topology()
+    self.assertTrue(all(node.topology.agreed_link_stats == {} for node in nodes))
+
+    epochs = [node.topology_epoch for node in nodes]
+    await nodes[0].gossip_topology()
+    for node, epoch in zip(nodes, epochs):
+      self.assertEqual(list(node.topology.agreed_link_stats), [("node2", "node0")])
+      self.assertEqual(node.topology_epoch, epoch + 1)
+    # a measurement a few percent off quantizes to the same stats and doesn't change the agreed ones
+    version = nodes[0].topology_state.records["node0"].version
+    nodes[2].link_prober.published = {"node0": LinkStats(rtt=0.0102, rtt_p90=0.0102, bandwidth=1.03e8)}
+    for node in nodes: await node.gossip_topology()
+    self.assertEqual(nodes[0].topology_state.records["node0"].version, version)
+    self.assertEqual([node.topology_epoch for node in nodes], [epoch + 1 for epoch in epochs])
+
+  async def converge(self, nodes):
+    for _ in range(3):
+      for node in nodes: await node.gossip_topology(everyone=True)
+    return [node.topology.agreed_link_stats for node in nodes]
+
+  async def test_smaller_id_joining_later_takes_over_link_costs(self):
+    nodes = make_nodes(3)
+    for node in nodes[1:]:
+      node.peers = [LocalPeer(other) for other in nodes[1:] if other is not node]
+    nodes[2].link_prober.published = {"node1": LinkStats(rtt=0.01, rtt_p90=0.01, bandwidth=1e8)}
+    agreed = await self.converge(nodes[1:])
+    self.assertEqual(agreed, [{("node2", "node1"): quantized_link_stats(nodes[2].link_prober.published["node1"])}]*2)
+
+    for node in nodes:
+      node.peers = [LocalPeer(other) for other in nodes if other is not node]
+    nodes[0].link_prober.published = {"node1": LinkStats(rtt=0.1, rtt_p90=0.1, bandwidth=1e7)}
+    agreed = await self.converge(nodes)
+    self.assertEqual(set(agreed[0]), {("node0", "node1"), ("node2", "node1")})
+    self.assertEqual(agreed, [agreed[0]]*3)
+    self.assertEqual(nodes[1].topology_state.records["node1"].agreed_link_stats, {})
+
+  async def test_restarted_node_gets_unchanged_link_costs(self):
+    nodes = make_nodes(3)
+    for node in nodes:
+      node.peers = [LocalPeer(other) for other in nodes if other is not node]
+    nodes[2].link_prober.published = {"node0": LinkStats(rtt=0.01, rtt_p90=0.01, bandwidth=1e8)}
+    agreed = (await self.converge(nodes))[0]
+    self.assertEqual(list(agreed), [("node2", "node0")])
+
+    nodes[1] = make_nodes(2)[1]
+    for node in nodes:
+      node.peers = [LocalPeer(other) for other in nodes if other is not node]
+    self.assertEqual(await self.converge(nodes), [agreed]*3)
+
+
+if __name__ == "__main__":
+  unittest.main()
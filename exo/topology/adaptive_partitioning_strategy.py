@@ -0,0 +1,80 @@
+import time
+from typing import Dict, List, Optional
+from .partitioning_strategy import Partition, PartitioningStrategy
+from .topology import Topology
+
+
+class AdaptivePartitioningStrategy(PartitioningStrategy):
+  """The partitions of base, with the layer boundaries moved to where measured per-layer times (see LayerProfile) balance the stages.
+
+  One node (the leader, see Node.periodic_rebalancing) calls propose with the profiles of all nodes and broadcasts the result, every
+  node then applies it by version so they all keep computing the same partitions. Overrides are only used while base still orders
+  the same nodes, a topology change falls back to base until the next rebalance.
+
+  Hysteresis keeps the boundaries from moving back and forth on noise: a rebalance is only considered when the slowest stage is more
+  than threshold over the mean, only made when it cuts the slowest stage by at least min_gain, and at most once per cooldown seconds.
+  Each node's share is capped at memory_headroom times its share by memory so the layers it gets still fit.
+  """
+  def __init__(self, base: PartitioningStrategy, threshold: float = 0.2, min_gain: float = 0.1, cooldown: float = 60.0, memory_headroom: float = 1.5):
+    self.base = base
+    self.threshold = threshold
+    self.min_gain = min_gain
+    self.cooldown = cooldown
+    self.memory_headroom = memory_headroom
+    self.overrides: Optional[List[Partition]] = None
+    self.version = 0
+    self.rebalanced_at: Optional[float] = None
+
+  def partition(self, topology: Topology) -> List[Partition]:
+    partitions = self.base.partition(topology)
+    if self.overrides is not None and [p.node_id for p in self.overrides] == [p.node_id for p in partitions]: return self.overrides
+    return partitions
+
+  def apply(self, partitions: List[Partition], version: int) -> bool:
+    if version <= self.version: return False
+    self.overrides, self.version, self.rebalanced_at = partitions, version, time.monotonic()
+    return True
+
+  @staticmethod
+  def stage_times(partitions: List[Partition], seconds_per_layer: Dict[str, float]) -> List[float]:
+    # in seconds per layer of the whole model, only the ratios between stages matter
+    return [(p.end - p.start)*seconds_per_layer[p.node_id] for p in partitions]
+
+  def propose(self, topology: Topology, seconds_per_layer: Dict[str, float]) -> Optional[List[Partition]]:
+    """Rebalanced partitions, or None when the current ones are balanced enough, a node hasn't been measured yet or the layers don't fit
+    within the memory caps."""
+    current = self.partition(topology)
+    if len(current) < 2 or any(not seconds_per_layer.get(p.node_id) for p in current): return None
+    if self.rebalanced_at is not None and time.monotonic() - self.rebalanced_at < self.cooldown: return None
+    times = self.stage_times(current, seconds_per_layer)
+    if max(times) <= (1 + self.threshold)*sum(times)/len(times): return None
+
+    shares = self.balanced_shares(topology, {p.node_id: 1/seconds_per_layer[p.node_id] for p in current})
+    if shares is None: return None
+    proposal, start = [], 0.0
+    for i, p in enumerate(current):
+      end = 1.0 if i == len(current) - 1 else round(start + shares[p.node_id], 5)
+      proposal.append(Partition(p.node_id, start, end))
+      start = end
+    if max(self.stage_times(proposal, seconds_per_layer)) > (1 - self.min_gain)*max(times): return None
+    return proposal
+
+  def balanced_shares(self, topology: Topology, speeds: Dict[str, float]) -> Optional[Dict[str, float]]:
+    """Shares proportional to speed, with the nodes over their memory cap held at it and the rest spread over the others, or None when
+    the caps add up to less than the whole model."""
+    total_memory = sum(topology.get_node(node_id).memory for node_id in speeds)
+    caps = {node_id: self.memory_headroom*topology.get_node(node_id).memory/total_memory for node_id in speeds}
+    shares, remaining, budget = {}, set(speeds), 1.0
+    while remaining:
+      total_speed = sum(speeds[node_id] for node_id in remaining)
+      capped = [node_id for node_id in remaining if budget*speeds[node_id]/total_speed > caps[node_id]]
+      if not capped:
+        shares.update({node_id: budget*speeds[node_id]/total_speed for node_id in remaining})
+        break
+      for node_id in capped:
+        shares[node_id] = caps[node_id]
+        budget -= caps[node_id]
+        remaining.remove(node_id)
+    # every node is held at its cap and part of the model is left over
+    if budget > 1e-9 and not remaining: return None
+    return shares
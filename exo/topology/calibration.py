@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Optional
+import numpy as np
+from exo import DEBUG
+from exo.download.new_shard_download import exo_home
+from .device_capabilities import DeviceCapabilities, DeviceFlops
+
+
+@dataclass
+class Calibration:
+  fingerprint: str
+  fp32: float  # TFLOPS
+  fp16: float  # TFLOPS
+  memory_bandwidth: float  # GB/s
+  source: str  # what ran the matmuls: numpy or the inference engine
+  measured_at: float  # unix time
+
+
+def calibration_path() -> Path:
+  return exo_home()/"calibration.json"
+
+
+def host_fingerprint(capabilities: DeviceCapabilities, engine_name: str) -> str:
+  """Changes whenever the numbers could: different hardware, memory, engine or numpy build."""
+  parts = [platform.node(), platform.machine(), platform.processor(), str(os.cpu_count()), capabilities.model, capabilities.chip, str(capabilities.memory), engine_name, np.__version__]
+  return hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+
+
+def timed(run: Callable[[], None], min_duration: float) -> float:
+  """Seconds per call of run, over as many calls as fit in min_duration after a warmup call."""
+  run()
+  calls, start = 0, time.perf_counter()
+  while calls == 0 or time.perf_counter() - start < min_duration:
+    run()
+    calls += 1
+  return (time.perf_counter() - start)/calls
+
+
+def numpy_matmul_tflops(dtype, size: int = 1024, min_duration: float = 0.5) -> float:
+  a, b = np.random.rand(size, size).astype(dtype), np.random.rand(size, size).astype(dtype)
+  return 2*size**3/timed(lambda: a @ b, min_duration)/1e12
+
+
+def engine_matmul_tflops(engine_name: str, dtype_name: str, size: int = 2048, min_duration: float = 0.5) -> Optional[float]:
+  """Matmul throughput on the device the engine runs the model on, None if the engine's framework isn't available."""
+  try:
+    if engine_name == "MLXDynamicShardInferenceEngine":
+      import mlx.core as mx
+      dtype = getattr(mx, dtype_name)
+      a, b = mx.random.normal((size, size)).astype(dtype), mx.random.normal((size, size)).astype(dtype)
+      return 2*size**3/timed(lambda: mx.eval(a @ b), min_duration)/1e12
+    if engine_name == "TinygradDynamicShardInferenceEngine":
+      from tinygrad import Tensor, dtypes
+      dtype = getattr(dtypes, dtype_name)
+      a, b = Tensor.rand(size, size, dtype=dtype).realize(), Tensor.rand(size, size, dtype=dtype).realize()
+      return 2*size**3/timed(lambda: (a @ b).realize(), min_duration)/1e12
+  except Exception as e:
+    if DEBUG >= 1: print(f"Engine calibration with {engine_name} failed, using numpy: {e!r}")
+  return None
+
+
+def engine_memory_bandwidth_gbs(engine_name: str, nbytes: int = 256*1024*1024, min_duration: float = 0.5) -> Optional[float]:
+  """Memory bandwidth of the device the engine keeps the weights on, None if the engine's framework isn't available."""
+  try:
+    if engine_name == "MLXDynamicShardInferenceEngine":
+      import mlx.core as mx
+      a = mx.ones((nbytes,), dtype=mx.uint8)
+      mx.eval(a)
+      seconds = timed(lambda: mx.eval(a + 1), min_duration)
+    elif engine_name == "TinygradDynamicShardInferenceEngine":
+      from tinygrad import Tensor, dtypes
+      a = Tensor.ones(nbytes, dtype=dtypes.uint8).contiguous().realize()
+      seconds = timed(lambda: (a + 1).realize(), min_duration)
+    else:
+      return None
+  except Exception as e:
+    if DEBUG >= 1: print(f"Engine memory bandwidth measurement with {engine_name} failed: {e!r}")
+    return None
+  # an elementwise op reads and writes every byte
+  return 2*nbytes/seconds/1e9
+
+
+def run_calibration(fingerprint: str, engine_name: str) -> Calibration:
+  engine_fp32, engine_fp16 = engine_matmul_tflops(engine_name, "float32"), engine_matmul_tflops(engine_name, "float16")
+  if engine_fp32 is not None and engine_fp16 is not None:
+    fp32, fp16, source = engine_fp32, engine_fp16, engine_name
+  else:
+    # fp16 matmuls in numpy don't use BLAS, which is what a CPU node running fp16 weights gets too
+    fp32, fp16, source = numpy_matmul_tflops(np.float32), numpy_matmul_tflops(np.float16, size=512), "numpy"
+  # a host memory copy says nothing about a GPU's memory, without the engine the bandwidth stays unknown and only flops bound the
+  # compute time (see LatencyCostModel)
+  memory_bandwidth = engine_memory_bandwidth_gbs(engine_name) or 0.0
+  return Calibration(fingerprint, fp32, fp16, memory_bandwidth, source, time.time())
+
+
+def load_calibration(path: Path, fingerprint: str) -> Optional[Calibration]:
+  try:
+    return Calibration(**json.loads(path.read_text())[fingerprint])
+  except Exception:
+    return None
+
+
+def save_calibration(path: Path, calibration: Calibration) -> None:
+  try:
+    calibrations = json.loads(path.read_text()) if path.exists() else {}
+  except Exception:
+    calibrations = {}
+  calibrations[calibration.fingerprint] = asdict(calibration)
+  path.parent.mkdir(parents=True, exist_ok=True)
+  tmp_path = path.with_suffix(".tmp")
+  tmp_path.write_text(json.dumps(calibrations, indent=2))
+  tmp_path.replace(path)
+
+
+async def calibrate(capabilities: DeviceCapabilities, engine_name: str, recalibrate: bool = False, path: Optional[Path] = None) -> DeviceCapabilities:
+  """capabilities with the flops and memory bandwidth measured on this host instead of looked up in CHIP_FLOPS.
+
+  The measurement takes a few seconds and is cached per host fingerprint, recalibrate measures again. int8 isn't measured, it is
+  taken as twice fp16 like in the table.
+  """
+  path = path or calibration_path()
+  fingerprint = host_fingerprint(capabilities, engine_name)
+  calibration = None if recalibrate else load_calibration(path, fingerprint)
+  if calibration is None:
+    print(f"Calibrating {capabilities.chip} with {engine_name}...")
+    calibration = await asyncio.get_running_loop().run_in_executor(None, run_calibration, fingerprint, engine_name)
+    try:
+      save_calibration(path, calibration)
+    except Exception as e:
+      print(f"Error saving calibration to {path}: {e}")
+  if DEBUG >= 1: print(f"Calibration ({calibration.source}): fp32={calibration.fp32:.3f} fp16={calibration.fp16:.3f} TFLOPS, memory bandwidth {calibration.memory_bandwidth:.1f}GB/s")
+  return capabilities.model_copy(update={
+    "flops": DeviceFlops(fp32=calibration.fp32, fp16=calibration.fp16, int8=2*calibration.fp16),
+    "memory_bandwidth": calibration.memory_bandwidth,
+  })
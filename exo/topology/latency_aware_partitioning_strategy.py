@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from .device_capabilities import DeviceCapabilities
+from .partitioning_strategy import Partition, PartitioningStrategy
+from .ring_memory_weighted_partitioning_strategy import RingMemoryWeightedPartitioningStrategy
+from .ring_ordering import link_stats, order_ring
+from .topology import LinkStats, Topology
+
+
+@dataclass
+class LatencyCostModel:
+  """Estimated time to generate one token with a model of num_layers equal layers split into contiguous ranges over a ring of nodes.
+
+  The defaults describe an 8B model in fp16. Nodes compute their layers at their fp16 flops, or read their weights at their memory
+  bandwidth when that is known and slower, and pass the activations to the next node, the last one passes the sampled token back to
+  the first. Links are taken at their agreed stats (see ring_ordering.link_stats), or are assumed to have default_rtt and
+  default_bandwidth when their interface type isn't known either.
+  """
+  num_layers: int = 32
+  layer_memory: float = 500  # MB of weights per layer
+  layer_flops: float = 0.5e9  # per token
+  activation_bytes: int = 8192  # per token
+  memory_fraction: float = 0.8  # share of a node's memory available for weights
+  default_rtt: float = 0.002
+  default_bandwidth: float = 100e6  # bytes per second
+
+  def capacity(self, capabilities: DeviceCapabilities) -> int:
+    return int(capabilities.memory*self.memory_fraction // self.layer_memory)
+
+  def compute_time(self, capabilities: DeviceCapabilities, layers: int) -> float:
+    # DeviceFlops are in TFLOPS, memory_bandwidth in GB/s
+    flops, bandwidth = capabilities.flops.fp16*1e12, capabilities.memory_bandwidth*1e9
+    times = ([self.layer_flops/flops] if flops > 0 else []) + ([self.layer_memory*2**20/bandwidth] if bandwidth > 0 else [])
+    return layers*max(times) if times else float("inf")
+
+  def transfer_time(self, stats: Optional[LinkStats]) -> float:
+    rtt = stats.rtt if stats is not None else self.default_rtt
+    bandwidth = stats.bandwidth if stats is not None and stats.bandwidth else self.default_bandwidth
+    return rtt/2 + self.activation_bytes/bandwidth
+
+  def stage_times(self, topology: Topology, assignment: List[Tuple[str, int]]) -> List[float]:
+    """Time each node of the ring spends on a token: computing its layers and sending the result to the next node."""
+    times = []
+    for i, (node_id, layers) in enumerate(assignment):
+      next_id = assignment[(i + 1) % len(assignment)][0]
+      send = self.transfer_time(link_stats(topology, node_id, next_id)) if next_id != node_id else 0.0
+      times.append(self.compute_time(topology.get_node(node_id), layers) + send)
+    return times
+
+  def latency(self, topology: Topology, assignment: List[Tuple[str, int]]) -> float:
+    return sum(self.stage_times(topology, assignment))
+
+
+class LatencyAwarePartitioningStrategy(PartitioningStrategy):
+  """Splits the layers to minimize the estimated per-token latency of cost_model, with the layers that fit in each node's memory as a
+  hard limit. Every node gets at least one layer.
+
+  With ring_ordering the nodes are arranged into the ring with the fastest links (see order_ring), otherwise they keep the order of
+  RingMemoryWeightedPartitioningStrategy. The layer counts are chosen by dynamic programming over the number of layers given to the
+  first i nodes, preferring the split with the smaller slowest stage among ones of equal latency. Falls back to the memory weighted
+  split when the model doesn't fit or a node's flops are unknown.
+  """
+  def __init__(self, cost_model: Optional[LatencyCostModel] = None, ring_ordering: bool = True):
+    self.cost_model = cost_model or LatencyCostModel()
+    self.ring_ordering = ring_ordering
+    self.fallback = RingMemoryWeightedPartitioningStrategy(ring_ordering)
+
+  def partition(self, topology: Topology) -> List[Partition]:
+    nodes = list(topology.all_nodes())
+    nodes.sort(key=lambda x: (x[1].memory, x[0]), reverse=True)
+    node_ids = [node_id for node_id, _ in nodes]
+    if self.ring_ordering: node_ids = order_ring(topology, node_ids, self.cost_model.activation_bytes)
+    assignment = self.assign_layers(topology, node_ids)
+    if assignment is None: return self.fallback.partition(topology)
+    partitions, start = [], 0
+    for node_id, layers in assignment:
+      partitions.append(Partition(node_id, round(start/self.cost_model.num_layers, 5), round((start + layers)/self.cost_model.num_layers, 5)))
+      start += layers
+    return partitions
+
+  def assign_layers(self, topology: Topology, node_ids: List[str]) -> Optional[List[Tuple[str, int]]]:
+    """Layer counts for node_ids in ring order, None if there is no split within the nodes' memory."""
+    model, num_layers, n = self.cost_model, self.cost_model.num_layers, len(node_ids)
+    if n == 0 or num_layers < n: return None
+    capacities = [min(model.capacity(topology.get_node(node_id)), num_layers) for node_id in node_ids]
+    if any(model.compute_time(topology.get_node(node_id), 1) == float("inf") for node_id in node_ids): return None
+    sends = [model.transfer_time(link_stats(topology, node_id, node_ids[(i + 1) % n])) if n > 1 else 0.0 for i, node_id in enumerate(node_ids)]
+
+    # best[i][l]: (latency, slowest stage) of giving the first l layers to the first i nodes, choice[i][l]: layers of node i - 1
+    inf = (float("inf"), float("inf"))
+    best = [[inf]*(num_layers + 1) for _ in range(n + 1)]
+    choice = [[0]*(num_layers + 1) for _ in range(n + 1)]
+    best[0][0] = (0.0, 0.0)
+    for i in range(1, n + 1):
+      capabilities = topology.get_node(node_ids[i - 1])
+      for total in range(i, num_layers + 1):
+        for layers in range(1, min(capacities[i - 1], total - (i - 1)) + 1):
+          latency, slowest = best[i - 1][total - layers]
+          if latency == float("inf"): continue
+          stage = model.compute_time(capabilities, layers) + sends[i - 1]
+          # rounding keeps splits of equal latency from being told apart by float error
+          candidate = (round(latency + stage, 12), max(slowest, stage))
+          if candidate < best[i][total]:
+            best[i][total], choice[i][total] = candidate, layers
+    if best[n][num_layers] == inf: return None
+
+    assignment, total = [], num_layers
+    for i in range(n, 0, -1):
+      assignment.append((node_ids[i - 1], choice[i][total]))
+      total -= choice[i][total]
+    return assignment[::-1]
@@ -13,6 +13,8 @@ class Partition:
   node_id: str
   start: float
   end: float
+  # index of the pipeline the partition belongs to when the model is replicated, see ReplicatedPartitioningStrategy
+  replica: int = 0
 
 
 class PartitioningStrategy(ABC):
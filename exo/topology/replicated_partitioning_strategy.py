@@ -0,0 +1,44 @@
+from typing import List
+from .partitioning_strategy import Partition, PartitioningStrategy
+from .topology import Topology
+
+
+class ReplicatedPartitioningStrategy(PartitioningStrategy):
+  """Splits the nodes into replicas independent pipelines, each holding the whole model partitioned by base among its nodes.
+
+  Nodes are dealt to the replica with the least memory so far, largest first, so the replicas end up with about the same memory.
+  With min_replica_memory (MB) there are only as many replicas as can each get that much, a model has to fit in every one of them.
+  Partitions are tagged with their replica, requests go around the ring of one replica only (see PartitionPlan and ReplicaRouter).
+  """
+  def __init__(self, base: PartitioningStrategy, replicas: int = 2, min_replica_memory: int = 0):
+    self.base = base
+    self.replicas = replicas
+    self.min_replica_memory = min_replica_memory
+
+  def group_nodes(self, topology: Topology) -> List[List[str]]:
+    nodes = sorted(topology.all_nodes(), key=lambda x: (x[1].memory, x[0]), reverse=True)
+    for count in range(min(self.replicas, len(nodes)), 0, -1):
+      groups, memory = [[] for _ in range(count)], [0]*count
+      for node_id, capabilities in nodes:
+        i = memory.index(min(memory))
+        groups[i].append(node_id)
+        memory[i] += capabilities.memory
+      if count == 1 or min(memory) >= self.min_replica_memory: return groups
+    return [[node_id for node_id, _ in nodes]]
+
+  def partition(self, topology: Topology) -> List[Partition]:
+    partitions = []
+    for replica, node_ids in enumerate(self.group_nodes(topology)):
+      for p in self.base.partition(self.sub_topology(topology, node_ids)):
+        partitions.append(Partition(p.node_id, p.start, p.end, replica))
+    return partitions
+
+  @staticmethod
+  def sub_topology(topology: Topology, node_ids: List[str]) -> Topology:
+    sub = Topology()
+    for node_id in node_ids:
+      sub.update_node(node_id, topology.get_node(node_id))
+    for node_id in node_ids:
+      for conn in topology.peer_graph.get(node_id, ()):
+        if conn.to_id in node_ids: sub.add_edge(conn.from_id, conn.to_id, conn.description, conn.stats)
+    return sub
@@ -2,12 +2,20 @@ from typing import List
 from .partitioning_strategy import PartitioningStrategy
 from .topology import Topology
 from .partitioning_strategy import Partition
+from .ring_ordering import order_ring
 
 
 class RingMemoryWeightedPartitioningStrategy(PartitioningStrategy):
+  def __init__(self, ring_ordering: bool = False):
+    # with ring_ordering the nodes are arranged into the ring with the fastest links instead of by memory, keeping their shares
+    self.ring_ordering = ring_ordering
+
   def partition(self, topology: Topology) -> List[Partition]:
     nodes = list(topology.all_nodes())
     nodes.sort(key=lambda x: (x[1].memory, x[0]), reverse=True)
+    if self.ring_ordering:
+      capabilities = dict(nodes)
+      nodes = [(node_id, capabilities[node_id]) for node_id in order_ring(topology, [node_id for node_id, _ in nodes])]
     total_memory = sum(node[1].memory for node in nodes)
     partitions = []
     start = 0
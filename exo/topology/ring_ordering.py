@@ -0,0 +1,94 @@
+import itertools
+import math
+from typing import Dict, List, Optional, Tuple
+from .topology import LinkStats, Topology
+
+# typical (rtt seconds, bandwidth bytes/s) of a link by the interface type discovery puts at the start of edge descriptions,
+# see get_interface_priority_and_type
+INTERFACE_LINKS: Dict[str, Tuple[float, float]] = {
+  "Loopback": (0.0001, 10e9),
+  "Container Virtual": (0.0002, 5e9),
+  "Thunderbolt": (0.0005, 2.5e9),
+  "Ethernet": (0.001, 120e6),
+  "WiFi": (0.005, 40e6),
+  "Other": (0.005, 50e6),
+  "External Virtual": (0.03, 10e6),
+}
+# nodes without an edge between them can't send to each other, the ring only uses such a hop when there is no way around it
+MISSING_LINK_COST = 1.0
+EXACT_MAX_NODES = 8
+
+
+def estimated_link_stats(description: Optional[str]) -> Optional[LinkStats]:
+  interface_type = next((t for t in sorted(INTERFACE_LINKS, key=len, reverse=True) if description and description.startswith(t)), None)
+  if interface_type is None: return None
+  rtt, bandwidth = INTERFACE_LINKS[interface_type]
+  return LinkStats(rtt=rtt, rtt_p90=rtt, bandwidth=bandwidth)
+
+
+def quantized_link_stats(stats: LinkStats) -> LinkStats:
+  """stats rounded to half octaves, so they only change when a link got noticeably faster or slower."""
+  quantize = lambda x: 2**(round(math.log2(x)*2)/2) if x else x
+  return LinkStats(rtt=quantize(stats.rtt), rtt_p90=quantize(stats.rtt_p90), bandwidth=quantize(stats.bandwidth))
+
+
+def link_stats(topology: Topology, from_id: str, to_id: str) -> Optional[LinkStats]:
+  """Agreed stats of the link (see Topology.agreed_link_stats) if there are any, otherwise the typical ones of its interface type.
+
+  The measured stats on the edges are never used, they differ from node to node and every node has to compute the same partitions.
+  """
+  for a, b in [(from_id, to_id), (to_id, from_id)]:
+    if (a, b) in topology.agreed_link_stats: return topology.agreed_link_stats[(a, b)]
+  for a, b in [(from_id, to_id), (to_id, from_id)]:
+    for conn in topology.peer_graph.get(a, ()):
+      if conn.to_id == b: return estimated_link_stats(conn.description)
+  return None
+
+
+def has_link(topology: Topology, from_id: str, to_id: str) -> bool:
+  return any(conn.to_id == b for a, b in [(from_id, to_id), (to_id, from_id)] for conn in topology.peer_graph.get(a, ()))
+
+
+def link_cost(topology: Topology, from_id: str, to_id: str, activation_bytes: int = 8192, default: Tuple[float, float] = INTERFACE_LINKS["WiFi"]) -> float:
+  """Seconds to pass activation_bytes from one node to the next, links of unknown type are assumed to be like default."""
+  if not has_link(topology, from_id, to_id): return MISSING_LINK_COST
+  stats = link_stats(topology, from_id, to_id)
+  rtt, bandwidth = (stats.rtt, stats.bandwidth or default[1]) if stats is not None else default
+  return rtt/2 + activation_bytes/bandwidth
+
+
+def ring_cost(order: List[str], costs: Dict[Tuple[str, str], float]) -> float:
+  return sum(costs[(order[i], order[(i + 1) % len(order)])] for i in range(len(order))) if len(order) > 1 else 0.0
+
+
+def order_ring(topology: Topology, node_ids: List[str], activation_bytes: int = 8192) -> List[str]:
+  """Orders node_ids into the ring with the cheapest total hop cost, as every token goes around the whole ring.
+
+  The first node stays first and the result only depends on the topology and the order of node_ids, so all nodes compute the same
+  ring. Small rings are solved exactly, larger ones with nearest neighbour followed by 2-opt. Orders are only changed for a strictly
+  cheaper ring, with no link information node_ids is returned as is.
+  """
+  if len(node_ids) <= 2: return list(node_ids)
+  costs = {(a, b): link_cost(topology, a, b, activation_bytes) for a in node_ids for b in node_ids if a != b}
+  best = list(node_ids)
+  if len(node_ids) <= EXACT_MAX_NODES:
+    for rest in itertools.permutations(node_ids[1:]):
+      order = [node_ids[0], *rest]
+      if ring_cost(order, costs) < ring_cost(best, costs) - 1e-12: best = order
+    return best
+
+  order, remaining = [node_ids[0]], list(node_ids[1:])
+  while remaining:
+    nearest = min(remaining, key=lambda node_id: costs[(order[-1], node_id)])
+    order.append(nearest)
+    remaining.remove(nearest)
+  if ring_cost(order, costs) < ring_cost(best, costs) - 1e-12: best = order
+  improved = True
+  while improved:
+    improved = False
+    for i in range(1, len(best) - 1):
+      for j in range(i + 1, len(best)):
+        candidate = best[:i] + best[i:j + 1][::-1] + best[j + 1:]
+        if ring_cost(candidate, costs) < ring_cost(best, costs) - 1e-12:
+          best, improved = candidate, True
+  return best
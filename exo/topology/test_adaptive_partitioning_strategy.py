@@ -0,0 +1,67 @@
+import unittest
+from exo.inference.layer_profile import LayerProfile
+from exo.inference.shard import Shard
+from exo.topology.adaptive_partitioning_strategy import AdaptivePartitioningStrategy
+from exo.topology.partitioning_strategy import Partition
+from exo.topology.ring_memory_weighted_partitioning_strategy import RingMemoryWeightedPartitioningStrategy
+from exo.topology.test_doubles import make_topology
+
+
+class TestLayerProfile(unittest.TestCase):
+  def test_seconds_per_layer(self):
+    profile = LayerProfile(window=3)
+    self.assertIsNone(profile.seconds_per_layer())
+    for elapsed in [0.4, 0.8, 0.8, 0.8]:
+      profile.record(Shard("test", 0, 3, 8), elapsed)
+    self.assertEqual(profile.seconds_per_layer(), 0.2)
+    self.assertEqual(profile.to_dict()["samples"], 3)
+    self.assertEqual(profile.steps, 4)
+
+
+class TestAdaptivePartitioningStrategy(unittest.TestCase):
+  def setUp(self):
+    # equal memory, so the base split is half and half
+    self.topology = make_topology({"a": 32000, "b": 32000})
+    self.strategy = AdaptivePartitioningStrategy(RingMemoryWeightedPartitioningStrategy(), cooldown=60)
+
+  def test_imbalanced_stages_are_rebalanced(self):
+    proposal = self.strategy.propose(self.topology, {"a": 0.001, "b": 0.003})
+    self.assertEqual(proposal, [Partition("b", 0.0, 0.25), Partition("a", 0.25, 1.0)])
+    self.assertTrue(self.strategy.apply(proposal, 1))
+    self.assertEqual(self.strategy.partition(self.topology), proposal)
+    # versions only move forward
+    self.assertFalse(self.strategy.apply([Partition("b", 0.0, 0.5), Partition("a", 0.5, 1.0)], 1))
+
+  def test_hysteresis(self):
+    # within the threshold nothing moves
+    self.assertIsNone(self.strategy.propose(self.topology, {"a": 0.001, "b": 0.0011}))
+    # unmeasured nodes hold off rebalancing
+    self.assertIsNone(self.strategy.propose(self.topology, {"a": 0.001}))
+    self.strategy.apply(self.strategy.propose(self.topology, {"a": 0.001, "b": 0.003}), 1)
+    # the speeds changed again, but the last rebalance is too recent
+    self.assertIsNone(self.strategy.propose(self.topology, {"a": 0.003, "b": 0.001}))
+    self.strategy.cooldown = 0
+    self.assertIsNotNone(self.strategy.propose(self.topology, {"a": 0.003, "b": 0.001}))
+
+  def test_shares_are_capped_by_memory(self):
+    topology = make_topology({"a": 32000, "b": 16000, "c": 16000})
+    strategy = AdaptivePartitioningStrategy(RingMemoryWeightedPartitioningStrategy(), memory_headroom=1.2)
+    # b is much faster, but can only hold 1.2x its memory share of a quarter, and so can c of what b leaves over
+    proposal = strategy.propose(topology, {"a": 0.01, "b": 0.0001, "c": 0.01})
+    self.assertEqual([p.node_id for p in proposal], ["a", "c", "b"])
+    self.assertEqual([round(p.end - p.start, 5) for p in proposal], [0.4, 0.3, 0.3])
+
+  def test_no_proposal_when_caps_leave_layers_over(self):
+    strategy = AdaptivePartitioningStrategy(RingMemoryWeightedPartitioningStrategy(), memory_headroom=0.8)
+    self.assertIsNone(strategy.balanced_shares(self.topology, {"a": 1000, "b": 300}))
+    # the last partition isn't stretched over the layers no node has room for
+    self.assertIsNone(strategy.propose(self.topology, {"a": 0.001, "b": 0.003}))
+
+  def test_overrides_are_dropped_when_nodes_change(self):
+    self.strategy.apply([Partition("b", 0.0, 0.25), Partition("a", 0.25, 1.0)], 1)
+    topology = make_topology({"a": 32000, "b": 32000, "c": 1000})
+    self.assertEqual(self.strategy.partition(topology), RingMemoryWeightedPartitioningStrategy().partition(topology))
+
+
+if __name__ == "__main__":
+  unittest.main()
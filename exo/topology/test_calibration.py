@@ -0,0 +1,55 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from exo.topology import calibration
+from exo.topology.calibration import Calibration, calibrate, engine_memory_bandwidth_gbs, host_fingerprint, load_calibration, numpy_matmul_tflops, run_calibration
+from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
+from exo.topology.latency_aware_partitioning_strategy import LatencyCostModel
+
+UNKNOWN_CHIP = DeviceCapabilities(model="Linux Box (Device: CPU)", chip="Unknown Chip (Device: CPU)", memory=16000, flops=DeviceFlops(fp32=0, fp16=0, int8=0))
+
+
+class TestCalibration(unittest.IsolatedAsyncioTestCase):
+  def setUp(self):
+    self.path = Path(tempfile.mkdtemp())/"calibration.json"
+
+  def test_measurements(self):
+    self.assertGreater(numpy_matmul_tflops("float32", size=128, min_duration=0.01), 0)
+    self.assertGreater(engine_memory_bandwidth_gbs("TinygradDynamicShardInferenceEngine", nbytes=64*1024, min_duration=0.01), 0)
+    self.assertIsNone(engine_memory_bandwidth_gbs("DummyInferenceEngine"))
+
+  def test_memory_bandwidth_unknown_without_engine(self):
+    with mock.patch.object(calibration, "numpy_matmul_tflops", return_value=0.1):
+      result = run_calibration("fingerprint", "DummyInferenceEngine")
+    self.assertEqual((result.fp32, result.source, result.memory_bandwidth), (0.1, "numpy", 0.0))
+
+  async def test_cached_per_host(self):
+    fingerprint = host_fingerprint(UNKNOWN_CHIP, "TinygradDynamicShardInferenceEngine")
+    measured = lambda fingerprint, engine_name: Calibration(fingerprint, 0.5, 0.25, 40.0, "numpy", 1.0)
+    with mock.patch.object(calibration, "run_calibration", side_effect=measured) as run:
+      capabilities = await calibrate(UNKNOWN_CHIP, "TinygradDynamicShardInferenceEngine", path=self.path)
+      self.assertEqual(capabilities.flops, DeviceFlops(fp32=0.5, fp16=0.25, int8=0.5))
+      self.assertEqual(capabilities.memory_bandwidth, 40.0)
+      self.assertEqual(capabilities.chip, UNKNOWN_CHIP.chip)
+      self.assertEqual(load_calibration(self.path, fingerprint).fp16, 0.25)
+
+      self.assertEqual(await calibrate(UNKNOWN_CHIP, "TinygradDynamicShardInferenceEngine", path=self.path), capabilities)
+      self.assertEqual(run.call_count, 1)
+      # another engine on the same host is measured separately, and recalibrate measures again
+      await calibrate(UNKNOWN_CHIP, "MLXDynamicShardInferenceEngine", path=self.path)
+      await calibrate(UNKNOWN_CHIP, "TinygradDynamicShardInferenceEngine", recalibrate=True, path=self.path)
+      self.assertEqual(run.call_count, 3)
+    self.assertIsNone(load_calibration(self.path, "other host"))
+
+  def test_cost_model_uses_memory_bandwidth(self):
+    model = LatencyCostModel(layer_memory=1024, layer_flops=1e9)
+    capabilities = UNKNOWN_CHIP.model_copy(update={"memory_bandwidth": 10.0})
+    self.assertAlmostEqual(model.compute_time(capabilities, 2), 2*1024*2**20/10e9)
+    # the slower of reading the weights and computing bounds the time
+    capabilities = capabilities.model_copy(update={"flops": DeviceFlops(fp32=0.0005, fp16=0.001, int8=0.002)})
+    self.assertAlmostEqual(model.compute_time(capabilities, 2), 2.0)
+
+
+if __name__ == "__main__":
+  unittest.main()
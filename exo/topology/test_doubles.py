@@ -0,0 +1,19 @@
+from typing import Dict, Optional, Tuple, Union
+from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
+from exo.topology.topology import Topology
+
+
+def make_topology(
+  memories: Dict[str, int],
+  links: Optional[Dict[Tuple[str, str], Optional[str]]] = None,
+  flops: Union[DeviceFlops, Dict[str, DeviceFlops]] = DeviceFlops(fp32=0, fp16=0, int8=0),
+) -> Topology:
+  """Nodes with the given memory in MB and flops (the same for all or per node), links are added in both directions."""
+  topology = Topology()
+  for node_id, memory in memories.items():
+    node_flops = flops[node_id] if isinstance(flops, dict) else flops
+    topology.update_node(node_id, DeviceCapabilities(model=node_id, chip=node_id, memory=memory, flops=node_flops))
+  for (a, b), description in (links or {}).items():
+    topology.add_edge(a, b, description)
+    topology.add_edge(b, a, description)
+  return topology
@@ -0,0 +1,82 @@
+import unittest
+from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
+from exo.topology.latency_aware_partitioning_strategy import LatencyAwarePartitioningStrategy, LatencyCostModel
+from exo.topology.partitioning_strategy import Partition
+from exo.topology.ring_memory_weighted_partitioning_strategy import RingMemoryWeightedPartitioningStrategy
+from exo.topology.test_doubles import make_topology
+from exo.topology.topology import LinkStats
+
+
+def make_ring(nodes):
+  """nodes as (node_id, memory, fp16 TFLOPS), linked into a ring in that order."""
+  ids = [node_id for node_id, _, _ in nodes]
+  flops = {node_id: DeviceFlops(fp32=fp16/2, fp16=fp16, int8=fp16*2) for node_id, _, fp16 in nodes}
+  return make_topology({node_id: memory for node_id, memory, _ in nodes}, {(node_id, ids[(i + 1) % len(ids)]): None for i, node_id in enumerate(ids)}, flops)
+
+
+class TestLatencyCostModel(unittest.TestCase):
+  def test_costs(self):
+    model = LatencyCostModel(num_layers=10, layer_memory=1000, layer_flops=1e12, activation_bytes=1000, memory_fraction=0.5)
+    caps = DeviceCapabilities(model="test", chip="test", memory=8000, flops=DeviceFlops(fp32=1, fp16=2, int8=4))
+    self.assertEqual(model.capacity(caps), 4)
+    self.assertEqual(model.compute_time(caps, 3), 1.5)
+    self.assertAlmostEqual(model.transfer_time(LinkStats(rtt=0.01, rtt_p90=0.02, bandwidth=1e6)), 0.006)
+    self.assertAlmostEqual(model.transfer_time(None), model.default_rtt/2 + 1000/model.default_bandwidth)
+
+  def test_latency_uses_link_stats(self):
+    model = LatencyCostModel(num_layers=4, layer_flops=1e12)
+    topology = make_ring([("a", 16000, 1), ("b", 16000, 1)])
+    assignment = [("a", 2), ("b", 2)]
+    before = model.latency(topology, assignment)
+    # without stats of its own the hop back from b is taken to be like the one there
+    topology.agreed_link_stats[("a", "b")] = LinkStats(rtt=1.0, rtt_p90=1.0, bandwidth=1e9)
+    self.assertAlmostEqual(model.latency(topology, assignment) - before, 2*(0.5 - model.transfer_time(None) + model.activation_bytes/1e9))
+    self.assertEqual(len(model.stage_times(topology, assignment)), 2)
+
+
+class TestLatencyAwarePartitioningStrategy(unittest.TestCase):
+  def test_faster_node_gets_more_layers_within_its_memory(self):
+    # a 64GB M1 and a 32GB M4 Max with a 40GB model: memory weighting gives the M1 two thirds of the layers
+    topology = make_ring([("m1", 64*1024, 4.58), ("m4max", 32*1024, 36.07)])
+    model = LatencyCostModel(num_layers=80, layer_memory=500)
+    partitions = LatencyAwarePartitioningStrategy(model).partition(topology)
+    self.assertEqual(model.capacity(topology.get_node("m4max")), 52)
+    self.assertEqual(partitions, [Partition("m1", 0.0, 0.35), Partition("m4max", 0.35, 1.0)])
+
+    layers = lambda parts: [(p.node_id, round((p.end - p.start)*80)) for p in parts]
+    memory_weighted = RingMemoryWeightedPartitioningStrategy().partition(topology)
+    self.assertLess(model.latency(topology, layers(partitions)), model.latency(topology, layers(memory_weighted)))
+
+  def test_every_node_gets_a_layer(self):
+    topology = make_ring([("fast", 64*1024, 100), ("slow1", 16*1024, 1), ("slow2", 8*1024, 1)])
+    partitions = LatencyAwarePartitioningStrategy(LatencyCostModel(num_layers=16)).partition(topology)
+    self.assertEqual([(p.node_id, round((p.end - p.start)*16)) for p in partitions], [("fast", 14), ("slow1", 1), ("slow2", 1)])
+
+  def test_equal_nodes_are_balanced(self):
+    topology = make_ring([("a", 32*1024, 10), ("b", 32*1024, 10)])
+    partitions = LatencyAwarePartitioningStrategy().partition(topology)
+    self.assertEqual(partitions, [Partition("b", 0.0, 0.5), Partition("a", 0.5, 1.0)])
+
+  def test_nodes_with_different_measured_stats_agree(self):
+    # two nodes' snapshots of the same graph: one has measured a slow hop, the other hasn't heard of it yet
+    snapshots = [make_ring([("a", 32*1024, 10), ("b", 24*1024, 10), ("c", 16*1024, 10), ("d", 8*1024, 10)]) for _ in range(2)]
+    for conn in snapshots[0].peer_graph["a"]:
+      conn.stats = LinkStats(rtt=1.0, rtt_p90=1.0, bandwidth=1e3)
+    strategy = LatencyAwarePartitioningStrategy(LatencyCostModel(num_layers=16))
+    self.assertEqual(strategy.partition(snapshots[0]), strategy.partition(snapshots[1]))
+    # the published agreed stats are what moves the plan, the same way on both
+    for topology in snapshots:
+      topology.agreed_link_stats = {(a, b): LinkStats(rtt=1.0, rtt_p90=1.0, bandwidth=1e3) for a, b in [("a", "b"), ("a", "d")]}
+    self.assertEqual(strategy.partition(snapshots[0]), strategy.partition(snapshots[1]))
+    self.assertNotEqual(strategy.partition(snapshots[0]), strategy.partition(make_ring([("a", 32*1024, 10), ("b", 24*1024, 10), ("c", 16*1024, 10), ("d", 8*1024, 10)])))
+
+  def test_falls_back_to_memory_weighted(self):
+    for topology in [
+      make_ring([("a", 4*1024, 10), ("b", 4*1024, 10)]),  # doesn't fit
+      make_ring([("a", 32*1024, 0), ("b", 16*1024, 10)]),  # unknown flops
+    ]:
+      self.assertEqual(LatencyAwarePartitioningStrategy().partition(topology), RingMemoryWeightedPartitioningStrategy().partition(topology))
+
+
+if __name__ == "__main__":
+  unittest.main()
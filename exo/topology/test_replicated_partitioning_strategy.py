@@ -0,0 +1,48 @@
+import unittest
+from exo.inference.shard import Shard
+from exo.orchestration.partition_plan import PartitionPlan
+from exo.topology.partitioning_strategy import Partition
+from exo.topology.replicated_partitioning_strategy import ReplicatedPartitioningStrategy
+from exo.topology.ring_memory_weighted_partitioning_strategy import RingMemoryWeightedPartitioningStrategy
+from exo.topology.test_doubles import make_topology
+
+
+class TestReplicatedPartitioningStrategy(unittest.TestCase):
+  def setUp(self):
+    memories = {"a": 6000, "b": 5000, "c": 4000, "d": 3000, "e": 2000, "f": 1000}
+    self.topology = make_topology(memories, {(a, b): "Ethernet (en0)" for a in memories for b in memories if a < b})
+
+  def test_two_rings_of_three(self):
+    strategy = ReplicatedPartitioningStrategy(RingMemoryWeightedPartitioningStrategy(), replicas=2)
+    self.assertEqual(strategy.group_nodes(self.topology), [["a", "d", "e"], ["b", "c", "f"]])
+    self.assertEqual(strategy.partition(self.topology), [
+      Partition("a", 0.0, 0.54545, 0),
+      Partition("d", 0.54545, 0.81818, 0),
+      Partition("e", 0.81818, 1.0, 0),
+      Partition("b", 0.0, 0.5, 1),
+      Partition("c", 0.5, 0.9, 1),
+      Partition("f", 0.9, 1.0, 1),
+    ])
+    # links between replicas are left out
+    self.assertEqual({conn.to_id for conn in strategy.sub_topology(self.topology, ["a", "d", "e"]).peer_graph["a"]}, {"d", "e"})
+
+  def test_fewer_replicas_when_memory_is_short(self):
+    self.assertEqual(len(ReplicatedPartitioningStrategy(RingMemoryWeightedPartitioningStrategy(), 3, min_replica_memory=7000).group_nodes(self.topology)), 3)
+    self.assertEqual(len(ReplicatedPartitioningStrategy(RingMemoryWeightedPartitioningStrategy(), 3, min_replica_memory=8000).group_nodes(self.topology)), 2)
+    partitions = ReplicatedPartitioningStrategy(RingMemoryWeightedPartitioningStrategy(), 3, min_replica_memory=30000).partition(self.topology)
+    self.assertEqual(partitions, RingMemoryWeightedPartitioningStrategy().partition(self.topology))
+
+  def test_plan_follows_own_replica(self):
+    plan = PartitionPlan("c", 0, self.topology, ReplicatedPartitioningStrategy(RingMemoryWeightedPartitioningStrategy()), [])
+    self.assertEqual(sorted(plan.replicas), [0, 1])
+    self.assertEqual((plan.replica, plan.index), (1, 1))
+    self.assertEqual([p.node_id for p in plan.partitions], ["b", "c", "f"])
+    self.assertEqual(plan.partition_index(2), 0)
+    base = Shard("model", 0, 0, 20)
+    self.assertEqual(plan.shard_at(base, 1), Shard("model", 10, 17, 20))
+    self.assertEqual(plan.node_id_at(0, replica=0), "a")
+    self.assertEqual(plan.shard_at(base, 0, replica=0), Shard("model", 0, 9, 20))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,66 @@
+import random
+import unittest
+from exo.topology.partitioning_strategy import Partition
+from exo.topology.ring_memory_weighted_partitioning_strategy import RingMemoryWeightedPartitioningStrategy
+from exo.topology.ring_ordering import MISSING_LINK_COST, estimated_link_stats, link_cost, order_ring, quantized_link_stats, ring_cost
+from exo.topology.test_doubles import make_topology
+from exo.topology.topology import LinkStats
+
+
+class TestRingOrdering(unittest.TestCase):
+  def test_link_costs(self):
+    self.assertEqual(estimated_link_stats("Ethernet [USB] (en7)").rtt, 0.001)
+    self.assertIsNone(estimated_link_stats(None))
+    topology = make_topology({"a": 1, "b": 1, "c": 1}, {("a", "b"): "Thunderbolt (en5)"})
+    self.assertLess(link_cost(topology, "a", "b"), link_cost(make_topology({"a": 1, "b": 1}, {("a", "b"): "WiFi (en0)"}), "a", "b"))
+    self.assertEqual(link_cost(topology, "a", "c"), MISSING_LINK_COST)
+    # measured stats differ between nodes and are ignored, agreed ones win over the interface type in both directions
+    topology.peer_graph["a"] = set()
+    topology.add_edge("a", "b", "Thunderbolt (en5)", LinkStats(rtt=0.1, rtt_p90=0.1, bandwidth=1e9))
+    self.assertLess(link_cost(topology, "a", "b"), 0.05)
+    topology.agreed_link_stats[("b", "a")] = LinkStats(rtt=0.1, rtt_p90=0.1, bandwidth=1e9)
+    self.assertGreater(link_cost(topology, "a", "b"), 0.05)
+
+  def test_quantized_link_stats(self):
+    # measurements a few percent apart land on the same values
+    a, b = quantized_link_stats(LinkStats(rtt=0.0100, rtt_p90=0.012, bandwidth=1.00e8)), quantized_link_stats(LinkStats(rtt=0.0104, rtt_p90=0.0125, bandwidth=1.05e8))
+    self.assertEqual(a, b)
+    self.assertAlmostEqual(a.rtt, 2**-6.5)
+    self.assertIsNone(quantized_link_stats(LinkStats(rtt=0.01, rtt_p90=0.01)).bandwidth)
+
+  def test_ring_follows_fast_links(self):
+    # thunderbolt pairs a-c and b-d, everything else over wifi: memory order a, b, c, d crosses wifi on every hop
+    nodes = ["a", "b", "c", "d"]
+    links = {(x, y): "WiFi (en0)" for i, x in enumerate(nodes) for y in nodes[i + 1:]}
+    links.update({("a", "c"): "Thunderbolt (en5)", ("b", "d"): "Thunderbolt (en6)"})
+    topology = make_topology({"a": 4000, "b": 3000, "c": 2000, "d": 1000}, links)
+    self.assertEqual(order_ring(topology, nodes), ["a", "b", "d", "c"])
+
+    partitions = RingMemoryWeightedPartitioningStrategy(ring_ordering=True).partition(topology)
+    self.assertEqual([p.node_id for p in partitions], ["a", "b", "d", "c"])
+    self.assertEqual({p.node_id: round(p.end - p.start, 5) for p in partitions}, {"a": 0.4, "b": 0.3, "c": 0.2, "d": 0.1})
+    self.assertEqual(RingMemoryWeightedPartitioningStrategy().partition(topology)[1], Partition("b", 0.4, 0.7))
+
+  def test_no_link_information_keeps_order(self):
+    nodes = [f"node{i}" for i in range(6)]
+    topology = make_topology({node_id: 1000 for node_id in nodes}, {(x, y): None for i, x in enumerate(nodes) for y in nodes[i + 1:]})
+    self.assertEqual(order_ring(topology, nodes), nodes)
+
+  def test_heuristic_on_large_rings(self):
+    # a line of thunderbolt links through the nodes in shuffled order, the cheap ring goes along it
+    rng = random.Random(0)
+    nodes = [f"node{i:02d}" for i in range(14)]
+    line = nodes[:1] + rng.sample(nodes[1:], len(nodes) - 1)
+    links = {(x, y): "WiFi (en0)" for i, x in enumerate(nodes) for y in nodes[i + 1:]}
+    for x, y in zip(line, line[1:]):
+      links[(x, y) if (x, y) in links else (y, x)] = "Thunderbolt (en5)"
+    topology = make_topology({node_id: 1000 for node_id in nodes}, links)
+    order = order_ring(topology, nodes)
+    self.assertEqual(order[0], nodes[0])
+    self.assertEqual(sorted(order), nodes)
+    costs = {(a, b): link_cost(topology, a, b) for a in nodes for b in nodes if a != b}
+    self.assertEqual(ring_cost(order, costs), ring_cost(line, costs))
+
+
+if __name__ == "__main__":
+  unittest.main()
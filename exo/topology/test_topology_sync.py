@@ -0,0 +1,54 @@
+import unittest
+from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
+from exo.topology.topology_sync import TopologyState
+
+
+def caps(memory):
+  return DeviceCapabilities(model="test", chip="test", memory=memory, flops=DeviceFlops(fp32=0, fp16=0, int8=0))
+
+
+class TestTopologyState(unittest.TestCase):
+  def test_deltas(self):
+    a, b = TopologyState("a"), TopologyState("b")
+    self.assertTrue(a.update_local(caps(1000), {"b": "Ethernet"}))
+    self.assertFalse(a.update_local(caps(1000), {"b": "Ethernet"}))
+    b.update_local(caps(2000), {"a": "Ethernet"})
+
+    self.assertTrue(b.merge(a.delta(b.digest())))
+    self.assertEqual(b.delta(a.digest()).keys(), {"b"})
+    a.merge(b.delta(a.digest()))
+    self.assertEqual(a.delta(b.digest()), {})
+    self.assertEqual(b.delta(a.digest()), {})
+
+    # only newer versions replace a record, and a node's own record is never replaced by others
+    stale = dict(a.records)
+    a.update_local(caps(1500), {"b": "Thunderbolt"})
+    self.assertTrue(b.merge(a.delta(b.digest())))
+    self.assertFalse(b.merge(stale))
+    self.assertEqual(b.records["a"].capabilities.memory, 1500)
+    self.assertFalse(b.merge({"b": stale["a"]}))
+
+  def test_topology_is_what_is_reachable(self):
+    state = TopologyState("a", record_ttl=0)
+    state.update_local(caps(1000), {"b": "Ethernet"})
+    other = TopologyState("b")
+    other.update_local(caps(2000), {"a": "Ethernet", "c": "WiFi"})
+    third = TopologyState("c")
+    third.update_local(caps(3000), {"b": "WiFi"})
+    state.merge(other.delta({}))
+    state.merge(third.delta({}))
+
+    topology = state.topology()
+    self.assertEqual(set(topology.nodes), {"a", "b", "c"})
+    self.assertEqual({(c.from_id, c.to_id) for conns in topology.peer_graph.values() for c in conns}, {("a", "b"), ("b", "a"), ("b", "c"), ("c", "b")})
+
+    # c left: once b stops pointing to it, it drops out and its record is forgotten
+    other.update_local(caps(2000), {"a": "Ethernet"})
+    state.merge(other.delta(state.digest()))
+    self.assertEqual(set(state.topology().nodes), {"a", "b"})
+    state.topology()
+    self.assertNotIn("c", state.records)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,12 +1,25 @@
 from .device_capabilities import DeviceCapabilities
-from typing import Dict, Set, Optional
+from typing import Dict, Set, Optional, Tuple
 from dataclasses import dataclass
 
+@dataclass
+class LinkStats:
+  """Measured speed of the link from one node to another, over a window of recent probes."""
+  rtt: float  # seconds, median
+  rtt_p90: float  # seconds
+  bandwidth: Optional[float] = None  # bytes per second, median, None until a payload probe succeeded
+  samples: int = 0
+  updated_at: float = 0.0  # unix time
+
+  def to_dict(self):
+    return {"rtt": self.rtt, "rtt_p90": self.rtt_p90, "bandwidth": self.bandwidth, "samples": self.samples, "updated_at": self.updated_at}
+
 @dataclass
 class PeerConnection:
   from_id: str
   to_id: str
   description: Optional[str] = None
+  stats: Optional[LinkStats] = None
 
   def __hash__(self):
     # Use both from_id and to_id for uniqueness in sets
@@ -23,6 +36,9 @@ class Topology:
     self.nodes: Dict[str, DeviceCapabilities] = {}
     self.peer_graph: Dict[str, Set[PeerConnection]] = {}
     self.active_node_id: Optional[str] = None
+    # (from_id, to_id) -> link stats every node agrees on, carried in the record of one node (see Node.agreed_link_costs). Partitioning uses
+    # these rather than the measured stats on the edges, of which every node holds a different snapshot
+    self.agreed_link_stats: Dict[Tuple[str, str], LinkStats] = {}
 
   def update_node(self, node_id: str, device_capabilities: DeviceCapabilities):
     self.nodes[node_id] = device_capabilities
@@ -33,12 +49,21 @@ class Topology:
   def all_nodes(self):
     return self.nodes.items()
 
-  def add_edge(self, from_id: str, to_id: str, description: Optional[str] = None):
+  def add_edge(self, from_id: str, to_id: str, description: Optional[str] = None, stats: Optional[LinkStats] = None):
     if from_id not in self.peer_graph:
       self.peer_graph[from_id] = set()
-    conn = PeerConnection(from_id, to_id, description)
+    conn = PeerConnection(from_id, to_id, description, stats)
     self.peer_graph[from_id].add(conn)
 
+  def link_stats(self, from_id: str, to_id: str) -> Optional[LinkStats]:
+    return next((conn.stats for conn in self.peer_graph.get(from_id, ()) if conn.to_id == to_id), None)
+
+  def update_link_stats(self, other: "Topology") -> None:
+    """Takes the link stats of other's edges, for a topology with the same graph that is kept rather than replaced."""
+    for from_id, connections in self.peer_graph.items():
+      for conn in connections:
+        conn.stats = other.link_stats(from_id, conn.to_id)
+
   def merge(self, peer_node_id: str, other: "Topology"):
     for node_id, capabilities in other.nodes.items():
       if node_id != peer_node_id: continue
@@ -46,7 +71,13 @@ class Topology:
     for node_id, connections in other.peer_graph.items():
       for conn in connections:
         if conn.from_id != peer_node_id: continue
-        self.add_edge(conn.from_id, conn.to_id, conn.description)
+        self.add_edge(conn.from_id, conn.to_id, conn.description, conn.stats)
+
+  def has_same_graph(self, other: "Topology") -> bool:
+    # active_node_id is transient status, only nodes and edges (including their descriptions) matter here
+    if self.nodes != other.nodes: return False
+    edges = lambda t: {(c.from_id, c.to_id, c.description) for conns in t.peer_graph.values() for c in conns}
+    return edges(self) == edges(other)
 
   def __str__(self):
     nodes_str = ", ".join(f"{node_id}: {cap}" for node_id, cap in self.nodes.items())
@@ -65,7 +96,8 @@ class Topology:
           {
             "from_id": conn.from_id,
             "to_id": conn.to_id,
-            "description": conn.description
+            "description": conn.description,
+            "stats": conn.stats.to_dict() if conn.stats else None
           }
           for conn in connections
         ]
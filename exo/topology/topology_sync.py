@@ -0,0 +1,96 @@
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Tuple
+from .device_capabilities import DeviceCapabilities
+from .topology import LinkStats, Topology
+
+
+@dataclass
+class NodeRecord:
+  """What one node says about itself: its capabilities and its connections to its peers, at a version only that node increments."""
+  version: int
+  capabilities: DeviceCapabilities
+  edges: Dict[str, Optional[str]] = field(default_factory=dict)  # to_id -> description
+  link_stats: Dict[str, LinkStats] = field(default_factory=dict)  # to_id -> stats of the link
+  # (from_id, to_id) -> stats of every link in the cluster, only set by the node with the smallest id (see Node.agreed_link_costs)
+  agreed_link_stats: Dict[Tuple[str, str], LinkStats] = field(default_factory=dict)
+
+
+class TopologyState:
+  """The latest record of every node in the cluster, kept up to date by exchanging deltas with peers (see Node.gossip_topology).
+
+  Nodes are in the topology when they can be reached from this node through the edges of the records, a node that left drops out as
+  soon as its peers' records no longer point to it. Records of unreachable nodes are forgotten after record_ttl seconds.
+  """
+  def __init__(self, node_id: str, record_ttl: float = 60.0):
+    self.node_id = node_id
+    self.record_ttl = record_ttl
+    self.records: Dict[str, NodeRecord] = {}
+    # starting from the clock makes the records of a restarted node supersede the ones it gossiped before the restart
+    self.version = time.time_ns()
+    self.unreachable_since: Dict[str, float] = {}
+
+  def update_local(
+    self, capabilities: DeviceCapabilities, edges: Dict[str, Optional[str]], link_stats: Optional[Dict[str, LinkStats]] = None,
+    agreed_link_stats: Optional[Dict[Tuple[str, str], LinkStats]] = None
+  ) -> bool:
+    link_stats = {to_id: stats for to_id, stats in (link_stats or {}).items() if to_id in edges}
+    agreed_link_stats = dict(agreed_link_stats or {})
+    record = self.records.get(self.node_id)
+    if (
+      record is not None and record.capabilities == capabilities and record.edges == edges and record.link_stats == link_stats and
+      record.agreed_link_stats == agreed_link_stats
+    ):
+      return False
+    self.version += 1
+    self.records[self.node_id] = NodeRecord(self.version, capabilities, dict(edges), link_stats, agreed_link_stats)
+    return True
+
+  def digest(self) -> Dict[str, int]:
+    return {node_id: record.version for node_id, record in self.records.items()}
+
+  def delta(self, digest: Dict[str, int]) -> Dict[str, NodeRecord]:
+    """The records newer than the versions in digest."""
+    return {node_id: record for node_id, record in self.records.items() if record.version > digest.get(node_id, -1)}
+
+  def merge(self, records: Dict[str, NodeRecord]) -> bool:
+    changed = False
+    for node_id, record in records.items():
+      # this node's own record is only ever changed here
+      if node_id == self.node_id: continue
+      current = self.records.get(node_id)
+      if current is None or record.version > current.version:
+        self.records[node_id] = record
+        changed = True
+    return changed
+
+  def reachable(self) -> Iterable[str]:
+    seen, frontier = set(), [self.node_id]
+    while frontier:
+      node_id = frontier.pop()
+      if node_id in seen or node_id not in self.records: continue
+      seen.add(node_id)
+      frontier.extend(self.records[node_id].edges)
+    return seen
+
+  def topology(self) -> Topology:
+    topology = Topology()
+    reachable = self.reachable()
+    for node_id in reachable:
+      topology.update_node(node_id, self.records[node_id].capabilities)
+    for node_id in reachable:
+      for to_id, description in self.records[node_id].edges.items():
+        if to_id in reachable: topology.add_edge(node_id, to_id, description, self.records[node_id].link_stats.get(to_id))
+    # every node ends up with the same records, so it takes the agreed stats from the same node
+    if reachable: topology.agreed_link_stats = dict(self.records[min(reachable)].agreed_link_stats)
+    self.forget_unreachable(reachable)
+    return topology
+
+  def forget_unreachable(self, reachable: Iterable[str]) -> None:
+    now = time.monotonic()
+    for node_id in list(self.records):
+      if node_id in reachable:
+        self.unreachable_since.pop(node_id, None)
+      elif now - self.unreachable_since.setdefault(node_id, now) > self.record_ttl:
+        del self.records[node_id]
+        del self.unreachable_since[node_id]
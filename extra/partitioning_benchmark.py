@@ -0,0 +1,69 @@
+import argparse
+import random
+import numpy as np
+from exo.topology.device_capabilities import CHIP_FLOPS, DeviceCapabilities
+from exo.topology.latency_aware_partitioning_strategy import LatencyAwarePartitioningStrategy, LatencyCostModel
+from exo.topology.ring_memory_weighted_partitioning_strategy import RingMemoryWeightedPartitioningStrategy
+from exo.topology.topology import LinkStats, Topology
+
+# (name, layers, MB of weights per layer, flops per token per layer, activation bytes per token)
+MODELS = [
+  ("llama-3.1-8b fp16", 32, 500, 0.5e9, 8192),
+  ("llama-3.3-70b 4bit", 80, 500, 1.75e9, 16384),
+  ("llama-3.1-405b 4bit", 126, 1800, 6.4e9, 32768),
+]
+CHIPS = ["Apple M1", "Apple M1 Max", "Apple M2 Pro", "Apple M2 Ultra", "Apple M3 Max", "Apple M4", "Apple M4 Pro", "Apple M4 Max"]
+MEMORY_SIZES = [16, 24, 32, 48, 64, 96, 128, 192]
+
+
+def random_topology(rng: random.Random, n: int) -> Topology:
+  topology = Topology()
+  for i in range(n):
+    chip = rng.choice(CHIPS)
+    topology.update_node(f"node{i}", DeviceCapabilities(model=chip, chip=chip, memory=rng.choice(MEMORY_SIZES)*1024, flops=CHIP_FLOPS[chip]))
+  for i in range(n):
+    for j in range(n):
+      if i == j: continue
+      # thunderbolt (~1ms, 2GB/s) or wifi (~5ms, 50MB/s)
+      rtt, bandwidth = rng.choice([(0.001, 2e9), (0.005, 50e6)])
+      topology.add_edge(f"node{i}", f"node{j}", stats=LinkStats(rtt=rtt, rtt_p90=rtt*1.5, bandwidth=bandwidth, samples=3))
+  return topology
+
+
+def evaluate(model: LatencyCostModel, topology: Topology, partitions):
+  assignment = [(p.node_id, round(p.end*model.num_layers) - round(p.start*model.num_layers)) for p in partitions]
+  stages = model.stage_times(topology, assignment)
+  memory_ok = all(layers <= model.capacity(topology.get_node(node_id)) for node_id, layers in assignment)
+  return sum(stages), max(stages), memory_ok
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Estimated per-token latency of the memory weighted and latency aware partitioning strategies on random clusters")
+  parser.add_argument("--clusters", type=int, default=200)
+  parser.add_argument("--seed", type=int, default=0)
+  args = parser.parse_args()
+
+  rng = random.Random(args.seed)
+  print(f"{'model':<22} {'nodes':>5} {'memory weighted ms':>19} {'latency aware ms':>17} {'speedup':>8} {'bottleneck ms':>20} {'fits':>10}")
+  for name, num_layers, layer_memory, layer_flops, activation_bytes in MODELS:
+    model = LatencyCostModel(num_layers=num_layers, layer_memory=layer_memory, layer_flops=layer_flops, activation_bytes=activation_bytes)
+    strategies = [RingMemoryWeightedPartitioningStrategy(), LatencyAwarePartitioningStrategy(model)]
+    for n in [2, 3, 4, 6]:
+      results = [[], []]
+      for _ in range(args.clusters):
+        topology = random_topology(rng, n)
+        # only clusters the model fits on, both strategies split the rest by memory
+        if sum(model.capacity(caps) for _, caps in topology.all_nodes()) < num_layers: continue
+        for strategy, result in zip(strategies, results):
+          result.append(evaluate(model, topology, strategy.partition(topology)))
+      if not results[0]: continue
+      memory_weighted, latency_aware = (np.array(result, dtype=float) for result in results)
+      print(
+        f"{name:<22} {n:>5} {np.median(memory_weighted[:, 0])*1e3:>19.2f} {np.median(latency_aware[:, 0])*1e3:>17.2f} "
+        f"{np.median(memory_weighted[:, 0]/latency_aware[:, 0]):>7.2f}x {np.median(memory_weighted[:, 1])*1e3:>9.2f} -> {np.median(latency_aware[:, 1])*1e3:>6.2f} "
+        f"{memory_weighted[:, 2].mean():>4.0%}/{latency_aware[:, 2].mean():>4.0%}"
+      )
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import time
+import numpy as np
+from exo.inference.shard import Shard
+from exo.networking.grpc.grpc_peer_handle import GRPCPeerHandle
+from exo.networking.grpc.grpc_server import GRPCServer
+from exo.networking.tcp.tcp_peer_handle import TCPPeerHandle
+from exo.networking.tcp.tcp_server import TCPServer
+from exo.topology.device_capabilities import DeviceCapabilities, DeviceFlops
+
+
+class NoopNode:
+  async def process_tensor(self, shard, tensor, request_id, inference_state, origin_node_id):
+    return None
+
+
+async def measure(peer, shape, iterations, concurrency):
+  shard = Shard("benchmark", 0, 0, 2)
+  tensor = np.ones(shape, dtype=np.float16)
+  for _ in range(10):
+    await peer.send_tensor(shard, tensor, request_id="warmup")
+
+  latencies = []
+
+  async def worker(i):
+    for _ in range(iterations//concurrency):
+      start = time.perf_counter()
+      await peer.send_tensor(shard, tensor, request_id=f"request{i}")
+      latencies.append(time.perf_counter() - start)
+
+  start = time.perf_counter()
+  await asyncio.gather(*[worker(i) for i in range(concurrency)])
+  elapsed = time.perf_counter() - start
+  return np.median(latencies)*1e6, np.percentile(latencies, 99)*1e6, len(latencies)/elapsed
+
+
+async def main():
+  parser = argparse.ArgumentParser(description="Per-hop latency of sending a tensor to a node on loopback, for each transport")
+  parser.add_argument("--iterations", type=int, default=500)
+  parser.add_argument("--port", type=int, default=50190)
+  args = parser.parse_args()
+
+  caps = DeviceCapabilities(model="benchmark", chip="benchmark", memory=0, flops=DeviceFlops(fp32=0, fp16=0, int8=0))
+  transports = [
+    ("grpc (unary)", GRPCServer, lambda address: GRPCPeerHandle("benchmark", address, "benchmark", caps, use_tensor_stream=False, tensor_compression="none")),
+    ("grpc (stream)", GRPCServer, lambda address: GRPCPeerHandle("benchmark", address, "benchmark", caps, tensor_compression="none")),
+    ("tcp", TCPServer, lambda address: TCPPeerHandle("benchmark", address, "benchmark", caps, tensor_compression="none")),
+  ]
+  print(f"{'transport':<16}{'tensor':<18}{'concurrency':>12}{'p50 (us)':>12}{'p99 (us)':>12}{'msgs/s':>10}")
+  for i, (name, server_class, peer_handle) in enumerate(transports):
+    port = args.port + i
+    server = server_class(NoopNode(), "localhost", port)
+    await server.start()
+    peer = peer_handle(f"localhost:{port}")
+    await peer.connect()
+    for shape, iterations in [((1, 1, 4096), args.iterations), ((1, 512, 4096), args.iterations//10)]:
+      for concurrency in [1, 8]:
+        p50, p99, throughput = await measure(peer, shape, iterations, concurrency)
+        print(f"{name:<16}{str(shape):<18}{concurrency:>12}{p50:>12.0f}{p99:>12.0f}{throughput:>10.0f}")
+    await peer.disconnect()
+    await server.stop()
+
+
+if __name__ == "__main__":
+  asyncio.run(main())